@@ -0,0 +1,461 @@
+"""Stand-ins for the Anthropic and FreeAgent APIs that replay recorded responses.
+
+Both add a configurable latency per call so the benchmarks can model a real
+network round trip without touching one.
+"""
+import asyncio
+import base64
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from anthropic.types import Message
+
+RECORDINGS_FILE = Path(__file__).parent / "recordings" / "anthropic.json"
+# Size of the partial_json chunks a replayed stream is cut into
+_STREAM_CHUNK = 8
+
+
+def load_recordings(path: Path = RECORDINGS_FILE) -> list[dict]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _cached_prefix(params: dict) -> str | None:
+    """The request up to its last cache-control breakpoint, serialised; None if it has none."""
+    blocks = [*params.get("tools", []), *params.get("system", [])]
+    for message in params.get("messages", []):
+        content = message["content"]
+        blocks.extend(content if isinstance(content, list) else [{"type": "text", "text": content}])
+    marked = [i for i, block in enumerate(blocks) if isinstance(block, dict) and block.get("cache_control")]
+    if not marked:
+        return None
+    return json.dumps([params.get("model"), params.get("tool_choice"), blocks[:marked[-1] + 1]], sort_keys=True)
+
+
+class _Replay:
+    """Hands out recorded messages round-robin.
+
+    Prompt caching is modelled like the API does it: the request up to its
+    last breakpoint is cached if it is at least as long as the model's
+    minimum, and read back by a later request with the same prefix.
+    """
+
+    def __init__(self, recordings: list[dict]):
+        self._messages = [Message.model_validate(r) for r in recordings]
+        self._cycle = itertools.cycle(range(len(self._messages)))
+        self._lock = threading.Lock()
+        self._cached: set[str] = set()
+        self.calls = 0
+
+    def next(self, params: dict) -> Message:
+        from expense_pal.scanner import cache_min_tokens
+
+        prefix = _cached_prefix(params)
+        # About four characters a token, plus the tool-use system prompt
+        length = len(prefix) // 4 + 313 if prefix else 0
+        read = written = 0
+        with self._lock:
+            self.calls += 1
+            message = self._messages[next(self._cycle)]
+            if prefix and length >= cache_min_tokens(params.get("model", "")):
+                if prefix in self._cached:
+                    read = length
+                else:
+                    self._cached.add(prefix)
+                    written = length
+        usage = message.usage.model_copy(update={
+            "input_tokens": max(1, message.usage.input_tokens - read - written),
+            "cache_read_input_tokens": read,
+            "cache_creation_input_tokens": written,
+        })
+        return message.model_copy(update={"model": params.get("model", message.model), "usage": usage})
+
+
+class _Stream:
+    def __init__(self, message: Message, latency: float):
+        self._message = message
+        self._latency = latency
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        block = next(b for b in self._message.content if b.type == "tool_use")
+        text = json.dumps(block.input)
+        chunks = [text[i:i + _STREAM_CHUNK] for i in range(0, len(text), _STREAM_CHUNK)]
+        # Half the latency before the first token, the rest spread over the chunks
+        time.sleep(self._latency / 2)
+        for chunk in chunks:
+            time.sleep(self._latency / 2 / len(chunks))
+            yield SimpleNamespace(
+                type="content_block_delta",
+                delta=SimpleNamespace(type="input_json_delta", partial_json=chunk),
+            )
+
+    def get_final_message(self) -> Message:
+        return self._message
+
+
+class FakeAnthropic:
+    """Replaces ``anthropic.Anthropic``: ``messages.create`` and ``messages.stream``."""
+
+    def __init__(self, recordings: list[dict] | None = None, latency: float = 0.0):
+        self.replay = _Replay(recordings or load_recordings())
+        self.latency = latency
+        self.messages = self
+
+    def create(self, **params) -> Message:
+        time.sleep(self.latency)
+        return self.replay.next(params)
+
+    def stream(self, **params) -> _Stream:
+        return _Stream(self.replay.next(params), self.latency)
+
+
+class _RawResponse:
+    def __init__(self, message: Message):
+        self.headers = {}
+        self._message = message
+
+    async def parse(self) -> Message:
+        return self._message
+
+
+class FakeAsyncAnthropic:
+    """Replaces ``anthropic.AsyncAnthropic`` as used by ``engine.scan_receipts``."""
+
+    def __init__(self, recordings: list[dict] | None = None, latency: float = 0.0):
+        self.replay = _Replay(recordings or load_recordings())
+        self.latency = latency
+        self.messages = self
+        self.with_raw_response = SimpleNamespace(create=self._create_raw)
+
+    def __call__(self, **kwargs):
+        # engine.py constructs its client; hand it this instance
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def create(self, **params) -> Message:
+        await asyncio.sleep(self.latency)
+        return self.replay.next(params)
+
+    async def _create_raw(self, **params) -> _RawResponse:
+        return _RawResponse(await self.create(**params))
+
+
+class RecordingAnthropic:
+    """Wraps a real ``anthropic.Anthropic`` client and keeps every response it returns."""
+
+    def __init__(self, client):
+        self._client = client
+        self.recorded: list[dict] = []
+        self.messages = self
+
+    def create(self, **params) -> Message:
+        message = self._client.messages.create(**params)
+        self.recorded.append(message.model_dump(mode="json"))
+        return message
+
+    def stream(self, **params):
+        # Streams are recorded as the final message; replay re-chunks it
+        return self._client.messages.stream(**params)
+
+
+class _Response:
+    def __init__(self, url: str, payload: dict, headers: dict | None = None, status_code: int = 200):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._payload = payload
+
+    def json(self) -> dict:
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} for {self.url}", response=self)
+
+
+class FakeFreeAgent:
+    """Serves ``GET /expenses`` pages from a list of expenses, newest first,
+    ``GET /users/me`` and ``POST /expenses``, which adds to the list.
+
+    Installed in place of the ``requests`` module used by ``expense_pal.api``,
+    or over HTTP with ``serve``; responses carry FreeAgent's
+    ``X-Total-Count`` and ``Link`` headers. The next ``throttle`` POSTs are
+    answered 429 with ``Retry-After: retry_after`` and create nothing.
+    """
+
+    HTTPError = requests.HTTPError
+    RequestException = requests.RequestException
+    ConnectionError = requests.ConnectionError
+    ConnectTimeout = requests.ConnectTimeout
+    Timeout = requests.Timeout
+
+    def __init__(self, expenses: list[dict], latency: float = 0.0, throttle: int = 0, retry_after: str = "0"):
+        self.expenses = expenses
+        self.latency = latency
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.calls = 0
+        self.throttled = 0
+        self.created: list[dict] = []
+        self._lock = threading.Lock()
+
+    def get(self, url: str, params: dict | None = None, headers: dict | None = None, **kwargs) -> _Response:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        # Query parameters may come in the URL itself, as when following a Link header
+        parts = urlparse(url)
+        params = {**{k: v[-1] for k, v in parse_qs(parts.query).items()}, **(params or {})}
+        url = parts._replace(query="").geturl()
+        path = parts.path
+        if path.endswith("/users/me"):
+            return _Response(url, {"user": {"url": url.replace("/users/me", "/users/1")}})
+        if not path.endswith("/expenses"):
+            return _Response(url, {"errors": [{"message": "not found"}]}, status_code=404)
+        per_page = min(int(params.get("per_page", 25)), 100)
+        page = int(params.get("page", 1))
+        total = len(self.expenses)
+        items = self.expenses[(page - 1) * per_page:page * per_page]
+        links = []
+        if page * per_page < total:
+            links.append(f'<{url}?page={page + 1}&per_page={per_page}>; rel="next"')
+        last = max(1, -(-total // per_page))
+        links.append(f'<{url}?page={last}&per_page={per_page}>; rel="last"')
+        return _Response(
+            url,
+            {"expenses": items},
+            headers={"X-Total-Count": str(total), "Link": ", ".join(links)},
+        )
+
+    def post(self, url: str, json: dict | None = None, **kwargs) -> _Response:
+        with self._lock:
+            self.calls += 1
+            throttled = self.throttle > 0
+            if throttled:
+                self.throttle -= 1
+                self.throttled += 1
+        time.sleep(self.latency)
+        if throttled:
+            return _Response(url, {"errors": [{"message": "rate limited"}]}, {"Retry-After": self.retry_after}, 429)
+        expense = (json or {}).get("expense")
+        if not urlparse(url).path.endswith("/expenses") or not expense:
+            return _Response(url, {"errors": [{"message": "unprocessable"}]}, status_code=422)
+        with self._lock:
+            created = {k: v for k, v in expense.items() if k != "attachment"}
+            created["url"] = f"{url}/{len(self.expenses) + 1}"
+            attachment = expense.get("attachment")
+            if attachment:
+                created["attachment"] = {
+                    "file_name": attachment.get("file_name"),
+                    "content_type": attachment.get("content_type"),
+                    "bytes": len(base64.b64decode(attachment.get("data") or "")),
+                }
+            self.created.append(created)
+            self.expenses.insert(0, created)
+        return _Response(url, {"expense": created}, headers={"Location": created["url"]}, status_code=201)
+
+    def request(self, method: str, url: str, **kwargs) -> _Response:
+        if method.upper() == "POST":
+            return self.post(url, **kwargs)
+        if method.upper() != "GET":
+            return _Response(url, {"errors": [{"message": "not supported by the fake"}]}, status_code=405)
+        return self.get(url, **kwargs)
+
+    # requests.Session compatibility
+    def Session(self):
+        return self
+
+    def mount(self, *args, **kwargs):
+        pass
+
+    def close(self):
+        pass
+
+
+def serve(fake: FakeFreeAgent, port: int = 0) -> ThreadingHTTPServer:
+    """Serve ``fake`` over HTTP on localhost in a background thread; returns the server.
+
+    Point ``FREEAGENT_BASE_URL`` at ``http://localhost:<port>/v2`` to run the
+    CLI against it. Call ``shutdown()`` on the server to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, resp: _Response):
+            body = json.dumps(resp.json()).encode("utf-8")
+            self.send_response(resp.status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in resp.headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _url(self) -> str:
+            return f"http://{self.headers.get('Host', 'localhost')}{urlparse(self.path).path}"
+
+        def do_GET(self):
+            params = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query).items()}
+            self._reply(fake.get(self._url(), params=params))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                payload = None
+            self._reply(fake.post(self._url(), json=payload))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", port), Handler)
+    threading.Thread(target=server.serve_forever, name="fake-freeagent", daemon=True).start()
+    return server
+
+
+class FakeBatches:
+    """The Message Batches endpoints (``/v1/messages/batches``): create, retrieve and results.
+
+    Served over HTTP with ``serve_batches`` so a real ``anthropic.Anthropic``
+    talks to it, JSONL results included. A batch ends after
+    ``retrieves_to_end`` retrieves; each request then gets the result type
+    ``outcome`` picks for it (``succeeded`` with a replayed message by
+    default, or ``errored``, ``expired``, ``canceled``).
+    """
+
+    def __init__(self, recordings: list[dict] | None = None, outcome=None, retrieves_to_end: int = 1):
+        self.replay = _Replay(recordings or load_recordings())
+        self.outcome = outcome or (lambda request: "succeeded")
+        self.retrieves_to_end = retrieves_to_end
+        self.batches: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, body: dict, base_url: str) -> dict:
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self._lock:
+            batch_id = f"msgbatch_{len(self.batches) + 1:04d}"
+            self.batches[batch_id] = batch = {
+                "requests": body["requests"],
+                "retrieves": 0,
+                "public": {
+                    "id": batch_id,
+                    "type": "message_batch",
+                    "processing_status": "in_progress",
+                    "request_counts": {
+                        "processing": len(body["requests"]),
+                        "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0,
+                    },
+                    "created_at": now,
+                    "expires_at": now,
+                    "ended_at": None,
+                    "archived_at": None,
+                    "cancel_initiated_at": None,
+                    "results_url": None,
+                },
+            }
+            batch["results_url"] = f"{base_url}/v1/messages/batches/{batch_id}/results"
+            return batch["public"]
+
+    def retrieve(self, batch_id: str) -> dict | None:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            batch["retrieves"] += 1
+            public = batch["public"]
+            if public["processing_status"] != "ended" and batch["retrieves"] >= self.retrieves_to_end:
+                batch["results"] = [self._result(request) for request in batch["requests"]]
+                counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+                for line in batch["results"]:
+                    counts[line["result"]["type"]] += 1
+                public.update(
+                    processing_status="ended",
+                    request_counts=counts,
+                    ended_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    results_url=batch["results_url"],
+                )
+            return public
+
+    def results(self, batch_id: str) -> list[dict] | None:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            return None if batch is None else batch.get("results")
+
+    def _result(self, request: dict) -> dict:
+        kind = self.outcome(request)
+        if kind == "succeeded":
+            message = self.replay.next(request["params"]).model_dump(mode="json")
+            result = {"type": "succeeded", "message": message}
+        elif kind == "errored":
+            error = {"type": "invalid_request_error", "message": "fake error"}
+            result = {"type": "errored", "error": {"type": "error", "error": error}}
+        else:
+            result = {"type": kind}
+        return {"custom_id": request["custom_id"], "result": result}
+
+
+def serve_batches(fake: FakeBatches, port: int = 0) -> ThreadingHTTPServer:
+    """Serve ``fake`` over HTTP on localhost in a background thread; returns the server.
+
+    Point ``ANTHROPIC_BASE_URL`` (or a client's ``base_url``) at
+    ``http://localhost:<port>``. Call ``shutdown()`` on the server to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: bytes, content_type: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _not_found(self):
+            error = {"type": "not_found_error", "message": f"no such resource {self.path}"}
+            self._reply(404, json.dumps({"type": "error", "error": error}).encode("utf-8"))
+
+        def do_GET(self):
+            parts = urlparse(self.path).path.strip("/").split("/")
+            if parts[:3] != ["v1", "messages", "batches"] or len(parts) not in (4, 5):
+                return self._not_found()
+            if len(parts) == 4:
+                batch = fake.retrieve(parts[3])
+                if batch is None:
+                    return self._not_found()
+                return self._reply(200, json.dumps(batch).encode("utf-8"))
+            results = fake.results(parts[3]) if parts[4] == "results" else None
+            if results is None:
+                return self._not_found()
+            body = "".join(json.dumps(line) + "\n" for line in results).encode("utf-8")
+            self._reply(200, body, "application/binary")
+
+        def do_POST(self):
+            if urlparse(self.path).path.rstrip("/") != "/v1/messages/batches":
+                return self._not_found()
+            length = int(self.headers.get("Content-Length") or 0)
+            base_url = f"http://{self.headers.get('Host', 'localhost')}"
+            batch = fake.create(json.loads(self.rfile.read(length)), base_url)
+            self._reply(200, json.dumps(batch).encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", port), Handler)
+    threading.Thread(target=server.serve_forever, name="fake-batches", daemon=True).start()
+    return server
@@ -0,0 +1,371 @@
+"""Offline benchmarks for the scan and review pipeline.
+
+Runs entirely against fakes: Anthropic calls replay the responses in
+``recordings/anthropic.json`` and FreeAgent ``/expenses`` pages are served
+from a synthetic ledger, each with a configurable latency. A scratch HOME
+and working directory hold synthetic receipt folders (10, 1,000 and 10,000
+files by default), a large ``descriptions.txt`` and an ``expenses.jsonl``
+that is imported into the ledger before timing starts.
+
+For each folder size it times description ranking, prompt building,
+``scan_receipt`` (fresh and cached), concurrent throughput through
+``engine.scan_receipts``, and the multi-scan endpoints (``/files``,
+``/stream``, ``/select``, ``/submit``, which appends to the ledger) through
+Flask's test client; it also times syncing descriptions from FreeAgent,
+rebuilding the description index, looking up ledger entries by source
+file, a quarterly report by category over the whole ledger, eight
+threads appending to one file through the group-committing writer and
+pushing ledger entries with their receipts to FreeAgent. Fake latency is
+only applied to the throughput, sync and push stages, so the others
+measure this code's own overhead.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.run                      # compare with baseline.json
+    python -m benchmarks.run --sizes 10,1000      # quicker run
+    python -m benchmarks.run --save-baseline      # store this run as the baseline
+    python -m benchmarks.run --record receipts/   # re-record real API responses
+
+A stage whose median is more than ``--tolerance`` times its baseline (and
+at least ``--min-delta-ms`` slower) is a regression and fails the run.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fakes import RECORDINGS_FILE, FakeAnthropic, FakeAsyncAnthropic, FakeFreeAgent, load_recordings
+
+BASELINE_FILE = Path(__file__).parent / "baseline.json"
+
+
+def _isolate(workdir: Path):
+    """Point HOME and the working directory at ``workdir``; must run before expense_pal is imported."""
+    home = workdir / "home"
+    home.mkdir(parents=True, exist_ok=True)
+    os.environ["HOME"] = str(home)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "replay")
+    os.chdir(workdir)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _summary(durations: list[float]) -> dict:
+    """Median and p95 in milliseconds plus operations per second."""
+    return {
+        "count": len(durations),
+        "median_ms": round(_percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(_percentile(durations, 95) * 1000, 3),
+        "per_s": round(len(durations) / sum(durations), 1) if sum(durations) else None,
+    }
+
+
+def _time_each(fn, items) -> list[float]:
+    durations = []
+    for item in items:
+        started = time.perf_counter()
+        fn(item)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def _concurrent_appends(path: Path, threads: int = 8, per_thread: int = 25) -> list[float]:
+    """Durations of appends made by several threads at once, as rapid confirms from several reviewers."""
+    import threading
+
+    from expense_pal.appendlog import AppendLog
+
+    log = AppendLog(path)
+    durations: list[float] = []
+
+    def worker(thread: int):
+        for i in range(per_thread):
+            started = time.perf_counter()
+            log.append([json.dumps({"thread": thread, "i": i})])
+            durations.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return durations
+
+
+def _push_all(workdir: Path, entries: list[dict]) -> dict:
+    """Push ``entries``, each with a receipt attached, from a fresh ledger to the fake FreeAgent."""
+    from benchmarks import synthetic
+    from expense_pal.api import ApiClient, RateLimiter
+    from expense_pal.ledger import Ledger
+    from expense_pal.push import push_expenses
+
+    for stale in workdir.glob("push.db*"):
+        # Left by an earlier run with the same --workdir, with every entry already pushed
+        stale.unlink()
+    ledger = Ledger(workdir / "push.db")
+    for entry, receipt in zip(entries, synthetic.receipt_folder(workdir / "push", len(entries))):
+        ledger.add({**entry, "source_file": str(receipt)})
+    pending = ledger.unpushed()
+    started = time.perf_counter()
+    client = ApiClient("token", limiter=RateLimiter(1_000_000))
+    for result in push_expenses(ledger, client, "user", pending):
+        if result.error is not None:
+            raise result.error
+    elapsed = time.perf_counter() - started
+    ledger.close()
+    return {
+        "count": len(pending),
+        "median_ms": round(elapsed / len(pending) * 1000, 3),
+        "p95_ms": None,
+        "per_s": round(len(pending) / elapsed, 1),
+    }
+
+
+def _sample(files: list[Path], count: int) -> list[Path]:
+    """Up to ``count`` files spread evenly over the (sorted) folder."""
+    return files[::max(1, len(files) // count)][:count]
+
+
+def _progress(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def run(args) -> dict:
+    from benchmarks import synthetic
+
+    workdir = Path.cwd()
+    from expense_pal import api, engine
+    from expense_pal.categories import get_all_categories
+    from expense_pal.config import DESCRIPTIONS_FILE, EXPENSES_LOG
+    from expense_pal.descriptions import DescriptionIndex, DescriptionStore
+    from expense_pal.ledger import get_ledger
+    from expense_pal.metrics import get_metrics_log
+    from expense_pal.promptlog import get_prompt_log
+    from expense_pal.scanner import get_scanner, scan_receipt
+    from expense_pal.web_review import create_batch_app
+
+    recordings = load_recordings(args.recordings)
+    fake = FakeAnthropic(recordings)
+    fake_async = FakeAsyncAnthropic(recordings, latency=args.latency)
+    scanner = get_scanner()
+    scanner._client = fake
+    engine.anthropic.AsyncAnthropic = fake_async
+
+    _progress(f"Generating {args.descriptions} descriptions and {args.ledger} ledger entries...")
+    known = synthetic.descriptions(args.descriptions)
+    entries = synthetic.ledger(known, args.ledger, workdir / "history")
+    synthetic.write_history(DESCRIPTIONS_FILE, EXPENSES_LOG, known, entries)
+    ledger = get_ledger()
+    api.requests = FakeFreeAgent(synthetic.freeagent_expenses(entries), latency=args.latency)
+    client = api.ApiClient("token", limiter=api.RateLimiter(1_000_000))
+
+    results: dict[str, dict] = {}
+
+    def rebuild_index(_):
+        # A fresh store and index, as at startup: reads the file and the ledger in full
+        DescriptionIndex(DescriptionStore()).rank()
+
+    results["descriptions.rebuild_index"] = _summary(_time_each(rebuild_index, range(3)))
+    results["ledger.find"] = _summary(
+        _time_each(lambda e: ledger.find(source_file=e["source_file"]), entries[::max(1, len(entries) // 200)])
+    )
+    results["ledger.report"] = _summary(_time_each(lambda _: ledger.totals(("quarter", "category")), range(50)))
+    results["appendlog.concurrent_append"] = _summary(_concurrent_appends(workdir / "appends.jsonl"))
+    results["freeagent.sync_descriptions"] = _summary(
+        _time_each(lambda _: api.fetch_expense_descriptions(client, limit=args.sync_total), range(3))
+    )
+    results["freeagent.push"] = _push_all(workdir, entries[-args.push:])
+
+    for size in args.sizes:
+        _progress(f"Folder of {size} receipts...")
+        folder = workdir / f"receipts-{size}"
+        files = synthetic.receipt_folder(folder, size)
+        sample = _sample(files, args.samples)
+        tag = f"[{size}]"
+
+        scanner.descriptions.rank(sample[0])
+        results[f"descriptions.rank{tag}"] = _summary(_time_each(scanner.descriptions.rank, sample))
+        results[f"scanner.build_prompt{tag}"] = _summary(
+            _time_each(lambda p: scanner.build_params(scanner.prepare(p)), sample)
+        )
+        results[f"scan_receipt.fresh{tag}"] = _summary(
+            _time_each(lambda p: scan_receipt(p, use_cache=False), sample)
+        )
+        results[f"scan_receipt.cached{tag}"] = _summary(_time_each(scan_receipt, sample))
+
+        throughput = _sample(files, args.throughput)
+        started = time.perf_counter()
+
+        async def scan_all():
+            async for _, result in engine.scan_receipts(
+                throughput, use_cache=False, requests_per_minute=1_000_000
+            ):
+                if isinstance(result, Exception):
+                    raise result
+
+        asyncio.run(scan_all())
+        elapsed = time.perf_counter() - started
+        results[f"engine.throughput{tag}"] = {
+            "count": len(throughput),
+            "median_ms": round(elapsed / len(throughput) * 1000, 3),
+            "p95_ms": None,
+            "per_s": round(len(throughput) / elapsed, 1),
+        }
+
+        streaming = create_batch_app(folder, get_all_categories(), use_cache=False, prefetch_workers=0)
+        with streaming.test_client() as client:
+            results[f"http.stream{tag}"] = _summary(
+                _time_each(lambda p: client.get(f"/stream/{p.name}").get_data(), sample)
+            )
+
+        app = create_batch_app(folder, get_all_categories(), prefetch_workers=0)
+        with app.test_client() as client:
+            results[f"http.files{tag}"] = _summary(_time_each(lambda _: client.get("/files"), range(20)))
+            selects, submits = [], []
+            for path in sample:
+                # Alternate like a reviewer: each confirm changes the ledger the next scan ranks from
+                started = time.perf_counter()
+                form = client.post(f"/select/{path.name}", json={}).get_json()
+                selects.append(time.perf_counter() - started)
+                # Every confirm adds a new description, as a first receipt from a vendor would
+                form = {**form, "filename": path.name, "description": f"{form['description']} ({path.stem})"}
+                started = time.perf_counter()
+                client.post("/submit", json=form)
+                submits.append(time.perf_counter() - started)
+            results[f"http.select{tag}"] = _summary(selects)
+            results[f"http.submit{tag}"] = _summary(submits)
+        shutil.rmtree(folder)
+
+    for log in (get_prompt_log(), get_metrics_log()):
+        if log is not None:
+            log.flush()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float, show: bool = True) -> list[str]:
+    """Check each stage against the baseline (printing a table if ``show``); returns the regressed stages."""
+    regressions = []
+    reference = baseline.get("results", {})
+    if show:
+        print(f"{'stage':<34} {'median ms':>10} {'p95 ms':>10} {'per s':>9} {'baseline':>10} {'ratio':>6}")
+    for stage, current in results.items():
+        old = reference.get(stage, {}).get("median_ms")
+        ratio = current["median_ms"] / old if old else None
+        regressed = (
+            ratio is not None
+            and ratio > tolerance
+            and current["median_ms"] - old >= min_delta_ms
+        )
+        if regressed:
+            regressions.append(stage)
+        if not show:
+            continue
+        p95 = f"{current['p95_ms']:.3f}" if current["p95_ms"] is not None else "-"
+        print(
+            f"{stage:<34} {current['median_ms']:>10.3f} {p95:>10} {current['per_s'] or 0:>9.1f} "
+            f"{old if old is not None else '-':>10} {f'{ratio:.2f}' if ratio else '-':>6}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def record(args):
+    """Scan real receipts through the API and store the responses for replay."""
+    from benchmarks.fakes import RecordingAnthropic
+    from expense_pal.config import require_anthropic_key
+    from expense_pal.scanner import SUPPORTED_TYPES, get_scanner, scan_receipt
+
+    require_anthropic_key()
+    scanner = get_scanner()
+    recorder = RecordingAnthropic(scanner.client)
+    scanner._client = recorder
+    folder = Path(args.record)
+    for path in sorted(folder.iterdir()):
+        if path.suffix.lower() in SUPPORTED_TYPES:
+            _progress(f"Recording {path.name}...")
+            scan_receipt(path, use_cache=False)
+    if not recorder.recorded:
+        print(f"No receipts found in {folder}", file=sys.stderr)
+        sys.exit(1)
+    args.recordings.write_text(json.dumps(recorder.recorded, indent=2) + "\n", encoding="utf-8")
+    print(f"Recorded {len(recorder.recorded)} responses to {args.recordings}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10,1000,10000", help="Receipt folder sizes (comma-separated)")
+    parser.add_argument("--samples", type=int, default=50, help="Receipts timed per stage and folder")
+    parser.add_argument("--throughput", type=int, default=100, help="Receipts scanned concurrently per folder")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake API latency in seconds")
+    parser.add_argument("--descriptions", type=int, default=5000, help="Lines in the synthetic descriptions.txt")
+    parser.add_argument("--ledger", type=int, default=20000, help="Entries in the synthetic expenses.jsonl")
+    parser.add_argument("--sync-total", type=int, default=2000, help="Expenses fetched when syncing descriptions")
+    parser.add_argument("--push", type=int, default=100, help="Ledger entries pushed to FreeAgent with receipts")
+    parser.add_argument("--recordings", type=Path, default=RECORDINGS_FILE, help="Recorded Anthropic responses")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="Baseline results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed slowdown factor (default 1.5)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--workdir", type=Path, help="Keep generated data here instead of a temp dir")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--record", metavar="FOLDER", help="Record real API responses for these receipts")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    args.recordings = args.recordings.resolve()
+    args.baseline = args.baseline.resolve()
+
+    if args.record:
+        record(args)
+        return
+
+    settings = {
+        "sizes": args.sizes,
+        "samples": args.samples,
+        "throughput": args.throughput,
+        "latency": args.latency,
+        "descriptions": args.descriptions,
+        "ledger": args.ledger,
+        "sync_total": args.sync_total,
+    }
+    workdir = args.workdir.resolve() if args.workdir else Path(tempfile.mkdtemp(prefix="expense-pal-bench-"))
+    cwd = Path.cwd()
+    _isolate(workdir)
+    try:
+        results = run(args)
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"settings": settings, "results": results}, indent=2))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({
+            "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPU, Python {platform.python_version()}",
+            "settings": settings,
+            "results": results,
+        }, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    if baseline.get("settings") not in (None, settings):
+        print("Warning: baseline was recorded with different settings", file=sys.stderr)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms, show=not args.json)
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
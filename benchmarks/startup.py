@@ -0,0 +1,109 @@
+"""Import-time budget for the commands that should start instantly.
+
+Runs ``--version``, ``--help`` and ``list`` (with FreeAgent credentials
+unset, so it stops at the credentials check) in fresh interpreters under
+``python -X importtime`` and checks that:
+
+* none of them imports a heavy dependency (anthropic, flask, requests,
+  Pillow, pypdf) -- those belong inside the commands that use them -- and
+  only ``list``, which needs the credentials, loads ``.env`` (python-dotenv);
+* the imports the command itself triggers stay under ``--budget-ms``.
+
+Interpreter startup (``site`` and everything before it) is reported but not
+counted against the budget, since it varies with the environment rather than
+with this code.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --budget-ms 40 --runs 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+COMMANDS = [["--version"], ["--help"], ["list"]]
+HEAVY_MODULES = {"anthropic", "flask", "requests", "PIL", "pypdf", "dotenv"}
+# Heavy modules a command may still import because it needs them before doing anything
+ALLOWED_MODULES = {"list": {"dotenv"}}
+DEFAULT_BUDGET_MS = 75.0
+
+_SCRIPT = "import sys; sys.argv = ['expense-pal', *sys.argv[1:]]; from expense_pal.cli import main; main()"
+
+
+def _parse_importtime(stderr: str) -> list[tuple[int, int, str]]:
+    """(depth, cumulative µs, module) for every ``-X importtime`` line, in completion order."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # One leading space, then two more per level of nesting
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, int(cumulative), name.strip()))
+    return rows
+
+
+def measure(argv: list[str], workdir: str) -> dict:
+    """Import cost, wall time and heavy imports of one run of ``expense-pal *argv``."""
+    env = dict(os.environ, HOME=workdir, FREEAGENT_CLIENT_ID="", FREEAGENT_CLIENT_SECRET="")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SCRIPT, *argv],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    rows = _parse_importtime(proc.stderr)
+    site = next((i for i, (depth, _, name) in enumerate(rows) if depth == 0 and name == "site"), -1)
+    command = [(cumulative, name) for depth, cumulative, name in rows[site + 1:] if depth == 0]
+    return {
+        "command": " ".join(argv),
+        "import_ms": sum(c for c, _ in command) / 1000,
+        "startup_ms": rows[site][1] / 1000 if site >= 0 else 0.0,
+        "wall_ms": wall * 1000,
+        "heavy": sorted(
+            {name.split(".")[0] for _, _, name in rows} & HEAVY_MODULES - ALLOWED_MODULES.get(argv[0], set())
+        ),
+        "slowest": [(name, c / 1000) for c, name in sorted(command, reverse=True)[:5]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"Largest import time a command may add (default: {DEFAULT_BUDGET_MS:g})")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command; the fastest counts (default: 5)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="expense-pal-startup-") as workdir:
+        for argv in COMMANDS:
+            runs = [measure(argv, workdir) for _ in range(max(1, args.runs))]
+            best = min(runs, key=lambda r: r["import_ms"])
+            best["wall_ms"] = min(r["wall_ms"] for r in runs)
+            best["ok"] = not best["heavy"] and best["import_ms"] <= args.budget_ms
+            results.append(best)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'command':<12} {'imports':>9} {'startup':>9} {'wall':>9}  result")
+        for r in results:
+            verdict = "ok" if r["ok"] else "OVER BUDGET"
+            if r["heavy"]:
+                verdict = "imports " + ", ".join(r["heavy"])
+            print(f"{r['command']:<12} {r['import_ms']:>7.1f}ms {r['startup_ms']:>7.1f}ms {r['wall_ms']:>7.1f}ms  {verdict}")
+            if not r["ok"]:
+                for name, ms in r["slowest"]:
+                    print(f"    {ms:>7.1f}ms  {name}")
+        print(f"\nBudget: {args.budget_ms:g}ms of imports per command")
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
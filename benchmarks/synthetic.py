@@ -0,0 +1,127 @@
+"""Synthetic receipt folders, description history and expense ledgers.
+
+Everything is generated from a fixed seed so runs are comparable.
+"""
+import io
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:  # Pillow is optional; without it every receipt shares one tiny JPEG
+    Image = None
+    ImageDraw = None
+
+from expense_pal.categories import get_llm_categories
+
+VENDORS = [
+    "tesco", "sainsburys", "waitrose", "pret", "costa", "starbucks", "greggs", "wetherspoon",
+    "trainline", "tfl", "uber", "addison lee", "national rail", "premier inn", "travelodge", "hilton",
+    "amazon", "apple", "microsoft", "adobe", "github", "jetbrains", "dropbox", "google",
+    "royal mail", "dhl", "staples", "ryman", "currys", "argos", "screwfix", "wickes",
+    "bt", "vodafone", "ee", "o2", "octopus", "british gas", "thames water", "shell",
+]
+ITEMS = [
+    "lunch", "coffee", "client dinner", "train ticket", "taxi", "hotel night", "parking", "fuel",
+    "printer paper", "toner", "postage", "courier", "software licence", "annual subscription",
+    "monitor", "keyboard", "laptop stand", "cables", "broadband", "mobile contract", "electricity",
+    "water", "books", "conference ticket", "training course", "stationery", "desk", "chair",
+]
+
+# A 16x16 grey baseline JPEG, used when Pillow is not installed
+_TINY_JPEG = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300100b0c0e0c0a100e0d0e1211101318281a181616183123"
+    "251d283a333d3c3933383740485c4e404457453738506d51575f626768673e4d71797064785c656763ffc0000b080010"
+    "001001011100ffc4001f0000010501010101010100000000000000000102030405060708090a0bffc400b51000020103"
+    "03020403050504040000017d01020300041105122131410613516107227114328191a1082342b1c11552d1f024336272"
+    "82090a161718191a25262728292a3435363738393a434445464748494a535455565758595a636465666768696a737475"
+    "767778797a838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9"
+    "cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9faffda0008010100003f00e928a28affd9"
+)
+
+
+def descriptions(count: int, seed: int = 1) -> list[str]:
+    """``count`` distinct vendor/item descriptions, e.g. "Pret - client dinner (3)"."""
+    rng = random.Random(seed)
+    result: dict[str, None] = {}
+    while len(result) < count:
+        vendor, item = rng.choice(VENDORS), rng.choice(ITEMS)
+        base = f"{vendor.title()} - {item}"
+        result[base if base not in result else f"{base} ({len(result)})"] = None
+    return list(result)
+
+
+def ledger(known: list[str], count: int, folder: Path, seed: int = 2) -> list[dict]:
+    """``count`` confirmed expense entries spread over the last three years."""
+    rng = random.Random(seed)
+    categories = get_llm_categories()
+    now = datetime.now(timezone.utc)
+    entries = []
+    for i in range(count):
+        description = rng.choice(known)
+        category = rng.choice(categories)
+        when = now - timedelta(days=rng.uniform(0, 3 * 365))
+        total = rng.uniform(2, 400)
+        vendor = description.split(" - ")[0].lower().replace(" ", "_")
+        entries.append({
+            "date": when.strftime("%Y-%m-%d"),
+            "total_amount": f"{total:.2f}",
+            "vat_amount": f"{total / 6:.2f}",
+            "category": category["description"],
+            "category_nominal_code": category["nominal_code"],
+            "description": description,
+            "source_file": str(folder / "done" / f"{vendor}_{i:06d}.jpeg"),
+            "created_at": when.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+    entries.sort(key=lambda e: e["created_at"])
+    return entries
+
+
+def freeagent_expenses(entries: list[dict]) -> list[dict]:
+    """Ledger entries as FreeAgent returns them from ``GET /expenses``, newest first."""
+    return [
+        {
+            "url": f"https://api.freeagent.com/v2/expenses/{i}",
+            "dated_on": e["date"],
+            "gross_value": f"-{e['total_amount']}",
+            "sales_tax_value": f"-{e['vat_amount']}",
+            "description": e["description"],
+            "category": f"https://api.freeagent.com/v2/categories/{e['category_nominal_code']}",
+        }
+        for i, e in enumerate(reversed(entries))
+    ]
+
+
+def _receipt_jpeg(rng: random.Random) -> bytes:
+    if Image is None:
+        # Trailing bytes after EOI are ignored by decoders but give each file its own hash
+        return _TINY_JPEG + rng.randbytes(16)
+    img = Image.new("RGB", (240, 320), (250, 250, 245))
+    draw = ImageDraw.Draw(img)
+    for row in range(rng.randint(6, 14)):
+        y = 20 + row * 20
+        draw.rectangle((16, y, 16 + rng.randint(60, 200), y + 8), fill=(rng.randint(0, 80),) * 3)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=70)
+    return out.getvalue()
+
+
+def receipt_folder(path: Path, count: int, seed: int = 3) -> list[Path]:
+    """Fill ``path`` with ``count`` receipt images named after their vendors."""
+    rng = random.Random(seed + count)
+    path.mkdir(parents=True, exist_ok=True)
+    files = []
+    for i in range(count):
+        vendor = rng.choice(VENDORS).replace(" ", "_")
+        file_path = path / f"{vendor}_receipt_{i:05d}.jpeg"
+        file_path.write_bytes(_receipt_jpeg(rng))
+        files.append(file_path)
+    return files
+
+
+def write_history(descriptions_file: Path, expenses_log: Path, known: list[str], entries: list[dict]):
+    descriptions_file.parent.mkdir(parents=True, exist_ok=True)
+    descriptions_file.write_text("".join(d + "\n" for d in known), encoding="utf-8")
+    expenses_log.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
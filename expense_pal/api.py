@@ -1,42 +1,353 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterator
+from urllib.parse import parse_qs, urlparse
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from expense_pal.config import (
+    BASE_URL,
+    FREEAGENT_REQUESTS_PER_MINUTE,
+    FREEAGENT_TIMEOUT,
+    PUSH_WORKERS,
+    SYNC_WORKERS,
+)
+
+# Statuses worth retrying for any request: FreeAgent has acted on nothing
+_RETRY_STATUSES = {429, 503}
+# ...and for requests that are safe to repeat, transient server errors too
+_IDEMPOTENT_RETRY_STATUSES = _RETRY_STATUSES | {500, 502, 504}
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+# The OAuth token endpoint: any other error means the code or refresh token was refused
+_TOKEN_RETRY_STATUSES = {500, 502, 503, 504}
+_MAX_ATTEMPTS = 5
+_BACKOFF_BASE = 1.0
+_BACKOFF_CAP = 60.0
+_CONNECT_TIMEOUT = 5.0
+# Largest page FreeAgent serves
+_MAX_PER_PAGE = 100
+_LINK_RE = re.compile(r'<([^>]*)>\s*;\s*rel="?([^",;]+)"?')
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by every worker talking to FreeAgent.
+
+    Admits ``requests_per_minute`` on average, after an initial burst of a
+    quarter of that, so a short command (one sync, a small push) runs at
+    full concurrency. A 429's ``Retry-After`` pauses every caller until it
+    has passed.
+    """
+
+    def __init__(self, requests_per_minute: float = FREEAGENT_REQUESTS_PER_MINUTE, burst: int | None = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(requests_per_minute // 4)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _retry_after(resp) -> float | None:
+    """Seconds a response asks to wait, from ``Retry-After`` in seconds or as an HTTP date."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: spread retries so concurrent workers don't stampede together
+    return random.uniform(0, min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt))
+
+
+class ApiClient:
+    """The one way to talk to FreeAgent: a pooled, rate-limited, retrying session.
+
+    Holds one ``requests.Session``, so connections are kept alive and reused
+    (up to ``pool_size`` at once, for concurrent workers) and responses come
+    gzip-compressed; the auth headers are built once per token. Every
+    request has a ``timeout`` and is admitted through ``limiter``. 429 and
+    503 responses are retried with jittered backoff, waiting as long as
+    ``Retry-After`` asks; requests that are safe to repeat are also retried
+    after other 5xx responses, timeouts and dropped connections, but a POST
+    only where FreeAgent cannot have acted on it, so it never creates
+    anything twice. A 401 gets a new access token from ``refresh`` (once
+    per request, shared by every worker that saw it) and the request is sent
+    again. The OAuth token exchange goes through the same session
+    (``token_request``), so ``token`` may be None until it has run.
+    """
+
+    def __init__(
+        self,
+        token: str | None = None,
+        refresh: Callable[[], str | None] | None = None,
+        base_url: str = BASE_URL,
+        limiter: RateLimiter | None = None,
+        timeout: float = FREEAGENT_TIMEOUT,
+        pool_size: int = max(10, PUSH_WORKERS),
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or RateLimiter()
+        self.timeout = (min(_CONNECT_TIMEOUT, timeout), timeout)
+        self._refresh = refresh
+        self._token_lock = threading.Lock()
+        self._set_token(token)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self._session.close()
+
+    def _set_token(self, token: str | None):
+        # Swapped as one tuple, so a request always sends the headers of the token it checks against
+        headers = {"Accept": "application/json", "Accept-Encoding": "gzip"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        self._auth = (token, headers)
+
+    def _renew(self, stale: str) -> bool:
+        """Replace ``stale`` with a fresh access token; False if there is none to be had."""
+        with self._token_lock:
+            if self._auth[0] != stale:
+                # Another worker already refreshed it
+                return True
+            token = self._refresh() if self._refresh is not None else None
+            if not token:
+                return False
+            self._set_token(token)
+            return True
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Send ``method`` to ``path`` (relative to the API root, or a full URL) and return the response.
+
+        ``kwargs`` go to ``requests`` (``params``, ``json``, ...). Raises
+        ``requests.HTTPError`` for an error status retrying did not clear
+        and ``requests.RequestException`` when FreeAgent cannot be reached.
+        """
+        method = method.upper()
+        if method in _IDEMPOTENT_METHODS:
+            statuses = _IDEMPOTENT_RETRY_STATUSES
+            transient = (requests.ConnectionError, requests.Timeout)
+        else:
+            statuses = _RETRY_STATUSES
+            transient = requests.ConnectTimeout
+        return self._send(method, path, statuses, transient, **kwargs)
+
+    def token_request(self, data: dict, auth: tuple[str, str]) -> requests.Response:
+        """POST ``data`` to the OAuth token endpoint with the app's ``auth`` and return the response.
+
+        Sent without the access token and never refreshed on a 401. Only
+        dropped connections, timeouts and 5xx responses are retried; any other
+        error status is raised as ``requests.HTTPError`` at once.
+        """
+        return self._send(
+            "POST", "token_endpoint", _TOKEN_RETRY_STATUSES, (requests.ConnectionError, requests.Timeout),
+            authorized=False, data=data, auth=auth,
+        )
+
+    def _send(self, method: str, path: str, statuses: set[int], transient, authorized: bool = True, **kwargs):
+        url = path if "://" in path else f"{self.base_url}/{path.lstrip('/')}"
+        kwargs.setdefault("timeout", self.timeout)
+        refreshed = not authorized
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            token, headers = self._auth
+            if not authorized:
+                headers = {k: v for k, v in headers.items() if k != "Authorization"}
+            try:
+                resp = self._session.request(method, url, headers=headers, **kwargs)
+            except transient:
+                if attempt >= _MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(_backoff(attempt))
+                attempt += 1
+                continue
+            if resp.status_code == 401 and not refreshed:
+                refreshed = True
+                if self._renew(token):
+                    continue
+            if resp.status_code not in statuses or attempt >= _MAX_ATTEMPTS - 1:
+                resp.raise_for_status()
+                return resp
+            delay = _retry_after(resp)
+            if delay is not None:
+                # Holds back every worker; this one then joins the queue at the limiter
+                self.limiter.pause(delay)
+                delay = random.uniform(0, 1)
+            time.sleep(_backoff(attempt) if delay is None else delay)
+            attempt += 1
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+
+_client: ApiClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_api_client() -> ApiClient:
+    """Return the process-wide client, authorised as the stored FreeAgent user.
+
+    Authorises in the browser on first use if there is no usable token;
+    later 401s refresh the token without asking. Token requests share the
+    client's session.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from expense_pal.auth import get_access_token, refresh_access_token
+
+            client = ApiClient(refresh=lambda: refresh_access_token(client))
+            client._set_token(get_access_token(client))
+            _client = client
+        return _client
+
+
+def _links(resp) -> dict[str, str]:
+    """The URLs of a response's ``Link`` header, by relation (next, last, ...)."""
+    return {rel: url for url, rel in _LINK_RE.findall(resp.headers.get("Link") or "")}
 
-from expense_pal.config import BASE_URL
 
+def _page_count(resp, per_page: int) -> int | None:
+    """Pages in the listing, from ``X-Total-Count`` or else the ``last`` link; None if neither says."""
+    total = resp.headers.get("X-Total-Count")
+    if total and total.isdigit():
+        return max(1, -(-int(total) // per_page))
+    last = parse_qs(urlparse(_links(resp).get("last", "")).query).get("page")
+    if last and last[0].isdigit():
+        return int(last[0])
+    return None
 
-def list_expenses(token: str, per_page: int = 10) -> list[dict]:
+
+def _pages(
+    client: ApiClient, path: str, params: dict, per_page: int, limit: int | None, workers: int
+) -> Iterator[requests.Response]:
+    """The responses for each page of a listing, in page order."""
+    first = client.get(path, params={**params, "per_page": per_page, "page": 1})
+    yield first
+    pages = _page_count(first, per_page)
+    if pages is None:
+        # Nothing to plan with: follow the next links one page at a time
+        resp = first
+        while "next" in _links(resp):
+            resp = client.get(_links(resp)["next"])
+            yield resp
+        return
+    if limit is not None:
+        pages = min(pages, -(-limit // per_page))
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="pages")
+    # Pages requested ahead of the one being yielded; bounds what is held in memory
+    ahead: deque = deque()
+    try:
+        for page in range(2, pages + 1):
+            ahead.append(pool.submit(client.get, path, params={**params, "per_page": per_page, "page": page}))
+            if len(ahead) >= 2 * max(1, workers):
+                yield ahead.popleft().result()
+        while ahead:
+            yield ahead.popleft().result()
+    finally:
+        # A caller that stops early leaves the remaining pages unfetched
+        pool.shutdown(cancel_futures=True)
+
+
+def iter_expenses(
+    client: ApiClient, limit: int | None = None, view: str = "recent", workers: int = SYNC_WORKERS
+) -> Iterator[dict]:
+    """Yield FreeAgent expenses in listing order (newest first for ``recent``), up to ``limit`` (None for all).
+
+    The first page says how many there are (``X-Total-Count``, or the
+    ``last`` page in the ``Link`` header); the rest are then fetched
+    concurrently by ``workers`` threads, a bounded number of pages ahead of
+    the caller, and handed on in order. Without either header the ``next``
+    links are followed one by one.
+    """
+    if limit is not None and limit <= 0:
+        return
+    per_page = min(_MAX_PER_PAGE, limit or _MAX_PER_PAGE)
+    remaining = limit
+    for resp in _pages(client, "expenses", {"view": view}, per_page, limit, workers):
+        for expense in resp.json().get("expenses", []):
+            yield expense
+            if remaining is not None:
+                remaining -= 1
+                if not remaining:
+                    return
+
+
+def list_expenses(client: ApiClient, per_page: int = 10) -> list[dict]:
     """Fetch recent expenses from FreeAgent."""
-    resp = requests.get(
-        f"{BASE_URL}/expenses",
-        params={"view": "recent", "per_page": per_page},
-        headers={
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/json",
-        },
-    )
-    resp.raise_for_status()
+    resp = client.get("expenses", params={"view": "recent", "per_page": per_page})
     return resp.json().get("expenses", [])
 
 
-def fetch_expense_descriptions(token: str, total: int = 200) -> list[str]:
-    """Fetch up to `total` expenses and return deduplicated non-blank descriptions."""
-    per_page = 100
-    pages = (total + per_page - 1) // per_page
+def fetch_expense_descriptions(client: ApiClient, limit: int | None = 200) -> list[str]:
+    """Deduplicated non-blank descriptions of the ``limit`` most recent expenses (None for all), newest first."""
     seen: dict[str, None] = {}
-    for page in range(1, pages + 1):
-        resp = requests.get(
-            f"{BASE_URL}/expenses",
-            params={"view": "recent", "per_page": per_page, "page": page},
-            headers={
-                "Authorization": f"Bearer {token}",
-                "Accept": "application/json",
-            },
-        )
-        resp.raise_for_status()
-        expenses = resp.json().get("expenses", [])
-        if not expenses:
-            break
-        for exp in expenses:
-            desc = (exp.get("description") or "").strip()
-            if desc and desc not in seen:
-                seen[desc] = None
+    for exp in iter_expenses(client, limit):
+        desc = (exp.get("description") or "").strip()
+        if desc:
+            seen[desc] = None
     return list(seen.keys())
+
+
+def get_user_url(client: ApiClient) -> str:
+    """URL of the authorised FreeAgent user, whom pushed expenses are claimed by."""
+    return client.get("users/me").json()["user"]["url"]
+
+
+def create_expense(client: ApiClient, expense: dict) -> str:
+    """Create an expense in FreeAgent and return its URL.
+
+    ``expense`` holds the attributes of FreeAgent's expense resource (user,
+    category, dated_on, gross_value, ... and optionally an attachment).
+    """
+    resp = client.post("expenses", json={"expense": expense})
+    url = (resp.json().get("expense") or {}).get("url") or resp.headers.get("Location")
+    if not url:
+        raise ValueError("FreeAgent did not return the new expense's URL")
+    return url
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; appends are then only serialised within one process
+    fcntl = None
+
+# Chunk size when reading back from the end to the start of a torn last line
+_TAIL_BYTES = 1 << 16
+
+
+def is_json_line(line: bytes) -> bool:
+    """Whether an unterminated last line is a complete JSON record worth keeping."""
+    try:
+        json.loads(line)
+    except ValueError:
+        return False
+    return True
+
+
+class _Ticket:
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Exception | None = None
+
+
+class AppendLog:
+    """Appends whole lines to a file shared by threads and processes, with group commit.
+
+    ``append`` hands its lines to a writer thread and waits until they are on
+    disk. Everything queued while the previous write was in progress goes out
+    as the next single write and fsync, so a burst of appends from several
+    threads costs one disk flush rather than one each. Each write holds an
+    exclusive advisory lock on ``<file>.lock`` (which, unlike the file itself,
+    survives the file being rewritten and replaced), so appends from other
+    processes never interleave; ``locked`` takes the same lock for rewrites.
+
+    Lines are written whole, each with its newline, in one ``write`` call.
+    Before appending, a torn last line left by a crash is repaired: it is
+    terminated if ``valid`` accepts it (or there is no ``valid``) and cut off
+    otherwise, so new lines never run on from a fragment.
+    """
+
+    def __init__(self, path: Path, fsync: bool = True, valid: Callable[[bytes], bool] | None = None):
+        self.path = path
+        self.fsync = fsync
+        self.valid = valid
+        self.commits = 0
+        self.repaired = 0
+        self._lock_path = path.with_name(path.name + ".lock")
+        self._file_lock = threading.RLock()
+        self._lock_depth = 0
+        self._cond = threading.Condition()
+        self._pending: list[tuple[bytes, _Ticket]] = []
+        self._thread: threading.Thread | None = None
+
+    def append(self, lines: Iterable[str]):
+        """Append ``lines`` (without newlines) and return once they are written.
+
+        Raises ``ValueError`` for a line containing a newline and ``OSError``
+        if the write failed.
+        """
+        chunks = []
+        for line in lines:
+            if "\n" in line or "\r" in line:
+                raise ValueError(f"line contains a line break: {line[:80]!r}")
+            chunks.append(line.encode("utf-8") + b"\n")
+        if not chunks:
+            return
+        ticket = _Ticket()
+        with self._cond:
+            self._pending.append((b"".join(chunks), ticket))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"append-{self.path.name}", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        ticket.done.wait()
+        if ticket.error is not None:
+            raise ticket.error
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the lock appends take, across threads and processes (e.g. to rewrite the file).
+
+        Re-entrant within a thread, so ``repair`` can be called while holding it.
+        """
+        with self._file_lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                yield
+            finally:
+                self._lock_depth = 0
+                # Closing the descriptor releases the flock
+                os.close(fd)
+
+    def repair(self) -> bool:
+        """Terminate or cut off a torn last line; returns True if the file was changed."""
+        with self.locked():
+            try:
+                fd = os.open(self.path, os.O_RDWR)
+            except FileNotFoundError:
+                return False
+            try:
+                return self._repair(fd)
+            finally:
+                os.close(fd)
+
+    def _repair(self, fd: int) -> bool:
+        size = os.fstat(fd).st_size
+        if not size:
+            return False
+        os.lseek(fd, size - 1, os.SEEK_SET)
+        if os.read(fd, 1) == b"\n":
+            return False
+        # Walk back to the newline before the torn line
+        line_start = 0
+        position = size
+        while position > 0:
+            chunk_start = max(0, position - _TAIL_BYTES)
+            os.lseek(fd, chunk_start, os.SEEK_SET)
+            newline = os.read(fd, position - chunk_start).rfind(b"\n")
+            if newline >= 0:
+                line_start = chunk_start + newline + 1
+                break
+            position = chunk_start
+        os.lseek(fd, line_start, os.SEEK_SET)
+        fragment = os.read(fd, size - line_start)
+        if self.valid is None or self.valid(fragment):
+            os.lseek(fd, 0, os.SEEK_END)
+            os.write(fd, b"\n")
+        else:
+            os.ftruncate(fd, line_start)
+        self.repaired += 1
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                batch, self._pending = self._pending, []
+            error = None
+            try:
+                self._commit(b"".join(data for data, _ in batch))
+            except Exception as exc:  # handed to the waiting callers; the writer must outlive it
+                error = exc
+            for _, ticket in batch:
+                ticket.error = error
+                ticket.done.set()
+
+    def _commit(self, data: bytes):
+        with self.locked():
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                self._repair(fd)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+        self.commits += 1
+
+
+_logs: dict[str, AppendLog] = {}
+_logs_lock = threading.Lock()
+
+
+def get_append_log(path: Path, fsync: bool = True, valid: Callable[[bytes], bool] | None = None) -> AppendLog:
+    """Return the process-wide writer for ``path``, so every user of one file shares its group commits.
+
+    ``fsync`` and ``valid`` apply when the writer is first created.
+    """
+    key = os.path.abspath(path)
+    with _logs_lock:
+        log = _logs.get(key)
+        if log is None:
+            log = _logs[key] = AppendLog(path, fsync, valid)
+        return log
@@ -6,6 +6,7 @@ from urllib.parse import urlparse, parse_qs
 
 import requests
 
+from expense_pal.api import ApiClient
 from expense_pal.config import (
     BASE_URL,
     TOKEN_PATH,
@@ -16,20 +17,33 @@ from expense_pal.config import (
 )
 
 
-def get_access_token() -> str:
-    """Return a valid access token, refreshing or re-authorizing as needed."""
+def get_access_token(client: ApiClient) -> str:
+    """Return a valid access token, refreshing or re-authorizing through ``client`` as needed."""
     tokens = _load_tokens()
     if tokens:
         if tokens.get("expires_at", 0) > time.time() + 60:
             return tokens["access_token"]
         if tokens.get("refresh_token"):
-            refreshed = _refresh_token(tokens["refresh_token"])
+            refreshed = _refresh_token(client, tokens["refresh_token"])
             if refreshed:
                 return refreshed["access_token"]
-    tokens = _authorize()
+    tokens = _authorize(client)
     return tokens["access_token"]
 
 
+def refresh_access_token(client: ApiClient) -> str | None:
+    """Exchange the stored refresh token for a new access token, e.g. after a 401.
+
+    Returns None if there is no refresh token or FreeAgent refuses it; never
+    starts the browser authorization flow.
+    """
+    tokens = _load_tokens()
+    if not tokens or not tokens.get("refresh_token"):
+        return None
+    refreshed = _refresh_token(client, tokens["refresh_token"])
+    return refreshed["access_token"] if refreshed else None
+
+
 def _load_tokens() -> dict | None:
     if TOKEN_PATH.exists():
         return json.loads(TOKEN_PATH.read_text())
@@ -47,7 +61,7 @@ def _save_tokens(token_response: dict) -> dict:
     return tokens
 
 
-def _authorize() -> dict:
+def _authorize(client: ApiClient) -> dict:
     """Run the full OAuth 2.0 authorization code flow."""
     auth_code = None
 
@@ -83,31 +97,27 @@ def _authorize() -> dict:
     if not auth_code:
         raise SystemExit("Authorization failed: no code received.")
 
-    resp = requests.post(
-        f"{BASE_URL}/token_endpoint",
-        data={
+    resp = client.token_request(
+        {
             "grant_type": "authorization_code",
             "code": auth_code,
             "redirect_uri": CALLBACK_URL,
         },
         auth=(CLIENT_ID, CLIENT_SECRET),
     )
-    resp.raise_for_status()
     return _save_tokens(resp.json())
 
 
-def _refresh_token(refresh_token: str) -> dict | None:
+def _refresh_token(client: ApiClient, refresh_token: str) -> dict | None:
     """Attempt to refresh the access token. Returns None on failure."""
     try:
-        resp = requests.post(
-            f"{BASE_URL}/token_endpoint",
-            data={
+        resp = client.token_request(
+            {
                 "grant_type": "refresh_token",
                 "refresh_token": refresh_token,
             },
             auth=(CLIENT_ID, CLIENT_SECRET),
         )
-        resp.raise_for_status()
         return _save_tokens(resp.json())
     except requests.RequestException:
         return None
@@ -0,0 +1,131 @@
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from expense_pal.config import BATCHES_FILE
+from expense_pal.extraction import parse_response
+from expense_pal.metrics import record_scan
+from expense_pal.scanner import SUPPORTED_TYPES, get_scanner, usage_dict
+
+# Message batches are capped at 256 MB per request body; stay well below it
+_MAX_BATCH_BYTES = 200 * 1024 * 1024
+_MAX_BATCH_REQUESTS = 100_000
+
+
+def _load_state() -> dict:
+    if BATCHES_FILE.exists():
+        return json.loads(BATCHES_FILE.read_text(encoding="utf-8"))
+    return {"batches": []}
+
+
+def _save_state(state: dict):
+    BATCHES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = BATCHES_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(BATCHES_FILE)
+
+
+def submit_batches(folder: Path, model: str, use_cache: bool = True) -> list[dict]:
+    """Submit every unscanned receipt in ``folder`` as Message Batches.
+
+    Each request is built exactly as ``scan_receipt`` would build it. Receipts
+    that already have a scan cache entry are skipped unless ``use_cache`` is
+    False. The batch id and the custom_id -> file mapping are recorded in
+    ``BATCHES_FILE`` so ``collect_batches`` can fill the scan cache later.
+
+    Returns the recorded batch dicts (usually one, more for very large folders).
+    """
+    scanner = get_scanner()
+    files = sorted(f for f in folder.iterdir() if f.is_file() and f.suffix.lower() in SUPPORTED_TYPES)
+
+    chunks: list[tuple[list[dict], dict]] = []
+    requests: list[dict] = []
+    mapping: dict[str, dict] = {}
+    size = 0
+    for path in files:
+        prepared = scanner.prepare(path, model=model)
+        cache_key = prepared["cache_key"]
+        # The cache key is a hex SHA-256, which is a valid custom_id and makes
+        # identical copies of one receipt collapse into a single request.
+        if cache_key in mapping or any(cache_key in m for _, m in chunks):
+            continue
+        if use_cache and scanner.cache.get(cache_key) is not None:
+            continue
+        params, image_stats = scanner.build_params(prepared)
+        request_size = len(json.dumps(params))
+        if requests and (size + request_size > _MAX_BATCH_BYTES or len(requests) >= _MAX_BATCH_REQUESTS):
+            chunks.append((requests, mapping))
+            requests, mapping, size = [], {}, 0
+        requests.append({"custom_id": cache_key, "params": params})
+        mapping[cache_key] = {"file": str(path), "preprocess": image_stats}
+        size += request_size
+    if requests:
+        chunks.append((requests, mapping))
+
+    state = _load_state()
+    submitted = []
+    for requests, mapping in chunks:
+        batch = scanner.client.messages.batches.create(requests=requests)
+        record = {
+            "id": batch.id,
+            "model": model,
+            "folder": str(folder),
+            "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "status": "submitted",
+            "requests": mapping,
+        }
+        state["batches"].append(record)
+        _save_state(state)
+        submitted.append(record)
+    return submitted
+
+
+def collect_batches(wait: bool = True, poll_interval: float = 30.0) -> dict:
+    """Download results of every submitted batch into the scan cache.
+
+    With ``wait`` the call polls until all pending batches have ended;
+    otherwise batches still in progress are left for a later run.
+
+    Returns counts: succeeded, failed, pending.
+    """
+    scanner = get_scanner()
+    state = _load_state()
+    counts = {"succeeded": 0, "failed": 0, "pending": 0}
+    for record in state["batches"]:
+        if record["status"] != "submitted":
+            continue
+        batch = scanner.client.messages.batches.retrieve(record["id"])
+        while batch.processing_status != "ended" and wait:
+            time.sleep(poll_interval)
+            batch = scanner.client.messages.batches.retrieve(record["id"])
+        if batch.processing_status != "ended":
+            counts["pending"] += len(record["requests"])
+            continue
+
+        for item in scanner.client.messages.batches.results(record["id"]):
+            entry = record["requests"].get(item.custom_id)
+            if entry is None:
+                continue
+            if item.result.type != "succeeded":
+                entry["error"] = item.result.type
+                counts["failed"] += 1
+                continue
+            usage = usage_dict(item.result.message.usage)
+            try:
+                extracted = parse_response(item.result.message)
+            except (ValueError, IndexError) as exc:
+                entry["error"] = f"unparseable response: {exc}"
+                counts["failed"] += 1
+                record_scan(record["model"], usage, None, False, entry.get("preprocess"), source="batch", ok=False)
+                continue
+            record_scan(record["model"], usage, None, False, entry.get("preprocess"), source="batch")
+            if entry.get("preprocess") is not None:
+                extracted["preprocess"] = entry["preprocess"]
+            scanner.cache.put(item.custom_id, extracted)
+            counts["succeeded"] += 1
+
+        record["status"] = "collected"
+        record["collected_at"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        _save_state(state)
+    return counts
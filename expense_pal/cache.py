@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from expense_pal.config import SCAN_CACHE_DIR, SCAN_CACHE_MAX_AGE_DAYS, SCAN_CACHE_MAX_MB
+
+# Writes between full sweeps, which also catch entries other processes added
+_EVICT_EVERY = 500
+# A sweep over the size limit trims the store to this fraction of it, so the
+# next writes do not each trigger another sweep
+_EVICT_TO = 0.9
+
+
+def file_digest(data: bytes) -> str:
+    """Return the SHA-256 hex digest of a receipt's raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def prompt_version(*parts: str) -> str:
+    """Return a short hash identifying a prompt layout (template text, category list, ...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+class CacheBudget:
+    """Keeps a cache directory within a size limit without sweeping it on every write.
+
+    Writers report each file they write; the directory is swept with
+    ``evict_directory`` on the first write (to learn its size), once the
+    running total passes ``max_bytes`` (trimming it to ``_EVICT_TO`` of that)
+    and every ``_EVICT_EVERY`` writes, which also catches files other
+    processes added.
+    """
+
+    def __init__(self, directory: Path, pattern: str | tuple[str, ...], max_bytes: int, max_age: float = 0):
+        self.directory = directory
+        self.pattern = pattern
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.size: int | None = None
+        self._writes = 0
+
+    def wrote(self, added: int, replaced: int = 0):
+        """Account for a file of ``added`` bytes written over one of ``replaced`` bytes; sweeps if due."""
+        with self._lock:
+            self._writes += 1
+            if self.size is not None:
+                self.size += added - replaced
+            over = self.max_bytes and self.size is not None and self.size > self.max_bytes
+            sweep = self.size is None or over or self._writes >= _EVICT_EVERY
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """Drop expired files, then the oldest ones until under the size limit."""
+        size = evict_directory(
+            self.directory, self.pattern, self.max_bytes, self.max_age, int(self.max_bytes * _EVICT_TO)
+        )
+        with self._lock:
+            self.size, self._writes = size, 0
+
+
+class ScanCache:
+    """Content-addressed on-disk store of scan results.
+
+    Entries are keyed by the receipt's byte hash plus the model and prompt
+    version, so renaming a file or moving it to ``done/`` keeps its entry.
+    Each entry is a small JSON file; eviction drops entries older than
+    ``max_age_days`` and then the least recently used ones until the store
+    fits in ``max_mb``. Writes keep a running total of the store's size
+    (``CacheBudget``), so the directory is only swept once that total passes
+    ``max_mb`` or every ``_EVICT_EVERY`` writes, not on each one.
+    """
+
+    def __init__(
+        self,
+        directory: Path = SCAN_CACHE_DIR,
+        max_mb: float = SCAN_CACHE_MAX_MB,
+        max_age_days: float = SCAN_CACHE_MAX_AGE_DAYS,
+    ):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self._budget = CacheBudget(directory, "*/*.json", self.max_bytes, self.max_age)
+
+    @staticmethod
+    def key(digest: str, model: str, version: str) -> str:
+        return hashlib.sha256(f"{digest}:{model}:{version}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        if self.max_age and time.time() - stat.st_mtime > self.max_age:
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            result = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            path.unlink(missing_ok=True)
+            return None
+        # Bump mtime so eviction treats this entry as recently used
+        os.utime(path)
+        return result
+
+    def put(self, key: str, result: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        data = json.dumps(result).encode("utf-8")
+        tmp.write_bytes(data)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp, path)
+        self._budget.wrote(len(data), replaced)
+
+    def evict(self):
+        """Drop expired entries, then the oldest ones until under the size limit."""
+        self._budget.sweep()
+
+
+def evict_directory(
+    directory: Path, pattern: str | tuple[str, ...], max_bytes: int, max_age: float, target: int | None = None
+) -> int:
+    """Remove files matching ``pattern`` (one glob or several) older than
+    ``max_age`` seconds, then, if their total size is over ``max_bytes``, the
+    least recently modified ones until it is at most ``target`` (default
+    ``max_bytes``). Returns the total size of the files left."""
+    if not directory.exists():
+        return 0
+    now = time.time()
+    entries = []
+    total = 0
+    patterns = (pattern,) if isinstance(pattern, str) else pattern
+    for path in (path for p in patterns for path in directory.glob(p)):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if max_age and now - stat.st_mtime > max_age:
+            path.unlink(missing_ok=True)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    if not max_bytes or total <= max_bytes:
+        return total
+    target = max_bytes if target is None else target
+    entries.sort()
+    for _, size, path in entries:
+        path.unlink(missing_ok=True)
+        total -= size
+        if total <= target:
+            break
+    return total
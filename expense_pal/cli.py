@@ -1,21 +1,30 @@
 import argparse
 import json
+import re
 import sys
 from datetime import datetime, timezone
-from importlib.metadata import version
 from pathlib import Path
 
-from expense_pal.config import ANTHROPIC_API_KEY, DESCRIPTIONS_FILE, EXPENSES_LOG, require_credentials, save_description
-from expense_pal.auth import get_access_token
-from expense_pal.api import fetch_expense_descriptions, list_expenses
+from expense_pal import config
+from expense_pal.config import (
+    CASCADE,
+    DESCRIPTIONS_FILE,
+    EXPENSES_LOG,
+    LEDGER_FILE,
+    MULTI_SCAN_MODEL,
+    require_anthropic_key,
+    require_credentials,
+)
 
 SUPPORTED_SCAN_EXTENSIONS = {".jpg", ".jpeg", ".png", ".pdf"}
 
 
 def cmd_list(args):
     require_credentials()
-    token = get_access_token()
-    expenses = list_expenses(token)
+    # Imported after the credentials check: requests alone costs ~100ms of startup
+    from expense_pal.api import get_api_client, list_expenses
+
+    expenses = list_expenses(get_api_client())
 
     if not expenses:
         print("No expenses found.")
@@ -32,19 +41,43 @@ def cmd_list(args):
         print(f"{date:<12} {desc:<40} {gross:>10} {currency:<5}")
 
 
+def _parse_limit(value: str) -> int | None:
+    if value.lower() == "all":
+        return None
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive number or 'all', got {value!r}")
+    return int(value)
+
+
 def cmd_sync_descriptions(args):
     require_credentials()
-    token = get_access_token()
-    descriptions = fetch_expense_descriptions(token, total=200)
-    DESCRIPTIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    DESCRIPTIONS_FILE.write_text("\n".join(descriptions) + ("\n" if descriptions else ""), encoding="utf-8")
+    # Imported after the credentials check: requests alone costs ~100ms of startup
+    from expense_pal.api import fetch_expense_descriptions, get_api_client
+    from expense_pal.descriptions import get_description_store
+
+    descriptions = fetch_expense_descriptions(get_api_client(), limit=args.limit)
+    get_description_store().replace(descriptions)
     print(f"Saved {len(descriptions)} descriptions to {DESCRIPTIONS_FILE}")
 
 
+def _ask(question: str) -> bool:
+    """True if the user answers yes; False without asking when there is no terminal to ask on."""
+    if not sys.stdin.isatty():
+        return False
+    try:
+        return input(question).strip().lower() in ("y", "yes")
+    except EOFError:
+        return False
+
+
 def cmd_scan(args):
     from expense_pal.scanner import scan_receipt
+    from expense_pal.duplicates import fingerprint_file, get_fingerprint_index
+    from expense_pal.preprocess import format_stats
     from expense_pal.web_review import review_receipt
     from expense_pal.categories import get_all_categories, get_nominal_code
+    from expense_pal.descriptions import get_description_store
+    from expense_pal.ledger import created_at, get_ledger
 
     file_path = Path(args.file).resolve()
 
@@ -60,16 +93,52 @@ def cmd_scan(args):
         )
         sys.exit(1)
 
-    if not ANTHROPIC_API_KEY:
+    index = get_fingerprint_index()
+    index.sync()
+    fingerprint = fingerprint_file(file_path)
+    duplicate = index.match(fingerprint)
+    if duplicate and not args.allow_duplicate:
+        entry = duplicate["entry"]
         print(
-            "Error: ANTHROPIC_API_KEY is not set.\n"
-            "Add it to your .env file or export it in your shell.",
-            file=sys.stderr,
+            f"Probable duplicate ({duplicate['match']} match) of {entry.get('source_file', '?')}, "
+            f"already saved: {entry.get('date', '')} {entry.get('total_amount', '')} "
+            f"{entry.get('description', '')}"
         )
-        sys.exit(1)
+        if duplicate["match"] == "exact" or _ask("Is it the same receipt? [y/N] "):
+            print("Reusing that entry; nothing sent to Claude. Pass --allow-duplicate to scan it anyway.")
+            return
+
+    require_anthropic_key()
 
     print(f"Scanning {file_path.name} with Claude...")
-    extracted = scan_receipt(file_path)
+    try:
+        extracted = scan_receipt(file_path, model=args.model, use_cache=not args.no_cache)
+    except ValueError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        sys.exit(1)
+    cascade = extracted.pop("cascade", None)
+    if cascade:
+        print(f"Answered by {cascade['model']} (tier {cascade['tier'] + 1} of {len(config.CASCADE_MODELS)})")
+    image_stats = extracted.pop("preprocess", None)
+    if image_stats:
+        print(f"{'PDF' if 'pdf' in image_stats else 'Image'}: {format_stats(image_stats)}")
+    usage = extracted.pop("usage", None)
+    latency_ms = extracted.pop("latency_ms", None)
+    if usage:
+        print(
+            f"Tokens: {usage['input_tokens']} in "
+            f"(cache read {usage['cache_read_input_tokens']}, cache write {usage['cache_creation_input_tokens']}), "
+            f"{usage['output_tokens']} out"
+            + (f", {latency_ms / 1000:.1f}s" if latency_ms is not None else "")
+        )
+    else:
+        print("Loaded from scan cache.")
+    parse = extracted.pop("parse", None)
+    if parse:
+        if parse["malformed"]:
+            print("Recovered the extraction from malformed output.")
+        if parse["retried_fields"]:
+            print(f"Re-requested fields: {', '.join(parse['retried_fields'])}")
     print(f"Extracted: {extracted}")
 
     categories = get_all_categories()
@@ -90,19 +159,22 @@ def cmd_scan(args):
         "category_nominal_code": nominal_code,
         "description": confirmed["description"],
         "source_file": str(file_path),
-        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "created_at": created_at(),
     }
 
-    with EXPENSES_LOG.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
+    get_ledger().add(entry, fingerprint["sha256"])
+    index.add(fingerprint, entry)
 
-    save_description(confirmed["description"])
-    print(f"Saved to {EXPENSES_LOG}")
+    get_description_store().add(confirmed["description"])
+    print(f"Saved to {LEDGER_FILE}")
 
 
 def cmd_multi_scan(args):
     from expense_pal.web_review import review_receipts_batch
     from expense_pal.categories import get_all_categories
+    from expense_pal.duplicates import detect_duplicates
+    from expense_pal.preprocess import preprocess_files
+    from expense_pal.scanner import get_scanner
 
     folder = Path(args.folder).resolve()
 
@@ -114,13 +186,7 @@ def cmd_multi_scan(args):
         print(f"Error: not a directory: {folder}", file=sys.stderr)
         sys.exit(1)
 
-    if not ANTHROPIC_API_KEY:
-        print(
-            "Error: ANTHROPIC_API_KEY is not set.\n"
-            "Add it to your .env file or export it in your shell.",
-            file=sys.stderr,
-        )
-        sys.exit(1)
+    require_anthropic_key()
 
     pending = sorted(
         f.name for f in folder.iterdir()
@@ -132,21 +198,487 @@ def cmd_multi_scan(args):
         return
 
     print(f"Found {len(pending)} receipt(s) in {folder}")
+    fingerprints, duplicates = detect_duplicates([folder / name for name in pending])
+    if duplicates:
+        print(f"Flagged {len(duplicates)} probable duplicate(s); they will not be sent to Claude.")
+    image_stats = preprocess_files([folder / name for name in pending if name not in duplicates])
+    if image_stats:
+        original = sum(s["original_bytes"] for s in image_stats.values())
+        sent = sum(s["sent_bytes"] for s in image_stats.values())
+        tokens = sum(s["image_tokens"] or 0 for s in image_stats.values())
+        print(
+            f"Preprocessed {len(image_stats)} image(s): "
+            f"{original / 1048576:.1f} MB -> {sent / 1048576:.1f} MB, ~{tokens:,} image tokens"
+        )
     categories = get_all_categories()
-    confirmed = review_receipts_batch(folder, categories, train=args.train)
+    confirmed = review_receipts_batch(
+        folder,
+        categories,
+        train=args.train,
+        use_cache=not args.no_cache,
+        prefetch_workers=config.PREFETCH_WORKERS if args.prefetch is None else args.prefetch,
+        fingerprints=fingerprints,
+        duplicates=duplicates,
+    )
     print(f"\nProcessed {len(confirmed)} receipt(s).")
+    stats = get_scanner().stats
+    if stats["responses"]:
+        print(
+            f"Claude responses: {stats['responses']} "
+            f"({stats['malformed']} malformed, {stats['field_retries']} field retries)"
+        )
     if confirmed:
-        print(f"Saved to {EXPENSES_LOG}")
+        print(f"Saved to {LEDGER_FILE}")
+
+
+def cmd_prescan(args):
+    import asyncio
+
+    from expense_pal.engine import scan_receipts
+
+    folder = Path(args.folder).resolve()
+    if not folder.is_dir():
+        print(f"Error: not a directory: {folder}", file=sys.stderr)
+        sys.exit(1)
+    require_anthropic_key()
+
+    paths = sorted(
+        f for f in folder.iterdir()
+        if f.is_file() and f.suffix.lower() in SUPPORTED_SCAN_EXTENSIONS
+    )
+    if not paths:
+        print(f"No supported receipt files found in {folder}")
+        return
+
+    async def run() -> int:
+        failed = 0
+        done = 0
+        async for path, result in scan_receipts(
+            paths,
+            concurrency=args.concurrency or config.SCAN_CONCURRENCY,
+            model=args.model,
+            use_cache=not args.no_cache,
+        ):
+            done += 1
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"[{done}/{len(paths)}] {path.name}: failed ({result})")
+            else:
+                print(f"[{done}/{len(paths)}] {path.name}: {result['date']} {result['total_amount']} {result['category']}")
+        return failed
+
+    failed = asyncio.run(run())
+    print(f"Scanned {len(paths) - failed} of {len(paths)} receipt(s) into the scan cache.")
+
+
+def cmd_batch_submit(args):
+    from expense_pal.batch import submit_batches
+
+    folder = Path(args.folder).resolve()
+    if not folder.is_dir():
+        print(f"Error: not a directory: {folder}", file=sys.stderr)
+        sys.exit(1)
+    require_anthropic_key()
+    if args.model == CASCADE:
+        print("Error: the model cascade needs interactive validation; pick a single model for batches.", file=sys.stderr)
+        sys.exit(1)
+
+    batches = submit_batches(folder, model=args.model, use_cache=not args.no_cache)
+    if not batches:
+        print(f"Nothing to submit: every receipt in {folder} is already in the scan cache.")
+        return
+    for batch in batches:
+        print(f"Submitted batch {batch['id']} with {len(batch['requests'])} receipt(s).")
+    print("Run `expense-pal batch-collect` to download the results.")
+
+
+def cmd_batch_collect(args):
+    from expense_pal.batch import collect_batches
+
+    require_anthropic_key()
+    counts = collect_batches(wait=not args.no_wait, poll_interval=args.poll_interval)
+    print(f"Cached {counts['succeeded']} result(s); {counts['failed']} failed.")
+    if counts["pending"]:
+        print(f"{counts['pending']} receipt(s) still processing; run batch-collect again later.")
+
+
+def _parse_when(value: str) -> datetime:
+    """Parse a --since/--until value (YYYY-MM-DD or an ISO timestamp) as UTC."""
+    try:
+        when = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date/time: {value!r} (use YYYY-MM-DD or YYYY-MM-DDTHH:MM)")
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+
+def cmd_logs(args):
+    from collections import deque
+
+    from expense_pal.promptlog import load_texts, read_records
+
+    records = deque(read_records(file=args.file, since=args.since, until=args.until), maxlen=args.limit or None)
+    if not records:
+        print("No matching prompt log records.")
+        return
+    if args.json:
+        for entry in records:
+            print(json.dumps(entry))
+        return
+
+    texts = load_texts() if args.prompt else {}
+    header = f"{'Time (UTC)':<20} {'File':<32} {'Model':<26} {'ms':>6} {'In':>6} {'Cached':>6} {'Out':>5}  Result"
+    print(header)
+    print("-" * len(header))
+    for entry in records:
+        usage = entry.get("usage") or {}
+        response = entry.get("response") or {}
+        result = entry.get("error") or f"{response.get('date', '')} {response.get('total_amount', '')} {response.get('category', '')}"
+        print(
+            f"{entry['ts'][:19].replace('T', ' '):<20} {Path(entry['file']).name[:32]:<32} {entry['model'][:26]:<26} "
+            f"{entry.get('latency_ms') or '':>6} {usage.get('input_tokens', 0):>6} "
+            f"{usage.get('cache_read_input_tokens', 0):>6} {usage.get('output_tokens', 0):>5}  {result}"
+        )
+        if args.prompt:
+            template = texts.get(entry["template"])
+            # Older records hash the whole list; newer ones only its pinned head
+            descriptions = texts.get(entry["descriptions"], "") + entry.get("ranked_descriptions", "")
+            if template is None:
+                print("  (prompt template not found in the log)")
+                continue
+            prompt = template["user"].format(category_list=template["category_list"], description_list=descriptions)
+            print(f"\n=== System Prompt ===\n{template['system']}\n\n=== User Prompt ===\n{prompt}\n")
+
+
+def cmd_stats(args):
+    from expense_pal.metrics import read_metrics, summarise
+
+    records = read_metrics(since=args.since, until=args.until)
+    if args.model:
+        records = (r for r in records if r["model"] == args.model)
+    summary = summarise(records)
+    if not summary:
+        print("No scans recorded in that range.")
+        return
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    def ms(value):
+        return f"{value / 1000:.1f}s" if value is not None else "-"
+
+    def usd(value):
+        return f"${value:.4f}" if value is not None else "?"
+
+    header = (
+        f"{'Model':<28} {'Scans':>6} {'Hits':>5} {'p50':>7} {'p95':>7} "
+        f"{'In':>7} {'Cached':>7} {'Out':>5} {'Sent KB':>8} {'$/receipt':>10} {'Total':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for model, row in summary.items():
+        sent = f"{row['sent_bytes'] / 1024:,.0f}" if row["sent_bytes"] is not None else "-"
+        print(
+            f"{model[:28]:<28} {row['scans']:>6} {row['cache_hits']:>5} {ms(row['p50_ms']):>7} {ms(row['p95_ms']):>7} "
+            f"{row['input_tokens']:>7,.0f} {row['cache_read_input_tokens']:>7,.0f} {row['output_tokens']:>5,.0f} "
+            f"{sent:>8} {usd(row['cost_per_receipt']):>10} {usd(row['total_cost']):>9}"
+        )
+    print("Tokens and sent KB are means per API call; cache hits cost nothing. Costs are estimates at list prices.")
+
+
+def cmd_eval_prompt(args):
+    from expense_pal.evaluate import load_corpus, run_evaluation
+
+    require_anthropic_key()
+    limit = config.EVAL_LIMIT if args.limit is None else args.limit
+    corpus = load_corpus(limit=limit or None)
+    if not corpus:
+        print(f"No confirmed receipts found: {LEDGER_FILE} is empty or their files are gone.")
+        return
+
+    variants: dict[str, str | None] = {"saved": None}
+    for name in args.prompt or []:
+        path = Path(name)
+        if not path.is_file():
+            print(f"Error: prompt file not found: {path}", file=sys.stderr)
+            sys.exit(1)
+        variants[path.name] = path.read_text(encoding="utf-8")
+    models = args.model or [MULTI_SCAN_MODEL]
+
+    print(f"Evaluating {len(variants)} prompt(s) x {len(models)} model(s) on {len(corpus)} confirmed receipt(s)...")
+
+    def progress(done: int, total: int):
+        print(f"\r{done}/{total} scans", end="", file=sys.stderr, flush=True)
+
+    rows = run_evaluation(
+        corpus,
+        variants,
+        models,
+        concurrency=args.concurrency or config.SCAN_CONCURRENCY,
+        use_cache=not args.no_cache,
+        progress=progress if sys.stderr.isatty() else None,
+    )
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    def pct(value: float) -> str:
+        return f"{value * 100:.0f}%"
+
+    header = (
+        f"{'Prompt':<20} {'Model':<26} {'Date':>5} {'Total':>6} {'VAT':>5} {'Categ':>6} {'Descr':>6} {'All':>5} "
+        f"{'Fail':>5} {'Hits':>5} {'In':>6} {'Out':>5} {'p50':>6} {'p95':>6} {'Cost':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        accuracy = row["accuracy"]
+        tokens_in = f"{row['input_tokens']:,.0f}" if row["input_tokens"] is not None else "-"
+        tokens_out = f"{row['output_tokens']:,.0f}" if row["output_tokens"] is not None else "-"
+        p50 = f"{row['p50_ms'] / 1000:.1f}s" if row["p50_ms"] is not None else "-"
+        p95 = f"{row['p95_ms'] / 1000:.1f}s" if row["p95_ms"] is not None else "-"
+        cost = f"${row['cost']:.4f}" if row["cost"] is not None else "-"
+        print(
+            f"{row['prompt'][:20]:<20} {row['model'][:26]:<26} {pct(accuracy['date']):>5} "
+            f"{pct(accuracy['total_amount']):>6} {pct(accuracy['vat_amount']):>5} {pct(accuracy['category']):>6} "
+            f"{pct(accuracy['description']):>6} {pct(row['all_correct']):>5} {row['failed']:>5} {row['cached']:>5} "
+            f"{tokens_in:>6} {tokens_out:>5} {p50:>6} {p95:>6} {cost:>8}"
+        )
+    print("Tokens, latency and cost cover fresh API calls only; cache hits (Hits) are scored but cost nothing.")
+    if args.mistakes:
+        for row in rows:
+            shown = row["mistakes"][:args.mistakes]
+            if not shown:
+                continue
+            print(f"\n{row['prompt']} / {row['model']}:")
+            for mistake in shown:
+                if "error" in mistake:
+                    print(f"  {mistake['file']}: failed ({mistake['error']})")
+                else:
+                    print(f"  {mistake['file']}: {mistake['field']} {mistake['got']!r}, expected {mistake['expected']!r}")
+
+
+class _VersionAction(argparse.Action):
+    """``--version`` that only looks up the installed version when asked for it."""
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings, dest=dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from importlib.metadata import version
+
+        print(f"{parser.prog} {version('expense-pal')}")
+        parser.exit()
+
+
+def _parse_month(value: str, last: bool = False) -> str:
+    """Parse a report --since/--until value (YYYY-MM, YYYY-Qn or YYYY) as a YYYY-MM month.
+
+    Quarters and years stand for their first month, or their last with ``last``.
+    """
+    match = re.fullmatch(r"(\d{4})(?:-(?:(\d{2})|[Qq]([1-4])))?", value.strip())
+    if not match or (match[2] and not 1 <= int(match[2]) <= 12):
+        raise argparse.ArgumentTypeError(f"invalid month: {value!r} (use YYYY-MM, YYYY-Qn or YYYY)")
+    year, month, quarter = match.groups()
+    if month:
+        return f"{year}-{month}"
+    if quarter:
+        return f"{year}-{int(quarter) * 3 - (0 if last else 2):02d}"
+    return f"{year}-{12 if last else 1:02d}"
+
+
+def _parse_groupings(value: str) -> tuple[str, ...]:
+    from expense_pal.ledger import GROUPINGS
+
+    by = tuple(g.strip() for g in value.split(",") if g.strip())
+    unknown = [g for g in by if g not in GROUPINGS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"cannot group by {', '.join(unknown)}; choose from {', '.join(GROUPINGS)}")
+    return by
+
+
+def cmd_report(args):
+    import csv
+
+    from expense_pal.ledger import get_ledger
+
+    ledger = get_ledger()
+    if args.rebuild:
+        ledger.rebuild_totals()
+        print(f"Rebuilt report totals from {len(ledger)} entries", file=sys.stderr)
+    rows = ledger.totals(args.by, since=args.since, until=args.until)
+    keys = [k for g in args.by for k in (("nominal_code", "category") if g == "category" else (g,))]
+
+    def amount(value: int) -> str:
+        return f"{value / 100:.2f}"
+
+    if args.format == "json":
+        print(json.dumps([
+            {
+                **{k: row[k] for k in keys},
+                "entries": row["entries"],
+                "unpriced": row["unpriced"],
+                "net": row["net_pence"] / 100,
+                "vat": row["vat_pence"] / 100,
+                "gross": row["total_pence"] / 100,
+            }
+            for row in rows
+        ], indent=2))
+        return
+    if args.format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow([*keys, "entries", "unpriced", "net", "vat", "gross"])
+        for row in rows:
+            writer.writerow([
+                *(row[k] for k in keys), row["entries"], row["unpriced"],
+                amount(row["net_pence"]), amount(row["vat_pence"]), amount(row["total_pence"]),
+            ])
+        return
+
+    if not rows:
+        print("No confirmed expenses in that range.")
+        return
+
+    widths = {k: max(len(k), *(len(str(row[k])) for row in rows)) for k in keys}
+    if "category" in widths:
+        widths["category"] = min(widths["category"], 32)
+    if keys:
+        widths[keys[0]] = max(widths[keys[0]], len("Total"))
+
+    def line(labels: list[str], entries: str, net: str, vat: str, gross: str) -> str:
+        cells = [f"{label[:widths[k]]:<{widths[k]}}" for k, label in zip(keys, labels)]
+        return " ".join([*cells, f"{entries:>7}", f"{net:>12}", f"{vat:>11}", f"{gross:>12}"])
+
+    header = line([k.replace("_", " ").title() for k in keys], "Entries", "Net", "VAT", "Gross")
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(line(
+            [str(row[k]) for k in keys], f"{row['entries']:,}", f"{row['net_pence'] / 100:,.2f}",
+            f"{row['vat_pence'] / 100:,.2f}", f"{row['total_pence'] / 100:,.2f}",
+        ))
+    if len(rows) > 1:
+        print("-" * len(header))
+        print(line(
+            ["Total", *[""] * (len(keys) - 1)], f"{sum(r['entries'] for r in rows):,}",
+            f"{sum(r['net_pence'] for r in rows) / 100:,.2f}", f"{sum(r['vat_pence'] for r in rows) / 100:,.2f}",
+            f"{sum(r['total_pence'] for r in rows) / 100:,.2f}",
+        ))
+    unpriced = sum(r["unpriced"] for r in rows)
+    if unpriced:
+        print(f"{unpriced} entr{'y has' if unpriced == 1 else 'ies have'} no readable total and count as 0.")
+
+
+def cmd_ledger_import(args):
+    from expense_pal.ledger import get_ledger
+
+    ledger = get_ledger()
+    for name in args.files or [EXPENSES_LOG]:
+        path = Path(name)
+        if not path.is_file():
+            print(f"Error: file not found: {path}", file=sys.stderr)
+            sys.exit(1)
+        added = ledger.import_jsonl(path, force=True)
+        print(f"Imported {added} new entr{'y' if added == 1 else 'ies'} from {path}")
+    print(f"{LEDGER_FILE} holds {len(ledger)} entries")
+
+
+def cmd_ledger_export(args):
+    from expense_pal.ledger import get_ledger
+
+    ledger = get_ledger()
+    if args.output == "-":
+        ledger.export_jsonl(sys.stdout)
+        return
+    path = Path(args.output)
+    with path.open("w", encoding="utf-8") as f:
+        count = ledger.export_jsonl(f)
+    print(f"Exported {count} entries to {path}")
+
+
+def _parse_day(value: str) -> str:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}") from None
+
+
+def cmd_push(args):
+    from expense_pal.ledger import get_ledger
+
+    ledger = get_ledger()
+    pending = ledger.unpushed(since=args.since, limit=args.limit or None)
+    if not pending:
+        print("Nothing to push: every ledger entry in range is already in FreeAgent.")
+        return
+
+    def describe(entry: dict) -> str:
+        return f"{entry.get('date', ''):<10} {entry.get('total_amount', ''):>9}  {entry.get('description', '')[:40]}"
+
+    if args.dry_run:
+        from expense_pal.push import expense_payload, receipt_file
+
+        for _, entry in pending:
+            try:
+                expense_payload(entry, "")
+                note = "receipt attached" if receipt_file(entry) else "no receipt found"
+            except ValueError as exc:
+                note = f"cannot push: {exc}"
+            print(f"{describe(entry)}  ({note})")
+        print(f"\n{len(pending)} entr{'y' if len(pending) == 1 else 'ies'} would be pushed")
+        return
+
+    require_credentials()
+    # Imported after the credentials check: requests alone costs ~100ms of startup
+    from expense_pal.api import get_api_client, get_user_url
+    from expense_pal.push import push_expenses
+
+    client = get_api_client()
+    user_url = get_user_url(client)
+    workers = args.workers or config.PUSH_WORKERS
+    print(f"Pushing {len(pending)} entr{'y' if len(pending) == 1 else 'ies'} with {workers} workers...")
+    pushed = failed = unattached = 0
+    for result in push_expenses(ledger, client, user_url, pending, workers=workers):
+        if result.error is not None:
+            failed += 1
+            print(f"  failed  {describe(result.entry)}: {result.error}", file=sys.stderr)
+            continue
+        pushed += 1
+        if not result.attached:
+            unattached += 1
+        print(f"  pushed  {describe(result.entry)}{'' if result.attached else '  (no receipt)'}")
+    print(f"Pushed {pushed} of {len(pending)} to FreeAgent" + (f", {unattached} without a receipt" if unattached else ""))
+    if failed:
+        print(f"{failed} failed; run push again to retry them", file=sys.stderr)
+        sys.exit(1)
 
 
 def main():
     parser = argparse.ArgumentParser(prog="expense-pal", description="FreeAgent expense manager")
-    parser.add_argument("--version", action="version", version=f"%(prog)s {version('expense-pal')}")
+    parser.add_argument("--version", action=_VersionAction, help="show program's version number and exit")
     sub = parser.add_subparsers(dest="command")
     sub.add_parser("list", help="List recent expenses")
 
     scan_parser = sub.add_parser("scan", help="Scan a receipt or invoice with Claude")
     scan_parser.add_argument("file", help="Path to receipt image (.jpg, .png) or PDF (.pdf)")
+    scan_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Ignore cached scan results and re-scan with Claude",
+    )
+    scan_parser.add_argument(
+        "--model",
+        default=None,
+        help=f"Model to extract with, or '{CASCADE}' to escalate from the cheapest model (default: ANTHROPIC_MODEL)",
+    )
+    scan_parser.add_argument(
+        "--allow-duplicate",
+        action="store_true",
+        default=False,
+        help="Scan the receipt even if it looks like one already in the ledger",
+    )
 
     multi_scan_parser = sub.add_parser("multi-scan", help="Batch-process receipts from a folder")
     multi_scan_parser.add_argument(
@@ -161,8 +693,267 @@ def main():
         default=False,
         help="Show inline prompt editor for iterating on the extraction prompt",
     )
+    multi_scan_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Ignore cached scan results and re-scan each receipt with Claude",
+    )
+    multi_scan_parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of receipts to scan in the background ahead of the reviewer "
+        "(default: EXPENSE_PAL_PREFETCH_WORKERS, or 2; 0 disables)",
+    )
+
+    sync_parser = sub.add_parser("sync-descriptions", help="Sync expense descriptions from FreeAgent")
+    sync_parser.add_argument(
+        "--limit",
+        type=_parse_limit,
+        default=200,
+        metavar="N|all",
+        help="Read the descriptions of the N most recent expenses, or 'all' for the whole history (default: 200)",
+    )
+
+    prescan_parser = sub.add_parser(
+        "prescan", help="Scan a folder of receipts concurrently into the scan cache"
+    )
+    prescan_parser.add_argument(
+        "folder",
+        nargs="?",
+        default="receipts",
+        help="Folder containing receipts (default: receipts/)",
+    )
+    prescan_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Maximum requests in flight (default: EXPENSE_PAL_SCAN_CONCURRENCY, or 8)",
+    )
+    prescan_parser.add_argument(
+        "--model",
+        default=MULTI_SCAN_MODEL,
+        help=f"Model to extract with, or '{CASCADE}' (default: {MULTI_SCAN_MODEL}, the multi-scan default)",
+    )
+    prescan_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Re-scan receipts that already have cached results",
+    )
 
-    sub.add_parser("sync-descriptions", help="Sync expense descriptions from FreeAgent")
+    batch_submit_parser = sub.add_parser(
+        "batch-submit", help="Submit a folder of receipts for offline extraction via the Message Batches API"
+    )
+    batch_submit_parser.add_argument(
+        "folder",
+        nargs="?",
+        default="receipts",
+        help="Folder containing receipts (default: receipts/)",
+    )
+    batch_submit_parser.add_argument(
+        "--model",
+        default=MULTI_SCAN_MODEL,
+        help=f"Model to extract with (default: {MULTI_SCAN_MODEL}, the multi-scan default)",
+    )
+    batch_submit_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Also submit receipts that already have cached scan results",
+    )
+
+    batch_collect_parser = sub.add_parser(
+        "batch-collect", help="Download finished batch results into the scan cache"
+    )
+    batch_collect_parser.add_argument(
+        "--no-wait",
+        action="store_true",
+        default=False,
+        help="Collect only batches that have already ended instead of polling",
+    )
+    batch_collect_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="Seconds between status checks while waiting (default: 30)",
+    )
+
+    logs_parser = sub.add_parser("logs", help="Show logged extraction calls (prompt, model, latency, tokens, result)")
+    logs_parser.add_argument(
+        "--file",
+        default=None,
+        help="Only calls for receipts whose path contains this text (or whose SHA-256 starts with it)",
+    )
+    logs_parser.add_argument("--since", type=_parse_when, default=None, help="Only calls at or after this UTC date/time")
+    logs_parser.add_argument("--until", type=_parse_when, default=None, help="Only calls at or before this UTC date/time")
+    logs_parser.add_argument(
+        "--limit",
+        type=int,
+        default=50,
+        metavar="N",
+        help="Show the N most recent matching calls (default: 50, 0 for all)",
+    )
+    logs_parser.add_argument(
+        "--prompt",
+        action="store_true",
+        default=False,
+        help="Also print the full rendered prompt of each call",
+    )
+    logs_parser.add_argument(
+        "--json",
+        action="store_true",
+        default=False,
+        help="Print the raw JSONL records",
+    )
+
+    stats_parser = sub.add_parser("stats", help="Report scan latency, tokens and estimated cost per model")
+    stats_parser.add_argument("--since", type=_parse_when, default=None, help="Only scans at or after this UTC date/time")
+    stats_parser.add_argument("--until", type=_parse_when, default=None, help="Only scans at or before this UTC date/time")
+    stats_parser.add_argument("--model", default=None, help="Only scans with this model")
+    stats_parser.add_argument(
+        "--json",
+        action="store_true",
+        default=False,
+        help="Print the summary as JSON",
+    )
+
+    eval_parser = sub.add_parser(
+        "eval-prompt", help="Score prompt variants and models against receipts confirmed in the ledger"
+    )
+    eval_parser.add_argument(
+        "--prompt",
+        action="append",
+        metavar="FILE",
+        help="Prompt file to compare with the saved prompt (repeatable)",
+    )
+    eval_parser.add_argument(
+        "--model",
+        action="append",
+        help=f"Model to evaluate, or '{CASCADE}' (repeatable; default: {MULTI_SCAN_MODEL})",
+    )
+    eval_parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Use the N most recently confirmed receipts (default: EXPENSE_PAL_EVAL_LIMIT, or 50; 0 for all)",
+    )
+    eval_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Maximum requests in flight (default: EXPENSE_PAL_SCAN_CONCURRENCY, or 8)",
+    )
+    eval_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="Re-scan every receipt instead of reusing cached results for the same prompt and model",
+    )
+    eval_parser.add_argument(
+        "--mistakes",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Also list up to N wrong fields per prompt and model",
+    )
+    eval_parser.add_argument(
+        "--json",
+        action="store_true",
+        default=False,
+        help="Print the results, including mistakes, as JSON",
+    )
+
+    report_parser = sub.add_parser(
+        "report", help="Totals of confirmed expenses by month, quarter, year and category, with VAT"
+    )
+    report_parser.add_argument(
+        "--by",
+        type=_parse_groupings,
+        default=("month", "category"),
+        metavar="GROUPS",
+        help="Comma-separated groupings from month, quarter, year and category; empty for one total "
+        "(default: month,category)",
+    )
+    report_parser.add_argument(
+        "--since",
+        type=_parse_month,
+        default=None,
+        help="First month to include (YYYY-MM, or the start of YYYY-Qn or YYYY)",
+    )
+    report_parser.add_argument(
+        "--until",
+        type=lambda value: _parse_month(value, last=True),
+        default=None,
+        help="Last month to include (YYYY-MM, or the end of YYYY-Qn or YYYY)",
+    )
+    report_parser.add_argument(
+        "--format",
+        choices=("table", "csv", "json"),
+        default="table",
+        help="Output format (default: table)",
+    )
+    report_parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        default=False,
+        help="Recompute the totals from every ledger entry first (after editing the ledger by hand)",
+    )
+
+    import_parser = sub.add_parser(
+        "ledger-import", help="Import expenses.jsonl files into the ledger (entries already there are skipped)"
+    )
+    import_parser.add_argument(
+        "files",
+        nargs="*",
+        metavar="FILE",
+        help=f"JSONL files to import (default: {EXPENSES_LOG} in the current directory)",
+    )
+
+    export_parser = sub.add_parser("ledger-export", help="Write the whole ledger as JSON lines")
+    export_parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        metavar="FILE",
+        help="File to write (default: standard output)",
+    )
+
+    push_parser = sub.add_parser(
+        "push", help="Create FreeAgent expenses, with receipts attached, for ledger entries not yet pushed"
+    )
+    push_parser.add_argument(
+        "--since",
+        type=_parse_day,
+        default=None,
+        help="Only entries dated on or after this day (YYYY-MM-DD), e.g. to skip history already typed in",
+    )
+    push_parser.add_argument(
+        "--limit",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Push at most N entries, oldest first (default: 0, all)",
+    )
+    push_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Uploads in flight at once (default: EXPENSE_PAL_PUSH_WORKERS, or 4)",
+    )
+    push_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        default=False,
+        help="List what would be pushed without contacting FreeAgent",
+    )
 
     args = parser.parse_args()
     if args.command == "list":
@@ -173,6 +964,26 @@ def main():
         cmd_multi_scan(args)
     elif args.command == "sync-descriptions":
         cmd_sync_descriptions(args)
+    elif args.command == "prescan":
+        cmd_prescan(args)
+    elif args.command == "batch-submit":
+        cmd_batch_submit(args)
+    elif args.command == "batch-collect":
+        cmd_batch_collect(args)
+    elif args.command == "logs":
+        cmd_logs(args)
+    elif args.command == "stats":
+        cmd_stats(args)
+    elif args.command == "eval-prompt":
+        cmd_eval_prompt(args)
+    elif args.command == "report":
+        cmd_report(args)
+    elif args.command == "ledger-import":
+        cmd_ledger_import(args)
+    elif args.command == "ledger-export":
+        cmd_ledger_export(args)
+    elif args.command == "push":
+        cmd_push(args)
     else:
         parser.print_help()
         sys.exit(1)
@@ -2,50 +2,132 @@ import os
 import sys
 from pathlib import Path
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
-BASE_URL = "https://api.freeagent.com/v2"
 TOKEN_PATH = Path.home() / ".config" / "expense-pal" / "tokens.json"
 DESCRIPTIONS_FILE = Path.home() / ".config" / "expense-pal" / "descriptions.txt"
+SCAN_CACHE_DIR = Path.home() / ".config" / "expense-pal" / "scan_cache"
+IMAGE_CACHE_DIR = Path.home() / ".config" / "expense-pal" / "image_cache"
+BATCHES_FILE = Path.home() / ".config" / "expense-pal" / "batches.json"
+FINGERPRINTS_FILE = Path.home() / ".config" / "expense-pal" / "fingerprints.jsonl"
+FINGERPRINT_CACHE_FILE = Path.home() / ".config" / "expense-pal" / "fingerprint_cache.json"
+PROMPT_LOG_DIR = Path.home() / ".config" / "expense-pal" / "logs"
+LEDGER_FILE = Path.home() / ".config" / "expense-pal" / "ledger.db"
 CALLBACK_URL = "http://localhost:8374/callback"
 CALLBACK_PORT = 8374
 
-CLIENT_ID = os.environ.get("FREEAGENT_CLIENT_ID", "")
-CLIENT_SECRET = os.environ.get("FREEAGENT_CLIENT_SECRET", "")
+# Default selection of the multi-scan model dropdown; bulk pre-scans use it so
+# their cached results are picked up by the next multi-scan session.
+MULTI_SCAN_MODEL = "claude-sonnet-4-6"
+# Pseudo model name selecting the cascade: cheapest tier first, escalating on
+# failed validation through CASCADE_MODELS in order.
+CASCADE = "cascade"
 
-ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
-ANTHROPIC_MODEL = os.environ.get("ANTHROPIC_MODEL", "claude-opus-4-6")
+# The ledger before LEDGER_FILE: appended to in whichever directory the CLI ran
+# from; one found in the working directory is imported into the ledger.
+EXPENSES_LOG = Path("expenses.jsonl")
 
-_blacklist_raw = os.environ.get("EXPENSE_PAL_CATEGORY_BLACKLIST", "")
-CATEGORY_BLACKLIST: set[str] = {
-    code.strip() for code in _blacklist_raw.split(",") if code.strip()
-}
 
-EXPENSES_LOG = Path("expenses.jsonl")
+def _from_environment() -> dict:
+    """Load ``.env`` and read every environment-backed setting."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    CLIENT_ID = os.environ.get("FREEAGENT_CLIENT_ID", "")
+    CLIENT_SECRET = os.environ.get("FREEAGENT_CLIENT_SECRET", "")
+    # The sandbox (https://api.sandbox.freeagent.com/v2) or a local stand-in can be used instead
+    BASE_URL = os.environ.get("FREEAGENT_BASE_URL", "https://api.freeagent.com/v2").rstrip("/")
+    # FreeAgent allows 120 requests a minute per user
+    FREEAGENT_REQUESTS_PER_MINUTE = float(os.environ.get("EXPENSE_PAL_FREEAGENT_REQUESTS_PER_MINUTE", "120"))
+    PUSH_WORKERS = int(os.environ.get("EXPENSE_PAL_PUSH_WORKERS", "4"))
+    # Pages of expenses fetched at once when syncing from FreeAgent
+    SYNC_WORKERS = int(os.environ.get("EXPENSE_PAL_SYNC_WORKERS", "4"))
+    # Seconds to wait for a FreeAgent response before retrying or giving up
+    FREEAGENT_TIMEOUT = float(os.environ.get("EXPENSE_PAL_FREEAGENT_TIMEOUT", "30"))
+
+    ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
+    ANTHROPIC_MODEL = os.environ.get("ANTHROPIC_MODEL", "claude-opus-4-6")
+    _cascade_raw = os.environ.get(
+        "EXPENSE_PAL_CASCADE_MODELS", "claude-haiku-4-5-20251001,claude-sonnet-4-6,claude-opus-4-6"
+    )
+    CASCADE_MODELS: list[str] = [m.strip() for m in _cascade_raw.split(",") if m.strip()]
+
+    _blacklist_raw = os.environ.get("EXPENSE_PAL_CATEGORY_BLACKLIST", "")
+    CATEGORY_BLACKLIST: set[str] = {
+        code.strip() for code in _blacklist_raw.split(",") if code.strip()
+    }
+
+    SCAN_CACHE_MAX_MB = float(os.environ.get("EXPENSE_PAL_SCAN_CACHE_MAX_MB", "50"))
+    SCAN_CACHE_MAX_AGE_DAYS = float(os.environ.get("EXPENSE_PAL_SCAN_CACHE_MAX_AGE_DAYS", "90"))
+
+    IMAGE_MAX_EDGE = int(os.environ.get("EXPENSE_PAL_IMAGE_MAX_EDGE", "1568"))
+    IMAGE_JPEG_QUALITY = int(os.environ.get("EXPENSE_PAL_IMAGE_JPEG_QUALITY", "80"))
+    IMAGE_GRAYSCALE = os.environ.get("EXPENSE_PAL_IMAGE_GRAYSCALE", "").lower() in ("1", "true", "yes")
+    IMAGE_CACHE_MAX_MB = float(os.environ.get("EXPENSE_PAL_IMAGE_CACHE_MAX_MB", "200"))
+    PDF_TEXT_LAYER = os.environ.get("EXPENSE_PAL_PDF_TEXT", "1").lower() not in ("0", "false", "no")
+
+    PREFETCH_WORKERS = int(os.environ.get("EXPENSE_PAL_PREFETCH_WORKERS", "2"))
+    SCAN_CONCURRENCY = int(os.environ.get("EXPENSE_PAL_SCAN_CONCURRENCY", "8"))
+    SCAN_REQUESTS_PER_MINUTE = float(os.environ.get("EXPENSE_PAL_SCAN_REQUESTS_PER_MINUTE", "50"))
+
+    # Largest Hamming distance (of 64 bits) at which two image hashes count as the same receipt
+    DUPLICATE_MAX_DISTANCE = int(os.environ.get("EXPENSE_PAL_DUPLICATE_MAX_DISTANCE", "6"))
+
+    DESCRIPTION_TOKEN_BUDGET = int(os.environ.get("EXPENSE_PAL_DESCRIPTION_TOKEN_BUDGET", "400"))
+
+    PROMPT_LOG_ENABLED = os.environ.get("EXPENSE_PAL_PROMPT_LOG", "1").lower() not in ("0", "false", "no")
+    PROMPT_LOG_MAX_MB = float(os.environ.get("EXPENSE_PAL_PROMPT_LOG_MAX_MB", "5"))
+    PROMPT_LOG_RETENTION_DAYS = float(os.environ.get("EXPENSE_PAL_PROMPT_LOG_RETENTION_DAYS", "90"))
+    METRICS_ENABLED = os.environ.get("EXPENSE_PAL_METRICS", "1").lower() not in ("0", "false", "no")
+    METRICS_RETENTION_DAYS = float(os.environ.get("EXPENSE_PAL_METRICS_RETENTION_DAYS", "365"))
+    # Most recent confirmed receipts that eval-prompt and the train UI's Evaluate button score against
+    EVAL_LIMIT = int(os.environ.get("EXPENSE_PAL_EVAL_LIMIT", "50"))
+    return {name: value for name, value in locals().items() if name.isupper()}
+
+
+_settings: dict | None = None
+
+
+def _load() -> dict:
+    global _settings
+    if _settings is None:
+        _settings = _from_environment()
+        globals().update(_settings)
+    return _settings
+
+
+def __getattr__(name: str):
+    # Environment-backed settings are read on first use rather than at import,
+    # so importing this module (and anything that only needs the paths above)
+    # does not load .env.
+    if not name.startswith("__") and name in _load():
+        return _settings[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def load_descriptions() -> list[str]:
-    if not DESCRIPTIONS_FILE.exists():
-        return []
-    return [line for line in DESCRIPTIONS_FILE.read_text(encoding="utf-8").splitlines() if line.strip()]
+    from expense_pal.descriptions import get_description_store
+
+    return get_description_store().descriptions()
 
 
 def save_description(desc: str):
-    desc = desc.strip()
-    if not desc:
-        return
-    existing = load_descriptions()
-    if desc in existing:
-        return
-    DESCRIPTIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with DESCRIPTIONS_FILE.open("a", encoding="utf-8") as f:
-        f.write(desc + "\n")
+    from expense_pal.descriptions import get_description_store
+
+    get_description_store().add(desc)
+
+
+def require_anthropic_key():
+    if not _load()["ANTHROPIC_API_KEY"]:
+        print(
+            "Error: ANTHROPIC_API_KEY is not set.\n"
+            "Add it to your .env file or export it in your shell.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
 
 
 def require_credentials():
-    if not CLIENT_ID or not CLIENT_SECRET:
+    settings = _load()
+    if not settings["CLIENT_ID"] or not settings["CLIENT_SECRET"]:
         print(
             "Error: FREEAGENT_CLIENT_ID and FREEAGENT_CLIENT_SECRET must be set.\n"
             "Copy .env.example to .env and fill in your credentials.",
@@ -0,0 +1,428 @@
+import math
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from expense_pal.appendlog import get_append_log
+from expense_pal.config import DESCRIPTION_TOKEN_BUDGET, DESCRIPTIONS_FILE
+from expense_pal.ledger import Ledger, get_ledger
+
+_WORD_RE = re.compile(r"[a-z][a-z0-9&']{2,}")
+# Words that say nothing about the vendor or the expense
+_STOPWORDS = {
+    "the", "and", "for", "with", "from", "receipt", "receipts", "invoice", "invoices", "img", "image",
+    "scan", "scanned", "pdf", "jpg", "jpeg", "png", "photo", "document", "copy", "done", "pending",
+}
+# Relative weights of the ranking signals
+_SIMILARITY_WEIGHT = 3.0
+_FREQUENCY_WEIGHT = 1.0
+_RECENCY_WEIGHT = 1.0
+_RECENCY_HALF_LIFE_DAYS = 60.0
+# Popular descriptions considered for every receipt, plus at most this many of
+# the most popular ones sharing each of its words; keeps the per-scan work
+# independent of history size
+_POPULAR_POOL = 200
+# Incremental updates after which the index re-sorts by popularity
+_REBUILD_AFTER = 1000
+# Ledger columns the usage statistics are built from
+_USAGE_FIELDS = ("description", "created_at", "source_file")
+# Redundant lines (blank, padded or repeated) tolerated in descriptions.txt
+# before it is rewritten; at least this many, or a tenth of the file
+_COMPACT_MIN_REDUNDANT = 100
+
+
+def tokens(text: str) -> set[str]:
+    """Return the distinctive lowercase words of a file name, folder or description."""
+    words = _WORD_RE.findall(text.lower().replace("_", " ").replace("-", " "))
+    return {w for w in words if w not in _STOPWORDS}
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token, plus the "- " bullet and newline
+    return len(text) // 4 + 2
+
+
+class _FileTail:
+    """Follows an append-mostly line file, returning only the lines added since the last read.
+
+    A file that shrank, was replaced, or no longer ends with the bytes last
+    read is reported as reset and read again from the start. A trailing line
+    without its newline is left for the next read.
+    """
+
+    _ANCHOR_BYTES = 64
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self._key: tuple | None = None
+        self._anchor = b""
+
+    def read(self) -> tuple[list[str], bool]:
+        """Return (new lines, reset); after a reset the lines are the whole file."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            reset = self._key is not None
+            self.offset, self._key, self._anchor = 0, None, b""
+            return [], reset
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key == self._key:
+            return [], False
+        with self.path.open("rb") as f:
+            reset = self._key is None or stat.st_ino != self._key[0] or stat.st_size < self.offset
+            if not reset and self._anchor:
+                f.seek(self.offset - len(self._anchor))
+                reset = f.read(len(self._anchor)) != self._anchor
+            start = 0 if reset else self.offset
+            f.seek(start)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        self.offset = start + end
+        self._anchor = ((b"" if reset else self._anchor) + data[:end])[-self._ANCHOR_BYTES:]
+        self._key = key
+        return data[:end].decode("utf-8", errors="replace").splitlines(), reset
+
+    def skip_to_end(self):
+        """Treat the file as read up to its current end (after writing it ourselves)."""
+        self._key = None
+        self.read()
+
+
+class DescriptionStore:
+    """Known descriptions held in memory and kept in step with ``descriptions.txt``.
+
+    The file is read once; afterwards only lines appended since the last
+    look are read, so adding a description is one append and one set lookup
+    however long the list grows. A changed mtime or size is noticed on the
+    next call; a file edited in place rather than appended to is re-read in
+    full. Usage counts, last-used times and the words of the receipt file
+    names each description was confirmed for are followed from the ledger
+    the same way, reading only entries recorded since the last look.
+
+    When repeated, padded or blank lines pile up in the file (from edits or
+    other processes appending), it is rewritten deduplicated in a background
+    thread, holding the same lock as appends so none is lost to the rewrite.
+    """
+
+    def __init__(self, path: Path = DESCRIPTIONS_FILE, ledger: Ledger | None = None):
+        self.path = path
+        self.ledger = ledger
+        self._lock = threading.RLock()
+        self._text = _FileTail(path)
+        self._log = get_append_log(path)
+        self._adding: set[str] = set()
+        self._ledger_id = 0
+        self._descriptions: list[str] = []
+        self._known: set[str] = set()
+        self._usage: dict[str, list] = {}
+        self._redundant = 0
+        self._compacting = False
+        # Bumped when the file is re-read from scratch; between bumps
+        # ``_changed`` lists every description added or used, in order
+        self.generation = 0
+        self._changed: list[str] = []
+
+    def refresh(self):
+        """Pick up lines appended to (or changes made to) the file and new ledger entries since the last call."""
+        with self._lock:
+            lines, reset = self._text.read()
+            if reset:
+                self._descriptions, self._known, self._redundant = [], set(), 0
+                self._ledger_id = 0
+                self._usage = {}
+                self.generation += 1
+                self._changed = []
+            for line in lines:
+                self._ingest_description(line)
+            if self.ledger is None:
+                self.ledger = get_ledger()
+            for entry_id, entry in self.ledger.entries(self._ledger_id, fields=_USAGE_FIELDS):
+                self._ingest_entry(entry)
+                self._ledger_id = entry_id
+            compact = self._redundant >= max(_COMPACT_MIN_REDUNDANT, len(self._descriptions) // 10)
+            if compact and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self.compact, name="description-compact", daemon=True).start()
+
+    def _ingest_description(self, line: str):
+        description = line.strip()
+        if not description or description in self._known:
+            self._redundant += 1
+            return
+        if description != line:
+            self._redundant += 1
+        self._known.add(description)
+        self._descriptions.append(description)
+        self._changed.append(description)
+
+    def _ingest_entry(self, entry: dict):
+        description = str(entry.get("description", "")).strip()
+        if not description:
+            return
+        usage = self._usage.setdefault(description, [0, None, set()])
+        usage[0] += 1
+        when = _timestamp(entry.get("created_at", ""))
+        if when is not None and (usage[1] is None or when > usage[1]):
+            usage[1] = when
+        usage[2] |= tokens(Path(entry.get("source_file", "")).stem)
+        self._changed.append(description)
+
+    def descriptions(self) -> list[str]:
+        """All known descriptions, oldest first."""
+        with self._lock:
+            self.refresh()
+            return list(self._descriptions)
+
+    def __contains__(self, description: str) -> bool:
+        with self._lock:
+            self.refresh()
+            return description.strip() in self._known
+
+    def __len__(self) -> int:
+        with self._lock:
+            self.refresh()
+            return len(self._descriptions)
+
+    def usage(self, description: str) -> tuple[int, float | None, set[str]]:
+        """Return (times confirmed, last confirmed as a UTC timestamp, receipt file name words)."""
+        with self._lock:
+            count, last_used, words = self._usage.get(description, (0, None, set()))
+            return count, last_used, set(words)
+
+    def changes(self, generation: int, cursor: int) -> tuple[int, int, list[str] | None]:
+        """Descriptions added or used since a caller's last ``(generation, cursor)``.
+
+        Returns the new ``(generation, cursor, changed)``; ``changed`` is None
+        when the file was re-read from scratch since, so the caller must start over.
+        """
+        with self._lock:
+            self.refresh()
+            if generation != self.generation:
+                return self.generation, len(self._changed), None
+            return generation, len(self._changed), self._changed[cursor:]
+
+    def add(self, description: str) -> bool:
+        """Append a description unless it is already known; returns True if it was added.
+
+        The line goes out through the file's group-committing ``AppendLog``,
+        so concurrent confirms share one locked, fsynced write.
+        """
+        description = " ".join(description.splitlines()).strip()
+        if not description:
+            return False
+        with self._lock:
+            self.refresh()
+            if description in self._known or description in self._adding:
+                return False
+            self._adding.add(description)
+        try:
+            self._log.append([description])
+        finally:
+            with self._lock:
+                self._adding.discard(description)
+                self.refresh()
+        return True
+
+    def replace(self, descriptions: list[str]):
+        """Replace the whole file (e.g. with the descriptions synced from FreeAgent)."""
+        unique = list(dict.fromkeys(d.strip() for d in descriptions if d.strip()))
+        with self._lock, self._log.locked():
+            self._write(unique)
+            self._text = _FileTail(self.path)
+            self.refresh()
+
+    def compact(self):
+        """Rewrite the file without blank, padded or repeated lines."""
+        try:
+            with self._lock, self._log.locked():
+                # Terminate an unfinished last line first, or the rewrite would drop it
+                self._log.repair()
+                self.refresh()
+                if self._redundant:
+                    self._write(self._descriptions)
+                    self._text.skip_to_end()
+                    self._redundant = 0
+        finally:
+            self._compacting = False
+
+    def _write(self, descriptions: list[str]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text("".join(d + "\n" for d in descriptions), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+class DescriptionIndex:
+    """Ranks known descriptions for one receipt and fits the best into a token budget.
+
+    Built from a ``DescriptionStore``: each description has a usage count, a
+    last-used time and the words of the receipt file names it was confirmed
+    for (which usually name the vendor). For a receipt, candidates are the
+    descriptions sharing a word with its file name or folder plus a fixed
+    pool of the most popular ones, scored by
+
+        similarity to the file name / folder / earlier receipts of the vendor
+        + log-scaled usage frequency + exponentially decaying recency
+
+    so ranking costs the same with 5,000 descriptions as with 50. New and
+    newly confirmed descriptions are folded in as they arrive; the index is
+    rebuilt only when the store re-reads its file.
+    """
+
+    def __init__(
+        self,
+        store: "DescriptionStore | None" = None,
+        token_budget: int = DESCRIPTION_TOKEN_BUDGET,
+    ):
+        self.store = store or get_description_store()
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self._generation: int | None = None
+        self._cursor = 0
+        self._updates = 0
+        self._descriptions: list[str] = []
+        self._position: dict[str, int] = {}
+        self._words: list[set[str]] = []
+        self._counts: list[int] = []
+        self._last_used: list[float | None] = []
+        self._max_count = 0
+        self._base: list[float] = []
+        self._postings: dict[str, list[int]] = {}
+        self._popular: list[int] = []
+
+    def _refresh(self):
+        generation, cursor, changed = self.store.changes(self._generation or 0, self._cursor)
+        if self._generation is None or changed is None or self._updates + len(changed) > _REBUILD_AFTER:
+            self._rebuild()
+            return
+        self._cursor = cursor
+        self._updates += len(changed)
+        for description in dict.fromkeys(changed):
+            self._update(description)
+
+    def _rebuild(self):
+        generation, cursor, _ = self.store.changes(-1, 0)
+        descriptions = self.store.descriptions()
+        self._descriptions = descriptions
+        self._position = {d: i for i, d in enumerate(descriptions)}
+        self._words, self._counts, self._last_used = [], [], []
+        for description in descriptions:
+            count, last_used, words = self.store.usage(description)
+            self._words.append(tokens(description) | words)
+            self._counts.append(count)
+            self._last_used.append(last_used)
+        self._max_count = max(self._counts, default=0)
+
+        now = datetime.now(timezone.utc).timestamp()
+        self._base = [self._base_score(i, now) for i in range(len(descriptions))]
+        by_popularity = sorted(range(len(descriptions)), key=lambda i: -self._base[i])
+        postings: dict[str, list[int]] = {}
+        for index in by_popularity:
+            for w in self._words[index]:
+                postings.setdefault(w, []).append(index)
+        self._postings = postings
+        self._popular = by_popularity[:_POPULAR_POOL]
+        self._generation, self._cursor, self._updates = generation, cursor, 0
+
+    def _update(self, description: str):
+        """Fold in one added or newly confirmed description; it ranks as most popular until the next rebuild."""
+        index = self._position.get(description)
+        if index is None:
+            if description not in self.store:
+                return
+            index = len(self._descriptions)
+            self._descriptions.append(description)
+            self._position[description] = index
+            self._words.append(tokens(description))
+            self._counts.append(0)
+            self._last_used.append(None)
+            self._base.append(0.0)
+        count, last_used, words = self.store.usage(description)
+        self._counts[index], self._last_used[index] = count, last_used
+        self._max_count = max(self._max_count, count)
+        self._base[index] = self._base_score(index, datetime.now(timezone.utc).timestamp())
+        for w in self._words[index] | words:
+            posting = self._postings.setdefault(w, [])
+            if index in posting[:_POPULAR_POOL]:
+                continue
+            posting.insert(0, index)
+        self._words[index] |= words
+        if index not in self._popular:
+            self._popular = [index] + self._popular[:_POPULAR_POOL - 1]
+
+    def _base_score(self, index: int, now: float) -> float:
+        """Usage frequency plus recency of one description, independent of the receipt."""
+        count = self._counts[index]
+        frequency = math.log1p(count) / math.log1p(self._max_count) if self._max_count else 0.0
+        last_used = self._last_used[index]
+        if last_used is not None:
+            age_days = max(0.0, (now - last_used) / 86400)
+            recency = 0.5 ** (age_days / _RECENCY_HALF_LIFE_DAYS)
+        else:
+            # Never confirmed here: later lines of descriptions.txt are newer
+            recency = 0.25 * (index + 1) / len(self._descriptions)
+        return _FREQUENCY_WEIGHT * frequency + _RECENCY_WEIGHT * recency
+
+    def popular(self, token_budget: int) -> list[str]:
+        """Return the most used and most recent descriptions regardless of receipt, within ``token_budget``."""
+        with self._lock:
+            self._refresh()
+            ranked = sorted(range(len(self._descriptions)), key=lambda i: (-self._base[i], i))
+            return _fit([self._descriptions[i] for i in ranked], token_budget)
+
+    def rank(self, file_path: Path | None = None, hints: str = "", exclude: frozenset[str] = frozenset()) -> list[str]:
+        """Return the known descriptions for a receipt, best first, within the token budget.
+
+        ``hints`` is any extra text to match on, such as the vendor's name.
+        Descriptions in ``exclude`` (already in the prompt) are left out.
+        """
+        with self._lock:
+            self._refresh()
+            query = tokens(hints)
+            if file_path is not None:
+                query |= tokens(file_path.stem) | tokens(file_path.parent.name)
+            candidates = set(self._popular)
+            for w in query:
+                candidates.update(self._postings.get(w, ())[:_POPULAR_POOL])
+
+            def score(index: int) -> float:
+                similarity = len(query & self._words[index]) / len(query) if query else 0.0
+                return _SIMILARITY_WEIGHT * similarity + self._base[index]
+
+            ranked = sorted(candidates, key=lambda i: (-score(i), i))
+            return _fit((self._descriptions[i] for i in ranked if self._descriptions[i] not in exclude), self.token_budget)
+
+
+def _fit(descriptions, token_budget: int) -> list[str]:
+    """The leading ``descriptions`` that fit in ``token_budget``."""
+    chosen, used = [], 0
+    for description in descriptions:
+        cost = estimate_tokens(description)
+        if used + cost > token_budget:
+            break
+        chosen.append(description)
+        used += cost
+    return chosen
+
+
+def _timestamp(value: str) -> float | None:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+_store: DescriptionStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_description_store() -> DescriptionStore:
+    """Return the process-wide description store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DescriptionStore()
+        return _store
@@ -0,0 +1,339 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from expense_pal.appendlog import get_append_log, is_json_line
+from expense_pal.cache import file_digest
+from expense_pal.config import DUPLICATE_MAX_DISTANCE, FINGERPRINT_CACHE_FILE, FINGERPRINTS_FILE
+from expense_pal.ledger import Ledger, get_ledger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it only exact copies are detected
+    Image = None
+    ImageOps = None
+
+try:
+    import pypdf
+except ImportError:  # pypdf is optional; without it PDFs only get a byte hash
+    pypdf = None
+
+_IMAGE_TYPES = {".jpg", ".jpeg", ".png"}
+_WHITESPACE_RE = re.compile(r"\s+")
+# Below this a PDF's text layer is too thin to identify the receipt
+_MIN_TEXT_CHARS = 40
+
+
+def dhash(img) -> int:
+    """Return the 64-bit difference hash of a PIL image.
+
+    The image is shrunk to 9x8 grayscale and each bit records whether a pixel
+    is brighter than its right-hand neighbour, so re-encoding, resizing and
+    small lighting changes leave the hash (nearly) unchanged.
+    """
+    small = img.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def _image_hash(data: bytes) -> int | None:
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # JPEG decoders can downscale while decoding; a 9x8 hash needs very little
+            img.draft("L", (128, 128))
+            return dhash(ImageOps.exif_transpose(img))
+    except (OSError, ValueError):
+        return None
+
+
+def _page_image_hash(page) -> int | None:
+    """dHash of the largest image drawn on a PDF page (the photo in a scanned receipt)."""
+    xobjects = page.get("/Resources", {}).get("/XObject", {})
+    images = [xobjects[name].get_object() for name in xobjects]
+    images = [o for o in images if o.get("/Subtype") == "/Image"]
+    if not images:
+        return None
+    largest = max(images, key=lambda o: int(o.get("/Width", 0)) * int(o.get("/Height", 0)))
+    filters = largest.get("/Filter")
+    if filters == "/DCTDecode" or (isinstance(filters, list) and filters == ["/DCTDecode"]):
+        # A JPEG stored as-is: decode it at reduced size like any photo
+        return _image_hash(largest.get_data())
+    for image in page.images:
+        if image.indirect_reference == largest.indirect_reference and image.image is not None:
+            return dhash(image.image)
+    return None
+
+
+def _pdf_hashes(data: bytes) -> tuple[int | None, str | None]:
+    """Return (dhash of the largest embedded image, hash of the normalised text) of a PDF's first page."""
+    if pypdf is None:
+        return None, None
+    try:
+        page = pypdf.PdfReader(io.BytesIO(data)).pages[0]
+        text = _WHITESPACE_RE.sub(" ", page.extract_text() or "").strip().lower()
+        image = _page_image_hash(page) if Image is not None else None
+    except Exception:
+        # pypdf raises a variety of errors on damaged or encrypted files
+        return None, None
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] if len(text) >= _MIN_TEXT_CHARS else None
+    return image, text_hash
+
+
+def fingerprint_file(path: Path) -> dict:
+    """Return the fingerprint of one receipt: ``sha256`` of its bytes, plus
+    ``dhash`` (hex) of the image or of a scanned PDF's page image and ``text``,
+    a hash of a digital PDF's text layer, where they can be computed."""
+    data = path.read_bytes()
+    fingerprint = {"sha256": file_digest(data), "dhash": None, "text": None}
+    ext = path.suffix.lower()
+    if ext in _IMAGE_TYPES and Image is not None:
+        value = _image_hash(data)
+        fingerprint["dhash"] = f"{value:016x}" if value is not None else None
+    elif ext == ".pdf":
+        value, fingerprint["text"] = _pdf_hashes(data)
+        fingerprint["dhash"] = f"{value:016x}" if value is not None else None
+    return fingerprint
+
+
+def _stat_key(path: Path) -> str:
+    stat = path.stat()
+    return f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def fingerprint_files(paths: list[Path], workers: int | None = None) -> dict[Path, dict]:
+    """Fingerprint many receipts.
+
+    Fingerprints are remembered in ``FINGERPRINT_CACHE_FILE`` by path, size
+    and mtime, so unchanged files are not read again. Decoding is CPU-bound,
+    so more than a few new files are spread over a process pool.
+    """
+    cache = {}
+    if FINGERPRINT_CACHE_FILE.exists():
+        try:
+            cache = json.loads(FINGERPRINT_CACHE_FILE.read_text(encoding="utf-8"))
+        except ValueError:
+            cache = {}
+    keys = {p: _stat_key(p) for p in paths}
+    todo = [p for p in paths if keys[p] not in cache]
+    if len(todo) <= 4:
+        fresh = [fingerprint_file(p) for p in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fresh = list(pool.map(fingerprint_file, todo, chunksize=16))
+    if todo:
+        cache.update({keys[p]: fp for p, fp in zip(todo, fresh)})
+        FINGERPRINT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = FINGERPRINT_CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(cache), encoding="utf-8")
+        os.replace(tmp, FINGERPRINT_CACHE_FILE)
+    return {p: cache[keys[p]] for p in paths}
+
+
+def _bands(max_distance: int) -> list[tuple[int, int]]:
+    """(shift, mask) of ``max_distance + 1`` near-equal slices of a 64-bit hash."""
+    if max_distance >= 64:
+        # Any two hashes match: one empty slice that every hash shares
+        return [(0, 0)]
+    count = max(1, max_distance + 1)
+    bands, start = [], 0
+    for i in range(count):
+        width = 64 // count + (i < 64 % count)
+        bands.append((start, (1 << width) - 1))
+        start += width
+    return bands
+
+
+class _Lookup:
+    """Fingerprints indexed for matching, each stored with a value handed back on a match.
+
+    Exact copies and identical PDF text layers are found in dicts. For image
+    hashes, two 64-bit hashes at most ``max_distance`` bits apart agree
+    exactly on at least one of ``max_distance + 1`` slices, so only the
+    fingerprints sharing a slice are compared bit by bit.
+    """
+
+    def __init__(self, max_distance: int = DUPLICATE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._bands = _bands(max_distance)
+        self._values: list = []
+        self._sha256: dict[str, int] = {}
+        self._text: dict[str, int] = {}
+        self._dhash: dict[tuple[int, int], list[tuple[int, int]]] = {}
+
+    def add(self, fingerprint: dict, value):
+        position = len(self._values)
+        self._values.append(value)
+        self._sha256.setdefault(fingerprint["sha256"], position)
+        if fingerprint.get("text"):
+            self._text.setdefault(fingerprint["text"], position)
+        if fingerprint.get("dhash") and self.max_distance >= 0:
+            bits = int(fingerprint["dhash"], 16)
+            for band, (shift, mask) in enumerate(self._bands):
+                self._dhash.setdefault((band, bits >> shift & mask), []).append((bits, position))
+
+    def match(self, fingerprint: dict) -> tuple[object, dict] | None:
+        """The value of the closest fingerprint matching ``fingerprint`` and how it matches, or None."""
+        position = self._sha256.get(fingerprint["sha256"])
+        if position is not None:
+            return self._values[position], {"match": "exact", "distance": 0}
+        position = self._text.get(fingerprint.get("text")) if fingerprint.get("text") else None
+        if position is not None:
+            return self._values[position], {"match": "text", "distance": 0}
+        if not fingerprint.get("dhash") or self.max_distance < 0:
+            return None
+        bits = int(fingerprint["dhash"], 16)
+        best = None
+        for band, (shift, mask) in enumerate(self._bands):
+            for other, position in self._dhash.get((band, bits >> shift & mask), ()):
+                distance = bin(bits ^ other).count("1")
+                if distance <= self.max_distance and (best is None or (distance, position) < best):
+                    best = (distance, position)
+        if best is None:
+            return None
+        return self._values[best[1]], {"match": "perceptual", "distance": best[0]}
+
+
+def find_pending_duplicates(fingerprints: dict[str, dict]) -> dict[str, dict]:
+    """Find duplicates among pending files.
+
+    Files are taken in sorted order; each one matching an earlier file is
+    reported as ``{"of": earlier_name, "match": ..., "distance": ...}``.
+    """
+    originals = _Lookup()
+    duplicates = {}
+    for name in sorted(fingerprints):
+        fingerprint = fingerprints[name]
+        found = originals.match(fingerprint)
+        if found:
+            original, how = found
+            duplicates[name] = {"of": original, **how}
+        else:
+            originals.add(fingerprint, name)
+    return duplicates
+
+
+class FingerprintIndex:
+    """Fingerprints of processed receipts, each with the ledger entry it produced.
+
+    Stored as JSONL in ``FINGERPRINTS_FILE``. ``sync`` fingerprints any
+    ledger entry not yet indexed (looking for its file where it was scanned or
+    in the ``done/`` folder next to it), so the index fills itself from
+    existing history; ``add`` records each new confirmation. Only entries
+    recorded since the last ``sync`` are looked at. Records are indexed as
+    they are loaded, so ``match`` does not scan them all.
+    """
+
+    def __init__(self, path: Path = FINGERPRINTS_FILE, ledger: Ledger | None = None):
+        self.path = path
+        self.ledger = ledger
+        self._lock = threading.Lock()
+        self._records: list[dict] | None = None
+        self._lookup = _Lookup()
+        self._synced_id = 0
+
+    def _load(self) -> list[dict]:
+        if self._records is None:
+            records = []
+            if self.path.exists():
+                for line in self.path.read_text(encoding="utf-8").splitlines():
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+            self._records = records
+            for record in records:
+                self._lookup.add(record, record["entry"])
+        return self._records
+
+    def _append(self, records: list[dict]):
+        if not records:
+            return
+        loaded = self._load()
+        get_append_log(self.path, valid=is_json_line).append(json.dumps(r) for r in records)
+        loaded.extend(records)
+        for record in records:
+            self._lookup.add(record, record["entry"])
+
+    def sync(self, workers: int | None = None) -> int:
+        """Index ledger entries that are not in the index yet; returns how many were added."""
+        with self._lock:
+            if self.ledger is None:
+                self.ledger = get_ledger()
+            known = {r["entry"].get("source_file") for r in self._load()}
+            missing: dict[Path, dict] = {}
+            rows = self.ledger.entries(self._synced_id)
+            for _, entry in rows:
+                source = entry.get("source_file")
+                if not source or source in known:
+                    continue
+                known.add(source)
+                path = Path(source)
+                for candidate in (path, path.parent / "done" / path.name):
+                    if candidate.is_file():
+                        missing[candidate] = entry
+                        break
+            fingerprints = fingerprint_files(list(missing), workers)
+            self._append([{**fingerprints[p], "entry": entry} for p, entry in missing.items()])
+            if rows:
+                self._synced_id = rows[-1][0]
+            return len(missing)
+
+    def add(self, fingerprint: dict, entry: dict):
+        """Record a confirmed receipt's fingerprint with its ledger entry."""
+        with self._lock:
+            self._append([{**fingerprint, "entry": entry}])
+
+    def match(self, fingerprint: dict) -> dict | None:
+        """Return the closest processed receipt matching ``fingerprint`` as
+        ``{"entry": ledger_entry, "match": ..., "distance": ...}``, or None."""
+        with self._lock:
+            self._load()
+            found = self._lookup.match(fingerprint)
+        if found is None:
+            return None
+        entry, how = found
+        return {"entry": entry, **how}
+
+
+def detect_duplicates(paths: list[Path], workers: int | None = None) -> tuple[dict[str, dict], dict[str, dict]]:
+    """Fingerprint pending receipts and find the probable duplicates among them.
+
+    A receipt matching a processed one is reported with that receipt's ledger
+    ``entry``; otherwise one matching an earlier pending file is reported with
+    just its name. Returns (fingerprints, duplicates), both keyed by file name;
+    each duplicate is ``{"of": name, "match": ..., "distance": ..., "entry"?: ...}``.
+    """
+    index = get_fingerprint_index()
+    index.sync(workers)
+    fingerprints = {p.name: fp for p, fp in fingerprint_files(paths, workers).items()}
+    duplicates = {}
+    for name, fingerprint in fingerprints.items():
+        found = index.match(fingerprint)
+        if found:
+            entry = found.pop("entry")
+            duplicates[name] = {"of": Path(entry.get("source_file", "")).name, **found, "entry": entry}
+    remaining = {name: fp for name, fp in fingerprints.items() if name not in duplicates}
+    duplicates.update(find_pending_duplicates(remaining))
+    return fingerprints, duplicates
+
+
+_index: FingerprintIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_fingerprint_index() -> FingerprintIndex:
+    """Return the process-wide fingerprint index."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FingerprintIndex()
+        return _index
@@ -0,0 +1,235 @@
+import asyncio
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple
+
+import anthropic
+
+from expense_pal.config import CASCADE, CASCADE_MODELS, SCAN_CONCURRENCY, SCAN_REQUESTS_PER_MINUTE
+from expense_pal.extraction import extract_fields, failed_fields, retry_params
+from expense_pal.scanner import Cascade, Scanner, add_usage, get_scanner, merge_retry, usage_dict
+
+# Statuses worth retrying: rate limited, overloaded, and transient server errors
+_RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+_MAX_ATTEMPTS = 6
+_BACKOFF_BASE = 1.0
+_BACKOFF_CAP = 60.0
+
+
+class TokenBucket:
+    """Async token-bucket limiter that adapts to Anthropic rate-limit headers.
+
+    Starts at ``requests_per_minute`` and re-tunes itself from the
+    ``anthropic-ratelimit-requests-*`` headers of each response. A 429's
+    ``retry-after`` (or an exhausted ``remaining`` count) pauses every caller
+    until the limit resets.
+    """
+
+    def __init__(self, requests_per_minute: float = SCAN_REQUESTS_PER_MINUTE, burst: int | None = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(requests_per_minute // 10)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def update(self, headers):
+        """Adjust the rate from the response's rate-limit headers."""
+        limit = headers.get("anthropic-ratelimit-requests-limit")
+        if limit and limit.isdigit() and int(limit) > 0:
+            self.rate = int(limit) / 60.0
+            self.capacity = float(max(1, int(limit) // 10))
+        remaining = headers.get("anthropic-ratelimit-requests-remaining")
+        reset = headers.get("anthropic-ratelimit-requests-reset")
+        if remaining == "0" and reset:
+            try:
+                wait = datetime.fromisoformat(reset.replace("Z", "+00:00")).timestamp() - time.time()
+            except ValueError:
+                wait = 0
+            if wait > 0:
+                self.pause(wait)
+
+
+def _retry_after(exc: anthropic.APIStatusError) -> float | None:
+    value = exc.response.headers.get("retry-after") if exc.response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: spread retries so concurrent workers don't stampede together
+    return random.uniform(0, min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt))
+
+
+async def _scan_one(
+    client: anthropic.AsyncAnthropic,
+    scanner: Scanner,
+    limiter: TokenBucket,
+    semaphore: asyncio.Semaphore,
+    path: Path,
+    model: str | None,
+    use_cache: bool,
+    prompt_template: str | None = None,
+) -> dict:
+    if model != CASCADE:
+        return await _scan_model(client, scanner, limiter, semaphore, path, model, use_cache, prompt_template)
+    cascade = Cascade(CASCADE_MODELS)
+    for tier_model in cascade.models:
+        try:
+            result = await _scan_model(
+                client, scanner, limiter, semaphore, path, tier_model, use_cache, prompt_template
+            )
+        except (ValueError, IndexError) as exc:
+            cascade.failed(tier_model, exc)
+            continue
+        if cascade.answered(tier_model, result):
+            break
+    return cascade.result()
+
+
+async def _scan_model(
+    client: anthropic.AsyncAnthropic,
+    scanner: Scanner,
+    limiter: TokenBucket,
+    semaphore: asyncio.Semaphore,
+    path: Path,
+    model: str | None,
+    use_cache: bool,
+    prompt_template: str | None = None,
+) -> dict:
+    prepared = await asyncio.to_thread(scanner.prepare, path, model, prompt_template)
+    if use_cache:
+        cached = await asyncio.to_thread(scanner.cached, prepared)
+        if cached is not None:
+            return cached
+
+    async with semaphore:
+        params, image_stats = await asyncio.to_thread(scanner.build_params, prepared)
+        message = await _create(client, limiter, params, prepared)
+        fields, malformed = extract_fields(message)
+        usage = usage_dict(message.usage)
+        failed = failed_fields(fields)
+        if failed:
+            retry = await _create(client, limiter, retry_params(params, message, failed))
+            fields = merge_retry(fields, retry, failed)
+            usage = add_usage(usage, usage_dict(retry.usage))
+        # Writes the scan cache and queues the log records; keep that file I/O off the event loop
+        return await asyncio.to_thread(
+            scanner.finish, prepared, fields, usage, image_stats, malformed=malformed, retried=failed
+        )
+
+
+async def _create(client: anthropic.AsyncAnthropic, limiter: TokenBucket, params: dict, prepared: dict | None = None):
+    """Send one request through the limiter, retrying throttling and transient errors.
+
+    If given, ``prepared["sent_at"]`` is set once the limiter first admits the
+    request, so waiting for the rate limit does not count as API latency.
+    """
+    for attempt in range(_MAX_ATTEMPTS):
+        await limiter.acquire()
+        if prepared is not None and "sent_at" not in prepared:
+            prepared["sent_at"] = time.monotonic()
+        try:
+            raw = await client.messages.with_raw_response.create(**params)
+        except anthropic.APIStatusError as exc:
+            if exc.status_code not in _RETRY_STATUSES or attempt == _MAX_ATTEMPTS - 1:
+                raise
+            delay = _retry_after(exc)
+            if delay is not None:
+                limiter.pause(delay)
+            await asyncio.sleep(_backoff(attempt) if delay is None else random.uniform(0, 1))
+            continue
+        except anthropic.APIConnectionError:
+            if attempt == _MAX_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        limiter.update(raw.headers)
+        return await raw.parse()
+    raise AssertionError("unreachable")
+
+
+class ScanJob(NamedTuple):
+    """One receipt to scan with a model and, optionally, a prompt template other than the saved one."""
+
+    path: Path
+    model: str | None = None
+    prompt_template: str | None = None
+
+
+async def scan_receipts(
+    paths: list[Path],
+    concurrency: int = SCAN_CONCURRENCY,
+    model: str | None = None,
+    use_cache: bool = True,
+    requests_per_minute: float = SCAN_REQUESTS_PER_MINUTE,
+) -> AsyncIterator[tuple[Path, dict | Exception]]:
+    """Scan many receipts concurrently, yielding ``(path, result)`` as each completes.
+
+    At most ``concurrency`` requests are in flight, admitted through a
+    rate-limit-aware token bucket. 429/529 and transient errors are retried
+    with jittered exponential backoff (honouring ``retry-after``). A receipt
+    that still fails yields its exception instead of a result dict.
+    Results are cached exactly like ``scan_receipt``.
+    """
+    jobs = [ScanJob(path, model) for path in paths]
+    async for job, result in scan_jobs(jobs, concurrency, use_cache, requests_per_minute):
+        yield job.path, result
+
+
+async def scan_jobs(
+    jobs: list[ScanJob],
+    concurrency: int = SCAN_CONCURRENCY,
+    use_cache: bool = True,
+    requests_per_minute: float = SCAN_REQUESTS_PER_MINUTE,
+) -> AsyncIterator[tuple[ScanJob, dict | Exception]]:
+    """Like ``scan_receipts``, but each job names its own model and prompt template.
+
+    All jobs share one client, concurrency limit and rate limiter, so several
+    models or prompt variants can be run side by side over the same receipts.
+    """
+    scanner = get_scanner()
+    limiter = TokenBucket(requests_per_minute)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async with anthropic.AsyncAnthropic(api_key=scanner.api_key, max_retries=0) as client:
+
+        async def run(job: ScanJob) -> tuple[ScanJob, dict | Exception]:
+            try:
+                result = await _scan_one(
+                    client, scanner, limiter, semaphore, job.path, job.model, use_cache, job.prompt_template
+                )
+                return job, result
+            except Exception as exc:
+                return job, exc
+
+        tasks = [asyncio.create_task(run(job)) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,161 @@
+import asyncio
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Callable
+
+from expense_pal.config import SCAN_CONCURRENCY
+from expense_pal.engine import ScanJob, scan_jobs
+from expense_pal.extraction import EXTRACTION_FIELDS
+from expense_pal.ledger import Ledger, get_ledger
+from expense_pal.metrics import estimate_cost, percentile
+from expense_pal.scanner import SUPPORTED_TYPES
+
+# Mismatches kept per prompt/model row, for showing examples
+_MAX_MISTAKES = 200
+
+
+def load_corpus(ledger: Ledger | None = None, limit: int | None = None) -> list[tuple[Path, dict]]:
+    """Return (receipt file, confirmed entry) pairs to evaluate against, most recent last.
+
+    Confirmed entries in the ledger are the ground truth. Each entry's file
+    is looked for where it was scanned and in the ``done/`` folder next to
+    it; entries whose file is gone are skipped, and a file confirmed twice
+    keeps its latest entry. ``limit`` keeps only the most recent receipts.
+    """
+    corpus: dict[Path, dict] = {}
+    for _, entry in (ledger or get_ledger()).entries():
+        source = entry.get("source_file")
+        if not source:
+            continue
+        path = Path(source)
+        for candidate in (path, path.parent / "done" / path.name):
+            if candidate.is_file() and candidate.suffix.lower() in SUPPORTED_TYPES:
+                corpus.pop(candidate, None)
+                corpus[candidate] = entry
+                break
+    pairs = list(corpus.items())
+    return pairs[-limit:] if limit else pairs
+
+
+def _amount(value) -> Decimal | None:
+    try:
+        return Decimal(str(value).replace(",", "").strip())
+    except InvalidOperation:
+        return None
+
+
+def field_correct(field: str, expected, actual) -> bool:
+    """Whether an extracted field matches the confirmed value.
+
+    Amounts are compared as numbers and descriptions ignoring case and
+    whitespace; other fields must match exactly.
+    """
+    if field in ("total_amount", "vat_amount"):
+        a, b = _amount(expected), _amount(actual)
+        if a is not None and b is not None:
+            return a == b
+    if field == "description":
+        return " ".join(str(expected).split()).casefold() == " ".join(str(actual).split()).casefold()
+    return str(expected).strip() == str(actual).strip()
+
+
+def _summarise(label: str, model: str, results: list[tuple[Path, dict, dict | Exception]]) -> dict:
+    correct = {field: 0 for field in EXTRACTION_FIELDS}
+    all_correct = 0
+    failed = 0
+    calls = []
+    mistakes = []
+    for path, entry, result in results:
+        if isinstance(result, Exception):
+            failed += 1
+            if len(mistakes) < _MAX_MISTAKES:
+                mistakes.append({"file": path.name, "error": str(result)})
+            continue
+        wrong = [f for f in EXTRACTION_FIELDS if not field_correct(f, entry.get(f, ""), result.get(f, ""))]
+        for field in EXTRACTION_FIELDS:
+            correct[field] += field not in wrong
+        all_correct += not wrong
+        for field in wrong:
+            if len(mistakes) < _MAX_MISTAKES:
+                mistakes.append({
+                    "file": path.name,
+                    "field": field,
+                    "expected": entry.get(field, ""),
+                    "got": result.get(field, ""),
+                })
+        if result.get("usage"):
+            calls.append(result)
+
+    receipts = len(results)
+
+    def mean(key: str) -> float | None:
+        return sum(c["usage"].get(key, 0) for c in calls) / len(calls) if calls else None
+
+    latencies = [c["latency_ms"] for c in calls if c.get("latency_ms") is not None]
+    costs = [estimate_cost(model, c["usage"]) for c in calls]
+    return {
+        "prompt": label,
+        "model": model,
+        "receipts": receipts,
+        "failed": failed,
+        "cached": receipts - failed - len(calls),
+        "accuracy": {f: correct[f] / receipts if receipts else 0.0 for f in EXTRACTION_FIELDS},
+        "all_correct": all_correct / receipts if receipts else 0.0,
+        "input_tokens": mean("input_tokens"),
+        "cache_read_input_tokens": mean("cache_read_input_tokens"),
+        "output_tokens": mean("output_tokens"),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "cost": sum(costs) if costs and None not in costs else None,
+        "mistakes": mistakes,
+    }
+
+
+async def evaluate(
+    corpus: list[tuple[Path, dict]],
+    variants: dict[str, str | None],
+    models: list[str],
+    concurrency: int = SCAN_CONCURRENCY,
+    use_cache: bool = True,
+    progress: Callable[[int, int], None] | None = None,
+) -> list[dict]:
+    """Scan the corpus with every prompt variant and model and score the answers.
+
+    ``variants`` maps a label to a prompt template (None for the saved
+    prompt). Every (variant, model, receipt) scan runs concurrently through
+    ``engine.scan_jobs``. Cached results for the same bytes, model and prompt
+    are reused unless ``use_cache`` is False; they count towards accuracy but
+    not towards tokens or latency. ``progress(done, total)`` is called as
+    scans finish.
+
+    Returns one row per (variant, model) with per-field accuracy, the share
+    of receipts with every field right, failures, cache hits, mean tokens,
+    p50/p95 API latency and estimated cost of the fresh calls, plus examples
+    of ``mistakes``.
+    """
+    truth = dict(corpus)
+    jobs = {}
+    for label, template in variants.items():
+        for model in models:
+            for path, _ in corpus:
+                jobs[ScanJob(path, model, template)] = (label, model)
+    results: dict[tuple[str, str], list] = {key: [] for key in dict.fromkeys(jobs.values())}
+    done = 0
+    async for job, result in scan_jobs(list(jobs), concurrency, use_cache):
+        results[jobs[job]].append((job.path, truth[job.path], result))
+        done += 1
+        if progress is not None:
+            progress(done, len(jobs))
+    return [_summarise(label, model, rows) for (label, model), rows in results.items()]
+
+
+def run_evaluation(
+    corpus: list[tuple[Path, dict]],
+    variants: dict[str, str | None],
+    models: list[str],
+    concurrency: int = SCAN_CONCURRENCY,
+    use_cache: bool = True,
+    progress: Callable[[int, int], None] | None = None,
+) -> list[dict]:
+    """Synchronous wrapper around ``evaluate``."""
+    return asyncio.run(evaluate(corpus, variants, models, concurrency, use_cache, progress))
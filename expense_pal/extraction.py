@@ -0,0 +1,232 @@
+import json
+import re
+
+TOOL_NAME = "record_receipt"
+
+# Field -> default used when the model never supplies it
+EXTRACTION_FIELDS = {
+    "date": "",
+    "total_amount": "0.00",
+    "vat_amount": "0.00",
+    "category": "",
+    "description": "",
+}
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_AMOUNT_RE = re.compile(r"^-?\d+(?:\.\d+)?$")
+
+
+def build_extraction_tool(category_names: list[str]) -> dict:
+    """Return the tool definition the model is forced to call with its extraction."""
+    return {
+        "name": TOOL_NAME,
+        "description": "Record the data extracted from a receipt or invoice.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "date": {"type": "string", "description": "Date in YYYY-MM-DD format"},
+                "total_amount": {"type": "string", "description": "Total amount paid, e.g. \"45.50\""},
+                "vat_amount": {"type": "string", "description": "VAT/tax amount, or \"0.00\" if not shown"},
+                "category": {"type": "string", "enum": category_names},
+                "description": {"type": "string", "description": "Short description of the expense"},
+            },
+            "required": list(EXTRACTION_FIELDS),
+        },
+    }
+
+
+def parse_loose_json(text: str) -> dict:
+    """Recover as many extraction fields as possible from free text.
+
+    Tries, in order: the whole text (minus markdown fences) as JSON, the
+    outermost ``{...}`` span with trailing commas and smart quotes repaired,
+    and finally a per-field regex scan. Returns whatever fields were found.
+    """
+    text = text.strip().translate(_SMART_QUOTES)
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    candidates = [text]
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        span = text[start:end + 1]
+        candidates += [span, _TRAILING_COMMA_RE.sub(r"\1", span)]
+    for candidate in candidates:
+        try:
+            value = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+
+    found = {}
+    for field in EXTRACTION_FIELDS:
+        match = re.search(rf'["\']?{field}["\']?\s*:\s*(?:"([^"\n]*)"|\'([^\'\n]*)\'|(-?\d+(?:\.\d+)?))', text)
+        if match:
+            found[field] = next(g for g in match.groups() if g is not None)
+    return found
+
+
+def failed_fields(fields: dict) -> list[str]:
+    """Return the extraction fields that are missing or of an unusable type."""
+    failed = []
+    for field in EXTRACTION_FIELDS:
+        value = fields.get(field)
+        if isinstance(value, (int, float)) and field in ("total_amount", "vat_amount"):
+            continue
+        if not isinstance(value, str) or not value.strip():
+            failed.append(field)
+        elif field in ("total_amount", "vat_amount") and not _AMOUNT_RE.match(value.strip()):
+            failed.append(field)
+    return failed
+
+
+def extract_fields(message) -> tuple[dict, bool]:
+    """Pull the raw extraction out of a response.
+
+    Returns (fields, malformed) where ``malformed`` is True when the model did
+    not answer through the tool and the fields had to be recovered from text.
+    """
+    for block in message.content:
+        if getattr(block, "type", None) == "tool_use" and block.name == TOOL_NAME:
+            if isinstance(block.input, dict):
+                return dict(block.input), False
+    text = "".join(getattr(block, "text", "") for block in message.content if getattr(block, "type", None) == "text")
+    return parse_loose_json(text), True
+
+
+def normalise(fields: dict) -> dict:
+    """Fill defaults and coerce values to the string form the review UI expects."""
+    result = {}
+    for field, default in EXTRACTION_FIELDS.items():
+        value = fields.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = f"{value:.2f}" if field in ("total_amount", "vat_amount") else str(value)
+        result[field] = value.strip() if isinstance(value, str) and value.strip() else default
+    return result
+
+
+def retry_params(params: dict, message, failed: list[str]) -> dict:
+    """Build a follow-up request asking the model to re-supply only ``failed``.
+
+    The original request is replayed unchanged (so its prompt-cache prefix
+    still hits) with the model's answer and a correction appended.
+    """
+    correction = (
+        f"These fields were missing or invalid: {', '.join(failed)}. "
+        f"Call {TOOL_NAME} again; only those fields will be used."
+    )
+    tool_use = next(
+        (b for b in message.content if getattr(b, "type", None) == "tool_use" and b.name == TOOL_NAME), None
+    )
+    assistant_content = [b.model_dump(exclude_none=True) if hasattr(b, "model_dump") else b for b in message.content]
+    if tool_use is not None:
+        follow_up = [{"type": "tool_result", "tool_use_id": tool_use.id, "is_error": True, "content": correction}]
+    else:
+        follow_up = [{"type": "text", "text": correction}]
+    return {
+        **params,
+        "messages": [
+            *params["messages"],
+            {"role": "assistant", "content": assistant_content},
+            {"role": "user", "content": follow_up},
+        ],
+    }
+
+
+def parse_response(message) -> dict:
+    """Parse a Messages API response into the normalised extraction dict.
+
+    Raises ValueError if no extraction field at all could be recovered.
+    """
+    fields, _ = extract_fields(message)
+    if len(failed_fields(fields)) == len(EXTRACTION_FIELDS):
+        raise ValueError("no extraction fields found in the response")
+    return normalise(fields)
+
+
+class IncrementalFieldParser:
+    """Pick top-level fields out of a JSON object as it streams in.
+
+    ``feed`` takes the next chunk of text (a tool's ``partial_json`` or plain
+    text output; anything before the first ``{`` is ignored) and returns the
+    ``(field, value)`` pairs whose values became complete with that chunk.
+    String values complete at their closing quote, numbers and literals at the
+    following ``,`` or ``}``.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._token = ""
+        self._key: str | None = None
+        self._expect_value = False
+        self._scalar = ""
+        self.fields: dict = {}
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        completed = []
+        for ch in chunk:
+            if self._in_string:
+                self._token += ch
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(completed)
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._token = ch
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth > 1:
+                    # Nested values are not extraction fields; drop the key
+                    self._expect_value = False
+                    self._key = None
+            elif ch in "}]":
+                if self._depth == 1:
+                    self._end_scalar(completed)
+                self._depth -= 1
+            elif self._depth == 1:
+                if ch == ":":
+                    self._expect_value = self._key is not None
+                elif ch == ",":
+                    self._end_scalar(completed)
+                elif self._expect_value and not ch.isspace():
+                    self._scalar += ch
+        return completed
+
+    def _end_string(self, completed: list):
+        if self._depth != 1:
+            return
+        try:
+            value = json.loads(self._token)
+        except ValueError:
+            value = self._token.strip('"')
+        if self._expect_value:
+            self._emit(completed, value)
+        else:
+            self._key = value
+
+    def _end_scalar(self, completed: list):
+        if self._expect_value and self._scalar:
+            try:
+                value = json.loads(self._scalar)
+            except ValueError:
+                value = self._scalar
+            self._emit(completed, value)
+        self._scalar = ""
+        self._expect_value = False
+        self._key = None
+
+    def _emit(self, completed: list, value):
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+        self._key = None
+        self._expect_value = False
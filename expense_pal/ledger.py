@@ -0,0 +1,442 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import IO, Iterable
+
+from expense_pal.config import EXPENSES_LOG, LEDGER_FILE
+
+# Entry keys stored in their own columns; anything else round-trips through ``extra``
+FIELDS = (
+    "date",
+    "total_amount",
+    "vat_amount",
+    "category",
+    "category_nominal_code",
+    "description",
+    "source_file",
+    "created_at",
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    {", ".join(f"{field} TEXT NOT NULL DEFAULT ''" for field in FIELDS)},
+    total_pence INTEGER,
+    vat_pence INTEGER,
+    sha256 TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS expenses_date ON expenses (date);
+CREATE INDEX IF NOT EXISTS expenses_category ON expenses (category_nominal_code, category);
+CREATE INDEX IF NOT EXISTS expenses_sha256 ON expenses (sha256);
+-- One entry per confirmation (created_at is to the microsecond); also what makes re-importing a JSONL file a no-op
+CREATE UNIQUE INDEX IF NOT EXISTS expenses_source_file ON expenses (source_file, created_at);
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    imported INTEGER NOT NULL
+);
+"""
+# Per month, nominal code and category: how many entries, how many of those
+# had no readable total, and the sums of the amounts in pence. Kept current by
+# triggers, so reports never need to read the expenses themselves.
+_TOTALS_FILL = """
+INSERT INTO expense_totals (month, category_nominal_code, category, entries, unpriced, total_pence, vat_pence)
+SELECT substr(date, 1, 7), category_nominal_code, category, COUNT(*),
+       COUNT(*) - COUNT(total_pence), COALESCE(SUM(total_pence), 0), COALESCE(SUM(vat_pence), 0)
+FROM expenses GROUP BY 1, 2, 3;
+"""
+_TOTALS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS expense_totals (
+    month TEXT NOT NULL,
+    category_nominal_code TEXT NOT NULL,
+    category TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    unpriced INTEGER NOT NULL,
+    total_pence INTEGER NOT NULL,
+    vat_pence INTEGER NOT NULL,
+    PRIMARY KEY (month, category_nominal_code, category)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS expense_totals_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO expense_totals (month, category_nominal_code, category, entries, unpriced, total_pence, vat_pence)
+    VALUES (substr(NEW.date, 1, 7), NEW.category_nominal_code, NEW.category, 1, NEW.total_pence IS NULL,
+            COALESCE(NEW.total_pence, 0), COALESCE(NEW.vat_pence, 0))
+    ON CONFLICT (month, category_nominal_code, category) DO UPDATE SET
+        entries = entries + 1,
+        unpriced = unpriced + excluded.unpriced,
+        total_pence = total_pence + excluded.total_pence,
+        vat_pence = vat_pence + excluded.vat_pence;
+END;
+CREATE TRIGGER IF NOT EXISTS expense_totals_delete AFTER DELETE ON expenses BEGIN
+    UPDATE expense_totals SET
+        entries = entries - 1,
+        unpriced = unpriced - (OLD.total_pence IS NULL),
+        total_pence = total_pence - COALESCE(OLD.total_pence, 0),
+        vat_pence = vat_pence - COALESCE(OLD.vat_pence, 0)
+    WHERE month = substr(OLD.date, 1, 7)
+      AND category_nominal_code = OLD.category_nominal_code AND category = OLD.category;
+    DELETE FROM expense_totals WHERE entries <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS expense_totals_update
+AFTER UPDATE OF date, category_nominal_code, category, total_pence, vat_pence ON expenses BEGIN
+    UPDATE expense_totals SET
+        entries = entries - 1,
+        unpriced = unpriced - (OLD.total_pence IS NULL),
+        total_pence = total_pence - COALESCE(OLD.total_pence, 0),
+        vat_pence = vat_pence - COALESCE(OLD.vat_pence, 0)
+    WHERE month = substr(OLD.date, 1, 7)
+      AND category_nominal_code = OLD.category_nominal_code AND category = OLD.category;
+    DELETE FROM expense_totals WHERE entries <= 0;
+    INSERT INTO expense_totals (month, category_nominal_code, category, entries, unpriced, total_pence, vat_pence)
+    VALUES (substr(NEW.date, 1, 7), NEW.category_nominal_code, NEW.category, 1, NEW.total_pence IS NULL,
+            COALESCE(NEW.total_pence, 0), COALESCE(NEW.vat_pence, 0))
+    ON CONFLICT (month, category_nominal_code, category) DO UPDATE SET
+        entries = entries + 1,
+        unpriced = unpriced + excluded.unpriced,
+        total_pence = total_pence + excluded.total_pence,
+        vat_pence = vat_pence + excluded.vat_pence;
+END;
+""" + _TOTALS_FILL
+# The FreeAgent expense each entry was pushed as; entries still to push are indexed by date
+_PUSH_SCHEMA = """
+ALTER TABLE expenses ADD COLUMN freeagent_url TEXT;
+CREATE INDEX IF NOT EXISTS expenses_unpushed ON expenses (date, id) WHERE freeagent_url IS NULL;
+"""
+# Applied in order; PRAGMA user_version records how many have run
+_MIGRATIONS = [_SCHEMA, _TOTALS_SCHEMA, _PUSH_SCHEMA]
+
+# Ways ``Ledger.totals`` can group, as SQL over ``expense_totals``
+GROUPINGS = {
+    "month": ("month",),
+    "quarter": ("substr(month, 1, 4) || '-Q' || ((CAST(substr(month, 6, 2) AS INTEGER) + 2) / 3)",),
+    "year": ("substr(month, 1, 4)",),
+    "category": ("category_nominal_code", "category"),
+}
+_COLUMNS = ", ".join(("id", *FIELDS, "sha256", "freeagent_url", "extra"))
+
+
+def created_at() -> str:
+    """The current UTC time as an entry's ``created_at``, to the microsecond.
+
+    Together with the source file it identifies a confirmation, so two
+    confirmations of one file within a second are both kept.
+    """
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _statements(script: str) -> Iterable[str]:
+    """The statements of a migration script, one at a time (trigger bodies included)."""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+    if statement.strip():
+        yield statement
+
+
+def pence(value) -> int | None:
+    """An amount such as "12.50" or "1,204" in pence, or None if it is not a number."""
+    try:
+        amount = Decimal(str(value).replace(",", "").strip())
+    except InvalidOperation:
+        return None
+    if not amount.is_finite():
+        return None
+    return int((amount * 100).to_integral_value())
+
+
+class Ledger:
+    """Confirmed expenses in a SQLite database (``LEDGER_FILE``).
+
+    Replaces the ``expenses.jsonl`` that used to be appended to in whatever
+    directory the CLI ran from. The database is in WAL mode, so readers never
+    wait for a writer and several processes can share it; one connection is
+    shared by this process's threads. SQLite serialises writers across
+    processes, each entry is one transaction, and a write cut short by a
+    crash is rolled back on the next open, so entries are never torn. Indexes
+    on date, category and nominal code, content hash and source file keep
+    lookups independent of how many years of history it holds. Entries
+    pushed to FreeAgent keep the URL of the expense they became.
+    ``import_jsonl`` and ``export_jsonl`` convert to and from the old line
+    format.
+    """
+
+    def __init__(self, path: Path = LEDGER_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Every commit is fsynced: a confirmed expense survives a crash right after /submit
+        self._db.execute("PRAGMA synchronous=FULL")
+        with self._lock:
+            self._migrate()
+
+    def _migrate(self):
+        """Bring the schema up to date.
+
+        The version is read, the migrations run and the new version set in
+        one ``BEGIN IMMEDIATE`` transaction, so of several processes opening
+        a new ledger at once exactly one migrates it and the others then find
+        it current; an interrupted upgrade is rolled back and simply redone.
+        """
+        if self._db.execute("PRAGMA user_version").fetchone()[0] >= len(_MIGRATIONS):
+            return
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            # Read again under the write lock: another process may have migrated meanwhile
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            for script in _MIGRATIONS[version:]:
+                for statement in _statements(script):
+                    self._db.execute(statement)
+            self._db.execute(f"PRAGMA user_version = {max(version, len(_MIGRATIONS))}")
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _row(entry: dict, sha256: str | None) -> tuple:
+        extra = {k: v for k, v in entry.items() if k not in FIELDS and k not in ("sha256", "freeagent_url")}
+        return (
+            *("" if entry.get(field) is None else str(entry[field]) for field in FIELDS),
+            pence(entry.get("total_amount", "")),
+            pence(entry.get("vat_amount", "")),
+            sha256 or entry.get("sha256") or None,
+            entry.get("freeagent_url") or None,
+            json.dumps(extra) if extra else None,
+        )
+
+    @staticmethod
+    def _entry(row: tuple) -> tuple[int, dict]:
+        entry_id, *values, sha256, freeagent_url, extra = row
+        entry = dict(zip(FIELDS, values))
+        if extra:
+            entry.update(json.loads(extra))
+        if sha256:
+            entry["sha256"] = sha256
+        if freeagent_url:
+            entry["freeagent_url"] = freeagent_url
+        return entry_id, entry
+
+    def _insert(self, rows: Iterable[tuple], ignore: bool = False) -> int:
+        columns = ", ".join((*FIELDS, "total_pence", "vat_pence", "sha256", "freeagent_url", "extra"))
+        placeholders = ", ".join("?" * (len(FIELDS) + 5))
+        verb = "INSERT OR IGNORE" if ignore else "INSERT"
+        before = self._db.total_changes
+        self._db.executemany(f"{verb} INTO expenses ({columns}) VALUES ({placeholders})", rows)
+        return self._db.total_changes - before
+
+    def add(self, entry: dict, sha256: str | None = None) -> int:
+        """Record a confirmed expense; ``sha256`` is the receipt file's content hash. Returns its id."""
+        with self._lock, self._db:
+            self._insert([self._row(entry, sha256)])
+            return self._db.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    def entries(
+        self, since_id: int = 0, limit: int | None = None, fields: tuple[str, ...] | None = None
+    ) -> list[tuple[int, dict]]:
+        """(id, entry) pairs recorded after ``since_id``, oldest first.
+
+        ``fields`` (names from ``FIELDS``) reads just those keys of each
+        entry, which is much cheaper when following the whole ledger.
+        """
+        if fields is None:
+            columns = _COLUMNS
+        elif set(fields) <= set(FIELDS):
+            columns = ", ".join(("id", *fields))
+        else:
+            raise ValueError(f"unknown ledger fields: {sorted(set(fields) - set(FIELDS))}")
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {columns} FROM expenses WHERE id > ? ORDER BY id LIMIT ?",
+                (since_id, -1 if limit is None else limit),
+            ).fetchall()
+        if fields is None:
+            return [self._entry(row) for row in rows]
+        return [(row[0], dict(zip(fields, row[1:]))) for row in rows]
+
+    def recent(self, limit: int) -> list[dict]:
+        """The ``limit`` most recently recorded entries, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM expenses ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._entry(row)[1] for row in reversed(rows)]
+
+    def find(self, sha256: str | None = None, source_file: str | None = None) -> list[dict]:
+        """Entries for a receipt, by content hash or by the path it was confirmed from."""
+        clauses, params = [], []
+        if sha256 is not None:
+            clauses.append("sha256 = ?")
+            params.append(sha256)
+        if source_file is not None:
+            clauses.append("source_file = ?")
+            params.append(source_file)
+        if not clauses:
+            raise ValueError("find() needs sha256 or source_file")
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM expenses WHERE {' AND '.join(clauses)} ORDER BY id", params
+            ).fetchall()
+        return [self._entry(row)[1] for row in rows]
+
+    def between(self, start: str, end: str) -> list[dict]:
+        """Entries dated from ``start`` up to and including ``end`` (YYYY-MM-DD), by date."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM expenses WHERE date BETWEEN ? AND ? ORDER BY date, id", (start, end)
+            ).fetchall()
+        return [self._entry(row)[1] for row in rows]
+
+    def unpushed(self, since: str | None = None, limit: int | None = None) -> list[tuple[int, dict]]:
+        """(id, entry) pairs not yet pushed to FreeAgent, dated from ``since`` (YYYY-MM-DD) on, by date."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM expenses WHERE freeagent_url IS NULL AND date >= ? "
+                "ORDER BY date, id LIMIT ?",
+                (since or "", -1 if limit is None else limit),
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def mark_pushed(self, entry_id: int, url: str):
+        """Record the FreeAgent expense ``url`` an entry was pushed as, so it is not pushed again."""
+        with self._lock, self._db:
+            self._db.execute("UPDATE expenses SET freeagent_url = ? WHERE id = ?", (url, entry_id))
+
+    def last_id(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(MAX(id), 0) FROM expenses").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def totals(
+        self, by: tuple[str, ...] = ("month", "category"), since: str | None = None, until: str | None = None
+    ) -> list[dict]:
+        """Entry counts and amount totals grouped by ``by`` (keys of ``GROUPINGS``), in key order.
+
+        Read from the maintained summary, so the cost depends on the number
+        of months and categories, not of entries. ``since`` and ``until``
+        are inclusive YYYY-MM months. Each row has its grouping keys
+        (``category`` adds ``nominal_code`` and ``category``) plus
+        ``entries``, ``unpriced`` (entries without a readable total) and
+        ``total_pence``, ``vat_pence`` and ``net_pence``.
+        """
+        keys, names = [], []
+        for grouping in by:
+            if grouping not in GROUPINGS:
+                raise ValueError(f"cannot group by {grouping!r}; choose from {', '.join(GROUPINGS)}")
+            keys.extend(GROUPINGS[grouping])
+            names.extend(("nominal_code", "category") if grouping == "category" else (grouping,))
+        clauses, params = [], []
+        if since:
+            clauses.append("month >= ?")
+            params.append(since)
+        if until:
+            clauses.append("month <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        group = f"GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}" if keys else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {''.join(k + ', ' for k in keys)}SUM(entries), SUM(unpriced), "
+                f"SUM(total_pence), SUM(vat_pence) FROM expense_totals {where} {group}",
+                params,
+            ).fetchall()
+        result = []
+        for row in rows:
+            *values, entries, unpriced, total, vat = row
+            if not entries:
+                continue
+            result.append({
+                **dict(zip(names, values)),
+                "entries": entries,
+                "unpriced": unpriced,
+                "total_pence": total,
+                "vat_pence": vat,
+                "net_pence": total - vat,
+            })
+        return result
+
+    def rebuild_totals(self):
+        """Recompute the summary behind ``totals`` from every entry in one pass."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM expense_totals")
+            self._db.execute(_TOTALS_FILL)
+
+    def import_jsonl(self, path: Path, force: bool = False) -> int | None:
+        """Add the entries of an ``expenses.jsonl``-style file; returns how many were new.
+
+        Entries already in the ledger (same source file and confirmation
+        time) are skipped, so importing a file twice adds nothing. Unless
+        ``force`` is set, a file whose size and mtime match its last import is
+        not read again and None is returned.
+        """
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = str(path.resolve())
+        with self._lock:
+            if not force:
+                seen = self._db.execute(
+                    "SELECT size, mtime_ns FROM imports WHERE path = ?", (key,)
+                ).fetchone()
+                if seen == (stat.st_size, stat.st_mtime_ns):
+                    return None
+            rows = []
+            with path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict):
+                        rows.append(self._row(entry, None))
+            with self._db:
+                added = self._insert(rows, ignore=True)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO imports (path, size, mtime_ns, imported) VALUES (?, ?, ?, ?)",
+                    (key, stat.st_size, stat.st_mtime_ns, added),
+                )
+            return added
+
+    def export_jsonl(self, out: IO[str]) -> int:
+        """Write every entry to ``out`` as one JSON line each, oldest first; returns how many."""
+        count = 0
+        since = 0
+        while batch := self.entries(since, limit=5000):
+            out.write("".join(json.dumps(entry) + "\n" for _, entry in batch))
+            since = batch[-1][0]
+            count += len(batch)
+        return count
+
+
+_ledger: Ledger | None = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> Ledger:
+    """Return the process-wide ledger.
+
+    On first use the ``expenses.jsonl`` in the working directory, if there
+    is one, is imported, so existing history carries over without a step.
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = Ledger()
+            _ledger.import_jsonl(EXPENSES_LOG)
+        return _ledger
@@ -0,0 +1,139 @@
+import math
+import threading
+from datetime import datetime, timezone
+from typing import Iterable
+
+from expense_pal.config import METRICS_ENABLED, METRICS_RETENTION_DAYS, PROMPT_LOG_DIR, PROMPT_LOG_MAX_MB
+from expense_pal.promptlog import PromptLog, read_records
+
+# USD per million tokens: (input, output). Cache writes cost 1.25x input and
+# cache reads 0.1x input; Message Batches are billed at half price.
+PRICES = {
+    "claude-opus-4": (5.00, 25.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-haiku-4": (1.00, 5.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+}
+_CACHE_WRITE_FACTOR = 1.25
+_CACHE_READ_FACTOR = 0.1
+_BATCH_DISCOUNT = 0.5
+
+
+def price_for(model: str) -> tuple[float, float] | None:
+    """Return (input, output) USD per million tokens for ``model``, or None if unknown."""
+    for prefix, price in sorted(PRICES.items(), key=lambda item: -len(item[0])):
+        if model.startswith(prefix):
+            return price
+    return None
+
+
+def estimate_cost(model: str, usage: dict, batch: bool = False) -> float | None:
+    """Estimated USD cost of one call's ``usage``, or None for an unpriced model."""
+    price = price_for(model)
+    if price is None:
+        return None
+    input_price, output_price = price
+    cost = (
+        usage.get("input_tokens", 0) * input_price
+        + usage.get("cache_creation_input_tokens", 0) * input_price * _CACHE_WRITE_FACTOR
+        + usage.get("cache_read_input_tokens", 0) * input_price * _CACHE_READ_FACTOR
+        + usage.get("output_tokens", 0) * output_price
+    ) / 1_000_000
+    return cost * _BATCH_DISCOUNT if batch else cost
+
+
+def record_scan(
+    model: str,
+    usage: dict | None,
+    wall_ms: float | None,
+    cache_hit: bool,
+    image_stats: dict | None = None,
+    source: str = "scan",
+    ok: bool = True,
+):
+    """Queue one scan's metrics for the background writer; never blocks the scan."""
+    log = get_metrics_log()
+    if log is None:
+        return
+    usage = usage or {}
+    log.record({
+        "ts": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "model": model,
+        "source": source,
+        "cache_hit": cache_hit,
+        "ok": ok,
+        "wall_ms": round(wall_ms) if wall_ms is not None else None,
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "cache_read_input_tokens": usage.get("cache_read_input_tokens", 0),
+        "cache_creation_input_tokens": usage.get("cache_creation_input_tokens", 0),
+        "original_bytes": (image_stats or {}).get("original_bytes"),
+        "sent_bytes": (image_stats or {}).get("sent_bytes"),
+    })
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of ``values`` (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarise(records: Iterable[dict]) -> dict[str, dict]:
+    """Aggregate metrics records per model.
+
+    For each model returns the number of scans, cache hits, p50/p95 wall time
+    of the API calls (cache hits excluded), mean tokens and sent bytes per
+    API call, and estimated cost per receipt scanned and in total.
+    """
+    by_model: dict[str, list[dict]] = {}
+    for record in records:
+        by_model.setdefault(record["model"], []).append(record)
+
+    summary = {}
+    for model, rows in sorted(by_model.items()):
+        calls = [r for r in rows if not r["cache_hit"]]
+        walls = [r["wall_ms"] for r in calls if r["wall_ms"] is not None]
+        costs = [estimate_cost(model, r, batch=r.get("source") == "batch") for r in calls]
+        priced = [c for c in costs if c is not None]
+        sent = [r["sent_bytes"] for r in calls if r.get("sent_bytes") is not None]
+
+        def mean(key: str) -> float:
+            return sum(r[key] for r in calls) / len(calls) if calls else 0.0
+
+        total_cost = sum(priced) if priced else None
+        summary[model] = {
+            "scans": len(rows),
+            "cache_hits": len(rows) - len(calls),
+            "api_calls": len(calls),
+            "p50_ms": percentile(walls, 50),
+            "p95_ms": percentile(walls, 95),
+            "input_tokens": mean("input_tokens"),
+            "output_tokens": mean("output_tokens"),
+            "cache_read_input_tokens": mean("cache_read_input_tokens"),
+            "cache_creation_input_tokens": mean("cache_creation_input_tokens"),
+            "sent_bytes": sum(sent) / len(sent) if sent else None,
+            "cost_per_receipt": total_cost / len(rows) if total_cost is not None else None,
+            "total_cost": total_cost,
+        }
+    return summary
+
+
+def read_metrics(since: datetime | None = None, until: datetime | None = None) -> Iterable[dict]:
+    return read_records(PROMPT_LOG_DIR, since=since, until=until, name="metrics")
+
+
+_log: PromptLog | None = None
+_log_lock = threading.Lock()
+
+
+def get_metrics_log() -> PromptLog | None:
+    """Return the process-wide metrics log, or None if metrics are disabled."""
+    global _log
+    if not METRICS_ENABLED:
+        return None
+    with _log_lock:
+        if _log is None:
+            _log = PromptLog(PROMPT_LOG_DIR, PROMPT_LOG_MAX_MB, METRICS_RETENTION_DAYS, name="metrics")
+        return _log
@@ -0,0 +1,189 @@
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+LOOKAHEAD = 3
+
+
+class Prefetcher:
+    """Bounded worker pool that scans pending receipts ahead of the reviewer.
+
+    Files are scanned in sidebar order. When the reviewer selects a file it
+    jumps to the front of the queue and the next ``lookahead`` files after it
+    are bumped up behind it. Results are handed back through per-file futures;
+    ``scan`` is expected to persist them in the scan cache as well.
+    """
+
+    def __init__(
+        self,
+        scan: Callable[[str, str], dict],
+        list_pending: Callable[[], list[str]],
+        model: str,
+        workers: int = 2,
+        lookahead: int = LOOKAHEAD,
+    ):
+        self._scan = scan
+        self._list_pending = list_pending
+        self._model = model
+        self._lookahead = lookahead
+        self._cond = threading.Condition()
+        self._heap: list[tuple[int, int, str]] = []
+        self._queued: dict[str, int] = {}
+        self._futures: dict[tuple[str, str], Future] = {}
+        self._seq = itertools.count()
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"prefetch-{i}", daemon=True)
+            for i in range(max(workers, 0))
+        ]
+
+    def start(self):
+        with self._cond:
+            self._schedule_all()
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._heap.clear()
+            self._queued.clear()
+            self._cond.notify_all()
+
+    def result(self, filename: str, model: str) -> dict:
+        """Return the scan result for ``filename``, waiting for it if necessary."""
+        with self._cond:
+            self._follow_model(model)
+            future = self._enqueue(filename, 0)
+            self._bump_after(filename)
+        return future.result()
+
+    def claim(self, filename: str, model: str) -> tuple[Future, bool]:
+        """Take over scanning ``filename`` from the pool (e.g. to stream it).
+
+        Returns ``(future, owned)``. If a worker has already started or
+        finished the scan, ``owned`` is False and the future is the worker's.
+        Otherwise the file is dequeued, ``owned`` is True and the caller must
+        resolve the future so other waiters are released.
+        """
+        with self._cond:
+            self._follow_model(model)
+            self._bump_after(filename)
+            key = (filename, model)
+            future = self._futures.get(key)
+            if future is not None and (future.running() or future.done()):
+                return future, False
+            if future is None:
+                future = Future()
+                self._futures[key] = future
+            self._queued.pop(filename, None)
+            future.set_running_or_notify_cancel()
+            return future, True
+
+    def release(self, filename: str, model: str, future: Future):
+        """Hand a claimed scan back to the pool when its owner gives up without a result.
+
+        Anyone already waiting on ``future`` gets the result of the worker
+        that picks the file up instead of waiting forever.
+        """
+        with self._cond:
+            key = (filename, model)
+            if future.done() or self._futures.get(key) is not future:
+                return
+            if self._stopped or model != self._model:
+                del self._futures[key]
+                future.set_exception(RuntimeError(f"scan of {filename} was abandoned"))
+                return
+            # The claimed future is already running, so a worker needs a fresh one to take
+            del self._futures[key]
+            replacement = self._enqueue(filename, 0)
+            replacement.add_done_callback(lambda done: _chain(done, future))
+            self._cond.notify_all()
+
+    def _follow_model(self, model: str):
+        if model != self._model:
+            # Queued work was for the old model; follow the reviewer's choice
+            self._model = model
+            self._heap.clear()
+            self._queued.clear()
+            self._schedule_all()
+
+    def _bump_after(self, filename: str):
+        pending = self._list_pending()
+        if filename in pending:
+            start = pending.index(filename) + 1
+            for offset, name in enumerate(pending[start:start + self._lookahead], start=1):
+                self._enqueue(name, offset)
+        self._cond.notify_all()
+
+    def discard(self, filename: str):
+        """Forget queued work and results for a file (e.g. once it is confirmed)."""
+        with self._cond:
+            self._queued.pop(filename, None)
+            for key in [k for k in self._futures if k[0] == filename]:
+                future = self._futures[key]
+                if future.done():
+                    del self._futures[key]
+
+    def _schedule_all(self):
+        base = self._lookahead + 1
+        for index, name in enumerate(self._list_pending()):
+            self._enqueue(name, base + index)
+        self._cond.notify_all()
+
+    def _enqueue(self, filename: str, priority: int) -> Future:
+        key = (filename, self._model)
+        future = self._futures.get(key)
+        if future is None:
+            future = Future()
+            self._futures[key] = future
+        if future.running() or future.done():
+            return future
+        seq = next(self._seq)
+        self._queued[filename] = seq
+        heapq.heappush(self._heap, (priority, seq, filename))
+        return future
+
+    def _next_job(self) -> tuple[str, str, Future] | None:
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return None
+                while self._heap:
+                    _, seq, filename = heapq.heappop(self._heap)
+                    # Skip stale heap entries superseded by a later re-prioritisation
+                    if self._queued.get(filename) != seq:
+                        continue
+                    del self._queued[filename]
+                    future = self._futures.get((filename, self._model))
+                    if future is None or not future.set_running_or_notify_cancel():
+                        continue
+                    return filename, self._model, future
+                self._cond.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            filename, model, future = job
+            try:
+                future.set_result(self._scan(filename, model))
+            except BaseException as exc:
+                future.set_exception(exc)
+                with self._cond:
+                    # Let a later request retry the scan instead of replaying the error forever
+                    if self._futures.get((filename, model)) is future:
+                        del self._futures[(filename, model)]
+
+
+def _chain(source: Future, target: Future):
+    if target.done():
+        return
+    exc = source.exception()
+    if exc is not None:
+        target.set_exception(exc)
+    else:
+        target.set_result(source.result())
@@ -0,0 +1,322 @@
+import base64
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from expense_pal.cache import CacheBudget
+from expense_pal.config import (
+    IMAGE_CACHE_DIR,
+    IMAGE_CACHE_MAX_MB,
+    IMAGE_GRAYSCALE,
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MAX_EDGE,
+    PDF_TEXT_LAYER,
+)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are sent as-is
+    Image = None
+    ImageOps = None
+
+try:
+    import pypdf
+except ImportError:  # pypdf is optional; without it PDFs are sent whole
+    pypdf = None
+else:
+    # Damaged PDFs fall back to the whole document; don't spam the console about them
+    logging.getLogger("pypdf").setLevel(logging.ERROR)
+
+_EXIF_ORIENTATION = 0x0112
+# Marks an image whose original is sent as-is; holds its "WIDTHxHEIGHT"
+_KEEP_SUFFIX = ".keep"
+# Sweeps the image cache as it grows; None in pool workers, whose parent sweeps once at the end
+_budget: CacheBudget | None = CacheBudget(
+    IMAGE_CACHE_DIR, ("*/*.jpg", f"*/*{_KEEP_SUFFIX}"), int(IMAGE_CACHE_MAX_MB * 1024 * 1024)
+)
+# Lowest JPEG quality tried when the re-encoded image is still larger than the original
+_MIN_JPEG_QUALITY = 50
+
+# A page needs this much extracted text to count as having a text layer
+_MIN_PAGE_CHARS = 40
+# Upper bound on the text sent for one PDF (roughly 3,000 tokens)
+_MAX_PDF_TEXT_CHARS = 12_000
+_AMOUNT_RE = re.compile(r"\d[\d,]*[.,]\d{2}\b")
+_TOTAL_RE = re.compile(r"\b(?:total|amount due|balance due|amount paid|vat|tax|subtotal)\b", re.IGNORECASE)
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Approximate Claude's image token cost (roughly one token per 750 pixels)."""
+    return max(1, (width * height + 749) // 750)
+
+
+def preprocess_settings() -> str:
+    """Return a short string identifying the current preprocessing parameters."""
+    pdf = "text-v1" if PDF_TEXT_LAYER and pypdf is not None else "off"
+    return f"edge={IMAGE_MAX_EDGE};q={IMAGE_JPEG_QUALITY};gray={int(IMAGE_GRAYSCALE)};pdf={pdf}"
+
+
+def _cache_path(digest: str) -> Path:
+    key = hashlib.sha256(f"{digest}:{preprocess_settings()}".encode("utf-8")).hexdigest()
+    return IMAGE_CACHE_DIR / key[:2] / f"{key}.jpg"
+
+
+def _store(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    try:
+        replaced = path.stat().st_size
+    except FileNotFoundError:
+        replaced = 0
+    os.replace(tmp, path)
+    if _budget is not None:
+        _budget.wrote(len(data), replaced)
+
+
+def _kept_size(keep_path: Path) -> tuple[int, int] | None:
+    """The size recorded for an image whose original is sent as-is, or None if there is no record."""
+    try:
+        width, height = keep_path.read_text(encoding="ascii").split("x")
+        size = int(width), int(height)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        keep_path.unlink(missing_ok=True)
+        return None
+    os.utime(keep_path)
+    return size
+
+
+def _encode(data: bytes) -> tuple[bytes, int, int, bool]:
+    """Orient, downsize and re-encode an image.
+
+    Returns (jpeg_bytes, width, height, reshaped), where ``reshaped`` says
+    whether the image had to be rotated or scaled down, so the original
+    would not do in its place.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        reshaped = img.getexif().get(_EXIF_ORIENTATION, 1) != 1 or max(img.size) > IMAGE_MAX_EDGE
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("L" if IMAGE_GRAYSCALE else "RGB")
+        img.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.LANCZOS)
+        quality = IMAGE_JPEG_QUALITY
+        while True:
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=quality, optimize=True)
+            out = buf.getvalue()
+            if len(out) < len(data) or quality <= _MIN_JPEG_QUALITY:
+                return out, img.width, img.height, reshaped
+            quality -= 10
+
+
+def preprocess_image(data: bytes, media_type: str) -> tuple[bytes, str, dict]:
+    """Prepare an image for upload: fix EXIF orientation, cap the longest edge and
+    re-encode as a quality-bounded JPEG (grayscale if configured).
+
+    Processed bytes are cached on disk by the SHA-256 of the original bytes.
+    Returns (bytes_to_send, media_type, stats) where stats holds original_bytes,
+    sent_bytes, bytes_saved and image_tokens. The original is sent instead when
+    it is already upright, within the edge cap and no larger than the
+    re-encoded JPEG (a decision cached by the same hash), or if Pillow is not
+    installed or the image cannot be decoded. A cached file that no longer
+    decodes is regenerated.
+    """
+    stats = {"original_bytes": len(data), "sent_bytes": len(data), "bytes_saved": 0, "image_tokens": None}
+    if Image is None:
+        return data, media_type, stats
+
+    cache_path = _cache_path(hashlib.sha256(data).hexdigest())
+    keep_path = cache_path.with_suffix(_KEEP_SUFFIX)
+    out = None
+    kept = None if cache_path.exists() else _kept_size(keep_path)
+    if kept is not None:
+        stats["image_tokens"] = estimate_image_tokens(*kept)
+        return data, media_type, stats
+    if cache_path.exists():
+        out = cache_path.read_bytes()
+        try:
+            with Image.open(io.BytesIO(out)) as img:
+                width, height = img.size
+            os.utime(cache_path)
+        except (OSError, ValueError):
+            # Damaged on disk; drop it and process the original again
+            out = None
+            cache_path.unlink(missing_ok=True)
+    if out is None:
+        try:
+            out, width, height, reshaped = _encode(data)
+        except (OSError, ValueError):
+            return data, media_type, stats
+        if len(out) >= len(data) and not reshaped:
+            # Already small enough; keep the original but still report its token cost
+            _store(keep_path, f"{width}x{height}".encode("ascii"))
+            stats["image_tokens"] = estimate_image_tokens(width, height)
+            return data, media_type, stats
+        _store(cache_path, out)
+
+    stats.update(
+        sent_bytes=len(out),
+        bytes_saved=len(data) - len(out),
+        image_tokens=estimate_image_tokens(width, height),
+    )
+    return out, "image/jpeg", stats
+
+
+def _document_block(data: bytes) -> dict:
+    return {
+        "type": "document",
+        "source": {
+            "type": "base64",
+            "media_type": "application/pdf",
+            "data": base64.standard_b64encode(data).decode("utf-8"),
+        },
+    }
+
+
+def _is_readable(text: str) -> bool:
+    """True if ``text`` looks like a real text layer rather than nothing or glyph soup."""
+    stripped = text.strip()
+    if len(stripped) < _MIN_PAGE_CHARS:
+        return False
+    sensible = sum(ch.isalnum() or ch.isspace() or ch in ".,:;£$€%-/()@&#'\"" for ch in stripped)
+    return sensible / len(stripped) >= 0.9
+
+
+def _page_score(text: str) -> int:
+    # Pages with totals and many amounts are the ones worth reading
+    return 3 * len(_TOTAL_RE.findall(text)) + len(_AMOUNT_RE.findall(text))
+
+
+def _single_page(reader, index: int) -> bytes:
+    writer = pypdf.PdfWriter()
+    writer.add_page(reader.pages[index])
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def preprocess_pdf(data: bytes) -> tuple[list[dict], dict]:
+    """Turn a PDF into the cheapest content blocks that still carry the receipt.
+
+    Digital PDFs are read through their embedded text layer (with pypdf):
+
+    * every page readable and the text shows a total and an amount: send the
+      text only, most relevant pages first if it has to be cut short;
+    * readable text but no total, or a mix of text and scanned pages: send
+      the text plus a single page as a one-page PDF (the first scanned page,
+      else the text page most likely to hold the totals);
+    * no usable text layer (a scan): send the whole document.
+
+    Returns (content_blocks, stats). Stats hold original_bytes, sent_bytes,
+    bytes_saved and a ``pdf`` dict with the ``mode`` used, the page count and
+    the ``page`` attached (1-based), if any. Without pypdf, or if
+    ``EXPENSE_PAL_PDF_TEXT`` is off, the whole document is always sent.
+    """
+    stats = {"original_bytes": len(data), "sent_bytes": len(data), "bytes_saved": 0, "image_tokens": None}
+    if pypdf is None or not PDF_TEXT_LAYER:
+        return [_document_block(data)], stats
+    try:
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        texts = [page.extract_text() or "" for page in reader.pages]
+    except Exception:
+        # pypdf raises a variety of errors on damaged or encrypted files
+        stats["pdf"] = {"mode": "document", "pages": None, "page": None}
+        return [_document_block(data)], stats
+
+    readable = [i for i, text in enumerate(texts) if _is_readable(text)]
+    if not readable:
+        stats["pdf"] = {"mode": "document", "pages": len(texts), "page": None}
+        return [_document_block(data)], stats
+
+    ranked = sorted(readable, key=lambda i: (-_page_score(texts[i]), i))
+    kept, size = [], 0
+    for i in ranked:
+        if kept and size + len(texts[i]) > _MAX_PDF_TEXT_CHARS:
+            break
+        kept.append(i)
+        size += len(texts[i])
+    body = "\n\n".join(f"--- Page {i + 1} of {len(texts)} ---\n{texts[i].strip()}" for i in sorted(kept))
+    text_block = {
+        "type": "text",
+        "text": "The receipt is a PDF; this is the text extracted from its text layer:\n\n" + body,
+    }
+    blocks = [text_block]
+    complete = len(readable) == len(texts) and _TOTAL_RE.search(body) and _AMOUNT_RE.search(body)
+    if complete:
+        mode, page = "text", None
+    else:
+        # A scanned page in the mix carries what the text layer lacks; otherwise
+        # attach the page most likely to hold the totals
+        scanned = [i for i in range(len(texts)) if i not in readable]
+        page = scanned[0] if scanned else ranked[0]
+        try:
+            blocks.append(_document_block(_single_page(reader, page)))
+        except Exception:
+            stats["pdf"] = {"mode": "document", "pages": len(texts), "page": None}
+            return [_document_block(data)], stats
+        mode, page = "text+page", page + 1
+
+    sent = sum(len(b["text"].encode("utf-8")) if b["type"] == "text" else len(b["source"]["data"]) * 3 // 4 for b in blocks)
+    stats.update(sent_bytes=sent, bytes_saved=max(0, len(data) - sent))
+    stats["pdf"] = {"mode": mode, "pages": len(texts), "page": page}
+    return blocks, stats
+
+
+def _preprocess_path(path: Path) -> dict:
+    from expense_pal.scanner import SUPPORTED_IMAGE_TYPES
+
+    _, _, stats = preprocess_image(path.read_bytes(), SUPPORTED_IMAGE_TYPES[path.suffix.lower()])
+    return stats
+
+
+def _defer_sweeps():
+    global _budget
+    _budget = None
+
+
+def preprocess_files(paths: list[Path], workers: int | None = None) -> dict[Path, dict]:
+    """Preprocess many images up front, warming the on-disk cache.
+
+    Resizing is CPU-bound, so more than one file is spread over a process pool.
+    The workers leave the cache to grow and it is swept once they are done.
+    Returns the stats dict for each path.
+    """
+    from expense_pal.scanner import SUPPORTED_IMAGE_TYPES
+
+    paths = [p for p in paths if p.suffix.lower() in SUPPORTED_IMAGE_TYPES]
+    if Image is None or not paths:
+        return {}
+    if len(paths) == 1:
+        return {paths[0]: _preprocess_path(paths[0])}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_defer_sweeps) as pool:
+        stats = dict(zip(paths, pool.map(_preprocess_path, paths)))
+    if _budget is not None:
+        _budget.sweep()
+    return stats
+
+
+def format_stats(stats: dict) -> str:
+    """Render preprocessing stats as a short human-readable summary."""
+    tokens = stats.get("image_tokens")
+    text = (
+        f"{stats['original_bytes'] / 1024:,.0f} KB -> {stats['sent_bytes'] / 1024:,.0f} KB "
+        f"(saved {stats['bytes_saved'] / 1024:,.0f} KB)"
+    )
+    if tokens:
+        text += f", ~{tokens:,} image tokens"
+    pdf = stats.get("pdf")
+    if pdf:
+        pages = f"{pdf['pages']} page(s)" if pdf["pages"] else "unreadable"
+        if pdf["mode"] == "text":
+            text += f", sent the text layer only ({pages})"
+        elif pdf["mode"] == "text+page":
+            text += f", sent the text layer plus page {pdf['page']} ({pages})"
+        else:
+            text += f", sent the whole document ({pages}, no usable text layer)"
+    return text
@@ -0,0 +1,256 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+from expense_pal.appendlog import AppendLog, get_append_log, is_json_line
+from expense_pal.config import (
+    PROMPT_LOG_DIR,
+    PROMPT_LOG_ENABLED,
+    PROMPT_LOG_MAX_MB,
+    PROMPT_LOG_RETENTION_DAYS,
+)
+
+TEXTS_FILE = "texts.jsonl"
+# Record fields that hold the hash of a text in TEXTS_FILE
+_TEXT_REFS = ("template", "descriptions")
+# Texts referenced this recently are kept even if no record shows it yet: the
+# record may still be on its way. A text's ``ts`` is refreshed (by appending it
+# again) when it is referenced more than half this long after it was stored.
+_TEXT_GRACE = 86400
+_QUEUE_SIZE = 10_000
+
+
+class PromptLog:
+    """Append-only JSONL log written off the scan path (prompt calls, scan metrics).
+
+    ``record`` only enqueues; a daemon thread serialises and appends the
+    records. Large, rarely changing texts (the prompt template and the pinned
+    popular descriptions) are stored once in ``texts.jsonl`` under their hash
+    and referenced from each call record. When ``<name>.jsonl`` exceeds
+    ``max_mb`` it is rotated to a timestamped gzip file; rotated files older
+    than ``retention_days`` are deleted, and so are the texts no remaining
+    record refers to. ``texts.jsonl`` is shared with the other logs in the
+    directory and other processes, so the texts already stored are read
+    again whenever it has been rewritten. If the queue is full the record is
+    dropped (and counted) rather than blocking the scan.
+    """
+
+    def __init__(
+        self,
+        directory: Path = PROMPT_LOG_DIR,
+        max_mb: float = PROMPT_LOG_MAX_MB,
+        retention_days: float = PROMPT_LOG_RETENTION_DAYS,
+        name: str = "prompts",
+    ):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.retention = retention_days * 86400
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        # Hash -> when each stored text was last written, for the texts.jsonl it was read from
+        self._known_texts: dict[str, float] | None = None
+        self._texts_file: tuple[int, int] | None = None
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def record(self, entry: dict, texts: dict | None = None):
+        """Queue one call record; ``texts`` maps hash -> text for the texts it references."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((entry, texts or {}))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0):
+        """Wait (up to ``timeout``) until every queued record has been written."""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="prompt-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._expire()
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is waiting so a burst costs one write
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except OSError:
+                pass
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: list[tuple[dict, dict]]):
+        texts_path = self.directory / TEXTS_FILE
+        if any(texts for _, texts in batch):
+            identity = _file_identity(texts_path)
+            if self._known_texts is None or identity != self._texts_file:
+                # First use, or another log or process has collected the texts since
+                self._known_texts = _stored_texts(texts_path)
+                self._texts_file = identity
+            now = time.time()
+            new_texts = []
+            for _, texts in batch:
+                for digest, text in texts.items():
+                    if now - self._known_texts.get(digest, 0) > _TEXT_GRACE / 2:
+                        self._known_texts[digest] = now
+                        new_texts.append(json.dumps({"hash": digest, "text": text, "ts": now}))
+            if new_texts:
+                get_append_log(texts_path, valid=is_json_line).append(new_texts)
+                if self._texts_file is None:
+                    self._texts_file = _file_identity(texts_path)
+
+        current = self.directory / f"{self.name}.jsonl"
+        log = get_append_log(current, fsync=False, valid=is_json_line)
+        log.append(json.dumps(entry) for entry, _ in batch)
+        if current.stat().st_size > self.max_bytes:
+            self._rotate(current, log)
+
+    def _rotate(self, current: Path, log: AppendLog):
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        rotated = self.directory / f"{self.name}-{stamp}.jsonl"
+        with log.locked():
+            if current.stat().st_size <= self.max_bytes:
+                return  # another process rotated it first
+            current.replace(rotated)
+        with rotated.open("rb") as src, gzip.open(rotated.with_suffix(".jsonl.gz"), "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        rotated.unlink()
+        self._expire()
+
+    def _expire(self):
+        cutoff = time.time() - self.retention
+        expired = False
+        for path in self.directory.glob(f"{self.name}-*.jsonl.gz"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    expired = True
+            except FileNotFoundError:
+                pass
+        texts = self.directory / TEXTS_FILE
+        if expired or (texts.exists() and texts.stat().st_size > self.max_bytes):
+            self._collect_texts()
+
+    def _collect_texts(self):
+        """Rewrite ``texts.jsonl`` without the texts no record in any log still refers to."""
+        path = self.directory / TEXTS_FILE
+        log = get_append_log(path, valid=is_json_line)
+        with log.locked():
+            log.repair()
+            referenced = set()
+            for records in [*self.directory.glob("*.jsonl"), *self.directory.glob("*.jsonl.gz")]:
+                if records.name != TEXTS_FILE:
+                    for entry in _read_jsonl(records):
+                        referenced.update(entry.get(field) for field in _TEXT_REFS)
+            recent = time.time() - _TEXT_GRACE
+            latest: dict[str, dict] = {}
+            for text in _read_jsonl(path):
+                if text.get("ts", 0) >= latest.get(text.get("hash"), {}).get("ts", 0):
+                    latest[text.get("hash")] = text
+            kept = [t for digest, t in latest.items() if digest in referenced or t.get("ts", 0) > recent]
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text("".join(json.dumps(t) + "\n" for t in kept), encoding="utf-8")
+            os.replace(tmp, path)
+            self._known_texts = None
+
+
+def _file_identity(path: Path) -> tuple[int, int] | None:
+    """Device and inode of ``path``: they change when the file is replaced, not when it is appended to."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def _stored_texts(path: Path) -> dict[str, float]:
+    stored: dict[str, float] = {}
+    for text in _read_jsonl(path):
+        stored[text["hash"]] = max(stored.get(text["hash"], 0), text.get("ts", 0))
+    return stored
+
+
+def _read_jsonl(path: Path) -> Iterator[dict]:
+    if not path.exists():
+        return
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A line cut short by a crash; skip it
+                continue
+
+
+def read_records(
+    directory: Path = PROMPT_LOG_DIR,
+    file: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    name: str = "prompts",
+) -> Iterator[dict]:
+    """Yield logged records, oldest first, filtered by file and time.
+
+    ``file`` matches a substring of the receipt path or a prefix of its
+    SHA-256. ``since``/``until`` are compared with each record's UTC ``ts``.
+    """
+    paths = sorted(directory.glob(f"{name}-*.jsonl.gz")) + [directory / f"{name}.jsonl"]
+    for path in paths:
+        for entry in _read_jsonl(path):
+            if file and file not in entry.get("file", "") and not entry.get("digest", "").startswith(file):
+                continue
+            ts = datetime.fromisoformat(entry["ts"].replace("Z", "+00:00"))
+            if since and ts < since:
+                continue
+            if until and ts > until:
+                continue
+            yield entry
+
+
+def load_texts(directory: Path = PROMPT_LOG_DIR) -> dict:
+    """Return every stored template and pinned description list keyed by hash."""
+    return {t["hash"]: t["text"] for t in _read_jsonl(directory / TEXTS_FILE)}
+
+
+_log: PromptLog | None = None
+_log_lock = threading.Lock()
+
+
+def get_prompt_log() -> PromptLog | None:
+    """Return the process-wide prompt log, or None if logging is disabled."""
+    global _log
+    if not PROMPT_LOG_ENABLED:
+        return None
+    with _log_lock:
+        if _log is None:
+            _log = PromptLog()
+        return _log
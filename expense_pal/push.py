@@ -0,0 +1,130 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from expense_pal.api import ApiClient, create_expense
+from expense_pal.config import BASE_URL, PUSH_WORKERS
+from expense_pal.ledger import Ledger, pence
+
+# FreeAgent rejects larger attachments
+MAX_ATTACHMENT_BYTES = 5 * 1024 * 1024
+# Content types FreeAgent accepts for attachments, by receipt suffix
+_CONTENT_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".pdf": "application/x-pdf"}
+
+
+class PushResult(NamedTuple):
+    """Outcome of pushing one ledger entry: the new expense's URL, or the error that stopped it."""
+
+    entry_id: int
+    entry: dict
+    url: str | None = None
+    error: Exception | None = None
+    # False when the entry went without its receipt (file gone or too large)
+    attached: bool = False
+
+
+def receipt_file(entry: dict) -> Path | None:
+    """The receipt an entry was confirmed from, where it was scanned or in ``done/`` next to it."""
+    source = entry.get("source_file")
+    if not source:
+        return None
+    path = Path(source)
+    for candidate in (path, path.parent / "done" / path.name):
+        if candidate.is_file() and candidate.suffix.lower() in _CONTENT_TYPES:
+            return candidate
+    return None
+
+
+def _money(value: int) -> str:
+    return f"{value / 100:.2f}"
+
+
+def _attachment(path: Path) -> dict | None:
+    data = path.read_bytes()
+    content_type = _CONTENT_TYPES[path.suffix.lower()]
+    if len(data) > MAX_ATTACHMENT_BYTES and content_type != "application/x-pdf":
+        # A phone photo can exceed the limit; the downsized copy sent to Claude is plenty
+        from expense_pal.preprocess import preprocess_image
+
+        data, content_type, _ = preprocess_image(data, content_type)
+    if len(data) > MAX_ATTACHMENT_BYTES:
+        return None
+    return {
+        "data": base64.b64encode(data).decode("ascii"),
+        "file_name": path.name,
+        "content_type": content_type,
+    }
+
+
+def expense_payload(entry: dict, user_url: str) -> dict:
+    """FreeAgent expense attributes for a ledger entry, without the attachment.
+
+    Raises ``ValueError`` for an entry FreeAgent would reject: no nominal
+    code, or an unreadable date or total. Amounts are sent negative, as
+    FreeAgent records money spent.
+    """
+    code = entry.get("category_nominal_code")
+    if not code:
+        raise ValueError(f"no nominal code for category {entry.get('category')!r}")
+    try:
+        dated_on = date.fromisoformat(entry.get("date", "")).isoformat()
+    except ValueError:
+        raise ValueError(f"unreadable date {entry.get('date')!r}") from None
+    total = pence(entry.get("total_amount", ""))
+    if total is None:
+        raise ValueError(f"unreadable total {entry.get('total_amount')!r}")
+    expense = {
+        "user": user_url,
+        "category": f"{BASE_URL}/categories/{code}",
+        "dated_on": dated_on,
+        "gross_value": _money(-total),
+        "description": entry.get("description") or entry.get("category") or "Expense",
+    }
+    vat = pence(entry.get("vat_amount", ""))
+    if vat:
+        expense["manual_sales_tax_amount"] = _money(-vat)
+    return expense
+
+
+def _push_one(ledger: Ledger, client: ApiClient, user_url: str, entry_id: int, entry: dict) -> PushResult:
+    try:
+        expense = expense_payload(entry, user_url)
+        receipt = receipt_file(entry)
+        attachment = _attachment(receipt) if receipt is not None else None
+        if attachment is not None:
+            expense["attachment"] = attachment
+        url = create_expense(client, expense)
+    except Exception as exc:  # reported per entry; the others carry on
+        return PushResult(entry_id, entry, error=exc)
+    # Recorded at once, so an interrupted run never pushes this entry twice
+    ledger.mark_pushed(entry_id, url)
+    return PushResult(entry_id, entry, url=url, attached=attachment is not None)
+
+
+def push_expenses(
+    ledger: Ledger,
+    client: ApiClient,
+    user_url: str,
+    entries: list[tuple[int, dict]],
+    workers: int = PUSH_WORKERS,
+) -> Iterator[PushResult]:
+    """Create a FreeAgent expense for each ``(id, entry)``, yielding results as they complete.
+
+    A bounded pool of ``workers`` threads uploads concurrently through
+    ``client``, sharing its connections, rate limiter and retries. Each
+    entry's receipt is attached when it can still be found. The new
+    expense's URL is recorded in the ledger as soon as it is created, so
+    entries that fail can simply be pushed again.
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="push")
+    try:
+        futures = [
+            pool.submit(_push_one, ledger, client, user_url, entry_id, entry) for entry_id, entry in entries
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # On Ctrl-C or when the caller stops early, uploads in flight finish and the rest stay unpushed
+        pool.shutdown(cancel_futures=True)
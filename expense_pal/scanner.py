@@ -1,110 +1,604 @@
 import base64
 import json
 import re
-import sys
-from datetime import datetime
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
 from pathlib import Path
+from typing import Iterator
 
 import anthropic
 
-from expense_pal.config import ANTHROPIC_API_KEY, ANTHROPIC_MODEL, load_descriptions
+from expense_pal.config import (
+    ANTHROPIC_API_KEY,
+    ANTHROPIC_MODEL,
+    CASCADE,
+    CASCADE_MODELS,
+)
+from expense_pal.cache import ScanCache, file_digest, prompt_version
 from expense_pal.categories import get_llm_category_names
+from expense_pal.descriptions import DescriptionIndex, estimate_tokens
+from expense_pal.extraction import (
+    EXTRACTION_FIELDS,
+    TOOL_NAME,
+    IncrementalFieldParser,
+    build_extraction_tool,
+    extract_fields,
+    failed_fields,
+    normalise,
+    retry_params,
+)
+from expense_pal.metrics import record_scan
+from expense_pal.preprocess import preprocess_image, preprocess_pdf, preprocess_settings
+from expense_pal.promptlog import get_prompt_log
 
 _PROMPTS_FILE = Path(__file__).parent / "prompts" / "receipt_extraction.md"
 PROMPTS_FILE = _PROMPTS_FILE
 
+_SYSTEM_PROMPT_RE = re.compile(r"## System Prompt\n\n(.+?)(?=\n## |\Z)", re.DOTALL)
+_USER_PROMPT_RE = re.compile(r"## User Prompt\n\n(.+?)(?=\n## |\Z)", re.DOTALL)
 
-def _load_prompts() -> tuple[str, str]:
-    text = _PROMPTS_FILE.read_text()
-    system = re.search(r"## System Prompt\n\n(.+?)(?=\n## |\Z)", text, re.DOTALL).group(1).strip()
-    user = re.search(r"## User Prompt\n\n(.+?)(?=\n## |\Z)", text, re.DOTALL).group(1).strip()
+
+def parse_prompt_template(text: str) -> tuple[str, str]:
+    """Split a prompt markdown file into (system_prompt, user_prompt_template)."""
+    system = _SYSTEM_PROMPT_RE.search(text).group(1).strip()
+    user = _USER_PROMPT_RE.search(text).group(1).strip()
     return system, user
 
+# Bump when the response format changes so old cache entries are not reused
+_OUTPUT_FORMAT = "tool-v1"
+
+# Shortest prompt prefix Anthropic will cache, by model name prefix; a
+# breakpoint ending a shorter prefix is silently ignored
+_CACHE_MIN_TOKENS = {"claude-haiku-4-5": 4096, "claude-haiku": 2048}
+_DEFAULT_CACHE_MIN_TOKENS = 1024
+# Added to the system prompt by the API when a tool call is forced
+_TOOL_CHOICE_TOKENS = 313
+# The popular descriptions in the cached prefix are re-chosen this often (seconds)
+_PINNED_TTL = 3600
+
 SUPPORTED_IMAGE_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
 SUPPORTED_TYPES = set(SUPPORTED_IMAGE_TYPES.keys()) | {".pdf"}
 
 
-def scan_receipt(file_path: Path, model: str | None = None, prompt_template_override: str | None = None) -> dict:
-    """Send a receipt image or PDF to Claude for extraction and classification.
+def cache_min_tokens(model: str) -> int:
+    """The shortest prefix ``model`` caches, in tokens."""
+    for prefix, minimum in _CACHE_MIN_TOKENS.items():
+        if model.startswith(prefix):
+            return minimum
+    return _DEFAULT_CACHE_MIN_TOKENS
+
 
-    Returns a dict with keys: date, total_amount, vat_amount, category.
+def _mtime(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class Scanner:
+    """A warm scanning session shared by every scan in the process.
+
+    Holds one Anthropic client (and so one connection pool) for its lifetime.
+    The prompt file and the known-descriptions file are parsed once and only
+    re-read when their mtime changes, so editing the prompt in ``--train`` mode
+    or confirming a new description is picked up on the next scan.
     """
-    ext = file_path.suffix.lower()
-    if ext not in SUPPORTED_TYPES:
-        print(f"Error: unsupported file type '{ext}'. Supported: {', '.join(sorted(SUPPORTED_TYPES))}", file=sys.stderr)
-        sys.exit(1)
-
-    data = base64.standard_b64encode(file_path.read_bytes()).decode("utf-8")
-
-    if ext in SUPPORTED_IMAGE_TYPES:
-        media_type = SUPPORTED_IMAGE_TYPES[ext]
-        file_block = {
-            "type": "image",
-            "source": {
-                "type": "base64",
-                "media_type": media_type,
-                "data": data,
-            },
-        }
-    else:
-        file_block = {
-            "type": "document",
-            "source": {
-                "type": "base64",
-                "media_type": "application/pdf",
-                "data": data,
-            },
+
+    def __init__(self, api_key: str = ANTHROPIC_API_KEY, prompts_file: Path = PROMPTS_FILE):
+        self.api_key = api_key
+        self._prompts_file = prompts_file
+        self._lock = threading.Lock()
+        self._client: anthropic.Anthropic | None = None
+        self._prompts_mtime: int | None = None
+        self._prompts: tuple[str, str] | None = None
+        self.descriptions = DescriptionIndex()
+        self.category_list = ", ".join(get_llm_category_names())
+        self.tool = build_extraction_tool(get_llm_category_names())
+        self.cache = ScanCache()
+        self._tool_tokens = estimate_tokens(json.dumps(self.tool)) + _TOOL_CHOICE_TOKENS
+        self._pinned: dict[int, tuple[float, list[str]]] = {}
+        self._stats_lock = threading.Lock()
+        # Counts of responses, ones that ignored the tool and needed text
+        # recovery ("malformed"), and follow-up requests for failed fields
+        self.stats = {"responses": 0, "malformed": 0, "field_retries": 0}
+
+    @property
+    def client(self) -> anthropic.Anthropic:
+        with self._lock:
+            if self._client is None:
+                self._client = anthropic.Anthropic(api_key=self.api_key)
+            return self._client
+
+    def prompts(self) -> tuple[str, str]:
+        """Return (system_prompt, user_prompt_template), re-parsing only if the file changed."""
+        mtime = _mtime(self._prompts_file)
+        with self._lock:
+            if self._prompts is None or mtime != self._prompts_mtime:
+                self._prompts = parse_prompt_template(self._prompts_file.read_text())
+                self._prompts_mtime = mtime
+            return self._prompts
+
+    def description_list(self, file_path: Path | None = None, hints: str = "", pinned: list[str] = ()) -> str:
+        """Return the known descriptions most relevant to a receipt, rendered for the prompt.
+
+        ``pinned`` descriptions come first; then the best-ranked others that
+        fit ``DESCRIPTION_TOKEN_BUDGET``; see ``DescriptionIndex``.
+        """
+        descriptions = [*pinned, *self.descriptions.rank(file_path, hints, exclude=frozenset(pinned))]
+        if not descriptions:
+            return "No known descriptions available."
+        return "\n".join(f"- {d}" for d in descriptions)
+
+    def pinned_descriptions(self, token_budget: int) -> list[str]:
+        """The popular descriptions that pad the cached prompt prefix, filling ``token_budget``.
+
+        Chosen once and kept for ``_PINNED_TTL``, so confirms in between do
+        not change the prefix and every receipt reads it from the cache.
+        """
+        if token_budget <= 0:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            chosen = self._pinned.get(token_budget)
+        if chosen is None or now - chosen[0] > _PINNED_TTL:
+            chosen = (now, self.descriptions.popular(token_budget))
+            with self._lock:
+                self._pinned[token_budget] = chosen
+        return chosen[1]
+
+    def prepare(
+        self,
+        file_path: Path,
+        model: str | None = None,
+        prompt_template_override: str | None = None,
+    ) -> dict:
+        """Build everything needed to scan one receipt without calling the API.
+
+        Returns a dict with the ``cache_key``, resolved ``model``, raw file bytes
+        and the rendered ``system_prompt`` and ``prompt`` (plus the template and
+        description list it was rendered from, for the prompt log). Image preprocessing
+        is left to ``build_params`` so cache hits never pay for it. Raises
+        ``ValueError`` for a file type Claude cannot read.
+        """
+        started = time.monotonic()
+        ext = file_path.suffix.lower()
+        if ext not in SUPPORTED_TYPES:
+            raise ValueError(f"unsupported file type '{ext}'. Supported: {', '.join(sorted(SUPPORTED_TYPES))}")
+
+        raw_bytes = file_path.read_bytes()
+
+        if prompt_template_override is not None:
+            system_prompt, user_prompt_template = parse_prompt_template(prompt_template_override)
+        else:
+            system_prompt, user_prompt_template = self.prompts()
+        # The description list grows with every confirm and is ranked per receipt,
+        # so it is left out of the prompt version; otherwise each confirm would
+        # invalidate the whole cache.
+        model = model or ANTHROPIC_MODEL
+        digest = file_digest(raw_bytes)
+        version = prompt_version(
+            system_prompt, user_prompt_template, self.category_list, preprocess_settings(), _OUTPUT_FORMAT
+        )
+        cache_key = ScanCache.key(digest, model, version)
+
+        # Everything before the description list is identical for every receipt
+        # and becomes the cached prompt prefix, padded with the most popular
+        # descriptions up to the length the model will cache at all
+        head, marker, _ = user_prompt_template.partition("{description_list}")
+        prompt_prefix = head.format(category_list=self.category_list) if marker else ""
+        pinned: list[str] = []
+        if prompt_prefix:
+            fixed = self._tool_tokens + estimate_tokens(system_prompt) + estimate_tokens(prompt_prefix)
+            # A quarter over the minimum, as the estimate is only rough
+            pinned = self.pinned_descriptions(cache_min_tokens(model) * 5 // 4 - fixed)
+            if pinned:
+                prompt_prefix += "".join(f"- {d}\n" for d in pinned)
+            else:
+                # Too short to be cached; send the prompt as one block
+                prompt_prefix = ""
+        description_list = self.description_list(file_path, pinned=pinned)
+        prompt = user_prompt_template.format(category_list=self.category_list, description_list=description_list)
+        return {
+            "file_path": file_path,
+            "raw_bytes": raw_bytes,
+            "digest": digest,
+            "model": model,
+            "cache_key": cache_key,
+            "system_prompt": system_prompt,
+            "user_prompt_template": user_prompt_template,
+            "description_list": description_list,
+            "pinned_descriptions": pinned,
+            "prompt_prefix": prompt_prefix,
+            "prompt": prompt,
+            "started": started,
         }
 
-    category_list = ", ".join(get_llm_category_names())
-    descriptions = load_descriptions()
-    if descriptions:
-        description_list = "\n".join(f"- {d}" for d in descriptions)
-    else:
-        description_list = "No known descriptions available."
-    if prompt_template_override is not None:
-        text = prompt_template_override
-        system_prompt = re.search(r"## System Prompt\n\n(.+?)(?=\n## |\Z)", text, re.DOTALL).group(1).strip()
-        user_prompt_template = re.search(r"## User Prompt\n\n(.+?)(?=\n## |\Z)", text, re.DOTALL).group(1).strip()
-    else:
-        system_prompt, user_prompt_template = _load_prompts()
-    prompt = user_prompt_template.format(category_list=category_list, description_list=description_list)
-
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = log_dir / f"{timestamp}_prompt.txt"
-    log_file.write_text(f"=== System Prompt ===\n{system_prompt}\n\n=== User Prompt ===\n{prompt}\n")
-
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-    message = client.messages.create(
-        model=model or ANTHROPIC_MODEL,
-        max_tokens=1024,
-        system=system_prompt,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    file_block,
-                    {"type": "text", "text": prompt},
-                ],
+    def cached(self, prepared: dict) -> dict | None:
+        """Return the cached result for a prepared scan, recording the hit in the metrics."""
+        result = self.cache.get(prepared["cache_key"])
+        if result is not None:
+            record_scan(prepared["model"], None, (time.monotonic() - prepared["started"]) * 1000, cache_hit=True)
+        return result
+
+    def build_params(self, prepared: dict) -> tuple[dict, dict | None]:
+        """Return (``messages.create`` kwargs, preprocessing stats) for a prepared scan.
+
+        The request is laid out so everything that is identical across receipts
+        comes first and ends in one cache-control breakpoint: the
+        ``record_receipt`` tool the model is forced to answer through, the
+        system prompt, the instructions up to the description list and the
+        pinned popular descriptions, which make the prefix long enough to be
+        cached (see ``pinned_descriptions``). The descriptions ranked for this
+        receipt and the rest of the instructions follow the breakpoint, with
+        the receipt last: the preprocessed image, or for a PDF its text layer
+        and/or the document (see ``preprocess_pdf``).
+        """
+        ext = prepared["file_path"].suffix.lower()
+        raw_bytes = prepared["raw_bytes"]
+        image_stats = None
+        if ext in SUPPORTED_IMAGE_TYPES:
+            upload_bytes, media_type, image_stats = preprocess_image(raw_bytes, SUPPORTED_IMAGE_TYPES[ext])
+            data = base64.standard_b64encode(upload_bytes).decode("utf-8")
+            file_block = {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": media_type,
+                    "data": data,
+                },
             }
-        ],
-    )
+            file_blocks = [file_block]
+        else:
+            file_blocks, image_stats = preprocess_pdf(raw_bytes)
+
+        prefix = prepared.get("prompt_prefix", "")
+        if prefix.strip():
+            text_blocks = [
+                {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": prepared["prompt"][len(prefix):]},
+            ]
+        else:
+            text_blocks = [{"type": "text", "text": prepared["prompt"], "cache_control": {"type": "ephemeral"}}]
+
+        params = {
+            "model": prepared["model"],
+            "max_tokens": 1024,
+            "tools": [self.tool],
+            "tool_choice": {"type": "tool", "name": TOOL_NAME},
+            "system": [{"type": "text", "text": prepared["system_prompt"]}],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [*text_blocks, *file_blocks],
+                }
+            ],
+        }
+        return params, image_stats
+
+    def scan(
+        self,
+        file_path: Path,
+        model: str | None = None,
+        prompt_template_override: str | None = None,
+        use_cache: bool = True,
+    ) -> dict:
+        """Extract and classify one receipt. See ``scan_receipt``."""
+        if model == CASCADE:
+            return self.scan_cascade(
+                file_path, prompt_template_override=prompt_template_override, use_cache=use_cache
+            )
+        prepared = self.prepare(file_path, model=model, prompt_template_override=prompt_template_override)
+        if use_cache:
+            cached = self.cached(prepared)
+            if cached is not None:
+                return cached
+
+        params, image_stats = self.build_params(prepared)
+        prepared["sent_at"] = time.monotonic()
+        message = self.client.messages.create(**params)
+        return self._complete(prepared, params, message, image_stats)
+
+    def stream_scan(
+        self,
+        file_path: Path,
+        model: str | None = None,
+        prompt_template_override: str | None = None,
+        use_cache: bool = True,
+    ) -> Iterator[tuple[str, object]]:
+        """Scan one receipt, yielding fields as soon as each value is complete.
+
+        Yields ``("field", (name, value))`` for every extraction field as it
+        streams in, then ``("done", result)`` with the same dict ``scan``
+        returns. Cache hits and cascade scans yield all fields at once.
+        """
+        prepared = None
+        if model != CASCADE:
+            prepared = self.prepare(file_path, model=model, prompt_template_override=prompt_template_override)
+        cached = self.cached(prepared) if prepared and use_cache else None
+        if prepared is None or cached is not None:
+            result = cached or self.scan(
+                file_path, model=model, prompt_template_override=prompt_template_override, use_cache=use_cache
+            )
+            for name in EXTRACTION_FIELDS:
+                yield "field", (name, result[name])
+            yield "done", result
+            return
+
+        params, image_stats = self.build_params(prepared)
+        prepared["sent_at"] = time.monotonic()
+        parser = IncrementalFieldParser()
+        with self.client.messages.stream(**params) as stream:
+            for event in stream:
+                if event.type != "content_block_delta":
+                    continue
+                chunk = getattr(event.delta, "partial_json", None) or getattr(event.delta, "text", None) or ""
+                for name, value in parser.feed(chunk):
+                    if name in EXTRACTION_FIELDS:
+                        yield "field", (name, normalise({name: value})[name])
+            message = stream.get_final_message()
+        yield "done", self._complete(prepared, params, message, image_stats)
+
+    def _complete(self, prepared: dict, params: dict, message, image_stats: dict | None) -> dict:
+        """Recover fields from a response, re-request failed ones, and finish."""
+        fields, malformed = extract_fields(message)
+        usage = usage_dict(message.usage)
+        failed = failed_fields(fields)
+        if failed:
+            retry = self.client.messages.create(**retry_params(params, message, failed))
+            fields = merge_retry(fields, retry, failed)
+            usage = add_usage(usage, usage_dict(retry.usage))
+        return self.finish(prepared, fields, usage, image_stats, malformed=malformed, retried=failed)
+
+    def scan_cascade(
+        self,
+        file_path: Path,
+        models: list[str] | None = None,
+        prompt_template_override: str | None = None,
+        use_cache: bool = True,
+    ) -> dict:
+        """Scan with the cheapest model first, escalating only when validation fails.
 
-    raw = message.content[0].text.strip()
-    # Strip markdown code fences if present
-    if raw.startswith("```"):
-        lines = raw.splitlines()
-        raw = "\n".join(lines[1:-1] if lines[-1].strip() == "```" else lines[1:])
+        Each tier's answer is checked with ``validate_extraction``; an answer
+        that cannot be parsed counts as a failure too. The first clean answer
+        wins, otherwise the last tier's answer is returned. The result carries a
+        ``cascade`` dict recording the ``model`` and ``tier`` that answered and
+        the ``problems`` found at each tier that was tried.
+        """
+        cascade = Cascade(models or CASCADE_MODELS)
+        for model in cascade.models:
+            try:
+                result = self.scan(
+                    file_path, model=model, prompt_template_override=prompt_template_override, use_cache=use_cache
+                )
+            except (ValueError, IndexError) as exc:
+                cascade.failed(model, exc)
+                continue
+            if cascade.answered(model, result):
+                break
+        return cascade.result()
 
-    result = json.loads(raw)
+    def log_call(
+        self,
+        prepared: dict,
+        fields: dict,
+        usage: dict,
+        malformed: bool = False,
+        retried: list[str] | None = None,
+        error: str | None = None,
+    ):
+        """Queue a record of one API call for the background prompt log.
 
-    # Normalise keys with defaults
+        The template and the pinned descriptions are referenced by hash and
+        written to the log only the first time each version is seen; the
+        descriptions ranked for this receipt go in the record itself.
+        """
+        log = get_prompt_log()
+        if log is None:
+            return
+        template = {
+            "system": prepared["system_prompt"],
+            "user": prepared["user_prompt_template"],
+            "category_list": self.category_list,
+        }
+        template_hash = prompt_version(*template.values())
+        texts = {template_hash: template}
+        description_list = prepared["description_list"]
+        pinned = "\n".join(f"- {d}" for d in prepared.get("pinned_descriptions", ()))
+        descriptions_hash = None
+        if pinned:
+            descriptions_hash = prompt_version(pinned)
+            texts[descriptions_hash] = pinned
+            description_list = description_list[len(pinned):]
+        sent_at = prepared.get("sent_at")
+        entry = {
+            "ts": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "file": str(prepared["file_path"]),
+            "digest": prepared["digest"],
+            "model": prepared["model"],
+            "template": template_hash,
+            "descriptions": descriptions_hash,
+            "ranked_descriptions": description_list,
+            "latency_ms": round((time.monotonic() - sent_at) * 1000) if sent_at else None,
+            "usage": usage,
+            "response": fields,
+        }
+        if malformed or retried:
+            entry["parse"] = {"malformed": malformed, "retried_fields": retried or []}
+        if error:
+            entry["error"] = error
+        log.record(entry, texts)
+
+    def finish(
+        self,
+        prepared: dict,
+        fields: dict,
+        usage: dict,
+        image_stats: dict | None,
+        malformed: bool = False,
+        retried: list[str] | None = None,
+    ) -> dict:
+        """Normalise extracted fields, store them in the scan cache and attach usage and API latency.
+
+        Raises ValueError if not a single field could be recovered.
+        """
+        with self._stats_lock:
+            self.stats["responses"] += 1
+            self.stats["malformed"] += int(malformed)
+            self.stats["field_retries"] += int(bool(retried))
+        wall_ms = (time.monotonic() - prepared["started"]) * 1000
+        if len(failed_fields(fields)) == len(EXTRACTION_FIELDS):
+            self.log_call(prepared, fields, usage, malformed, retried, error="no extraction fields")
+            record_scan(prepared["model"], usage, wall_ms, cache_hit=False, image_stats=image_stats, ok=False)
+            raise ValueError("no extraction fields found in the response")
+        self.log_call(prepared, fields, usage, malformed, retried)
+        record_scan(prepared["model"], usage, wall_ms, cache_hit=False, image_stats=image_stats)
+        extracted = normalise(fields)
+        if image_stats is not None:
+            extracted["preprocess"] = image_stats
+        self.cache.put(prepared["cache_key"], extracted)
+        result = {**extracted, "usage": usage}
+        if prepared.get("sent_at"):
+            result["latency_ms"] = round((time.monotonic() - prepared["sent_at"]) * 1000)
+        if malformed or retried:
+            result["parse"] = {"malformed": malformed, "retried_fields": retried or []}
+        return result
+
+
+class Cascade:
+    """Escalation and accounting for one cascade scan, shared by ``Scanner.scan_cascade`` and the async engine.
+
+    The caller scans with each of ``models`` in turn and reports the answer
+    to ``answered``, which says whether it passed validation and the cascade
+    can stop, or the parse error to ``failed``. ``result`` then returns the
+    answer to use, with the ``cascade`` record and the usage and latency of
+    every tier that was tried added up.
+    """
+
+    def __init__(self, models: list[str]):
+        self.models = models
+        self.attempts: list[dict] = []
+        self._result: dict | None = None
+        self._usage: dict[str, int] = {}
+        self._latency_ms = 0
+
+    def answered(self, model: str, result: dict) -> bool:
+        """Record a tier's answer; True if it is clean and no further tier is needed."""
+        result = dict(result)
+        self._usage = add_usage(self._usage, result.pop("usage", {}))
+        self._latency_ms += result.pop("latency_ms", 0)
+        problems = validate_extraction(result)
+        self.attempts.append({"model": model, "problems": problems})
+        self._result = result
+        return not problems
+
+    def failed(self, model: str, exc: Exception):
+        """Record a tier whose answer could not be parsed; re-raises ``exc`` on the last tier."""
+        if len(self.attempts) == len(self.models) - 1:
+            raise exc
+        self.attempts.append({"model": model, "problems": [f"unparseable response: {exc}"]})
+
+    def result(self) -> dict:
+        result = dict(self._result)
+        result["cascade"] = {
+            "model": self.attempts[-1]["model"],
+            "tier": len(self.attempts) - 1,
+            "attempts": self.attempts,
+        }
+        if self._usage:
+            result["usage"] = self._usage
+            result["latency_ms"] = self._latency_ms
+        return result
+
+
+def merge_retry(fields: dict, retry_message, failed: list[str]) -> dict:
+    """Take only the previously failed fields from a retry response."""
+    retried, _ = extract_fields(retry_message)
+    return {**fields, **{f: retried[f] for f in failed if f in retried}}
+
+
+def add_usage(a: dict, b: dict) -> dict:
+    return {key: a.get(key, 0) + b.get(key, 0) for key in a.keys() | b.keys()}
+
+
+def validate_extraction(result: dict) -> list[str]:
+    """Check an extraction for obvious mistakes; returns a list of problems (empty if clean).
+
+    Checks a parseable date in a sane range, numeric amounts with VAT not
+    exceeding the total, a category the prompt offered, and a description.
+    """
+    problems = []
+    try:
+        dated = date.fromisoformat(result.get("date", ""))
+    except ValueError:
+        problems.append("date is not YYYY-MM-DD")
+    else:
+        today = date.today()
+        if not today - timedelta(days=6 * 366) <= dated <= today + timedelta(days=31):
+            problems.append("date out of range")
+    try:
+        total = Decimal(str(result.get("total_amount", "")))
+        vat = Decimal(str(result.get("vat_amount", "")))
+        if total <= 0:
+            problems.append("total is not positive")
+        if vat < 0 or vat > total:
+            problems.append("VAT exceeds total")
+    except InvalidOperation:
+        problems.append("amounts are not numeric")
+    if result.get("category", "") not in get_llm_category_names():
+        problems.append("unknown category")
+    if not str(result.get("description", "")).strip():
+        problems.append("missing description")
+    return problems
+
+
+def usage_dict(usage) -> dict:
+    """Flatten an API ``usage`` object, including prompt-cache token counts."""
     return {
-        "date": result.get("date", ""),
-        "total_amount": result.get("total_amount", "0.00"),
-        "vat_amount": result.get("vat_amount", "0.00"),
-        "category": result.get("category", ""),
-        "description": result.get("description", ""),
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
     }
+
+
+_scanner: Scanner | None = None
+_scanner_lock = threading.Lock()
+
+
+def get_scanner() -> Scanner:
+    """Return the process-wide Scanner session, creating it on first use."""
+    global _scanner
+    with _scanner_lock:
+        if _scanner is None:
+            _scanner = Scanner()
+        return _scanner
+
+
+def scan_receipt(
+    file_path: Path,
+    model: str | None = None,
+    prompt_template_override: str | None = None,
+    use_cache: bool = True,
+) -> dict:
+    """Send a receipt image or PDF to Claude for extraction and classification.
+
+    Results are stored in the on-disk scan cache, keyed by the file's content
+    hash, the model and the prompt version. With ``use_cache=False`` the cached
+    result is ignored and the receipt is re-scanned (the fresh result still
+    replaces the cache entry).
+
+    Images are downsized and re-encoded before upload (see ``preprocess_image``).
+    All calls share one warm ``Scanner`` session (see ``get_scanner``).
+
+    Pass ``model="cascade"`` to run the model cascade (see ``Scanner.scan_cascade``).
+
+    Returns a dict with keys: date, total_amount, vat_amount, category,
+    description, plus ``preprocess`` stats for images and, for fresh API calls
+    (not cache hits), ``usage`` token counts including prompt-cache reads/writes
+    and ``latency_ms``, the time spent waiting for the API.
+    """
+    return get_scanner().scan(
+        file_path, model=model, prompt_template_override=prompt_template_override, use_cache=use_cache
+    )
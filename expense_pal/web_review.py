@@ -4,12 +4,11 @@ import mimetypes
 import socket
 import threading
 import webbrowser
-from datetime import datetime, timezone
 from pathlib import Path
 
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, jsonify, request, send_file
 
-from expense_pal.config import load_descriptions, save_description
+from expense_pal.descriptions import get_description_store
 
 
 _HTML_TEMPLATE = """\
@@ -300,7 +299,7 @@ def review_receipt(extracted_data: dict, categories: list[dict], file_path: Path
         selected = 'selected' if desc == llm_category else ''
         options_html += f'<option value="{desc}" {selected}>{desc}</option>\n'
 
-    description_json = json.dumps(load_descriptions())
+    description_json = json.dumps(get_description_store().descriptions())
 
     page_html = _HTML_TEMPLATE.format(
         filename=file_path.name,
@@ -325,7 +324,7 @@ def review_receipt(extracted_data: dict, categories: list[dict], file_path: Path
     @app.route("/submit", methods=["POST"])
     def submit():
         data = request.get_json(force=True)
-        save_description(data.get("description", ""))
+        get_description_store().add(data.get("description", ""))
         result_holder.append(data)
         shutdown_event.set()
         return "", 204
@@ -433,6 +432,8 @@ _MULTI_HTML_TEMPLATE = """\
   }}
   .file-list li:hover {{ background: #f4f6ff; }}
   .file-list li.active {{ background: #e8eeff; color: #3a6ae0; font-weight: 600; }}
+  .file-list li.duplicate {{ color: #b7791f; }}
+  .file-list li.duplicate::before {{ content: "DUP "; font-size: 0.7rem; font-weight: 700; }}
   .all-done {{
     padding: 20px 14px;
     text-align: center;
@@ -609,6 +610,7 @@ _MULTI_HTML_TEMPLATE = """\
         <option value="claude-haiku-4-5-20251001">Haiku</option>
         <option value="claude-sonnet-4-6" selected>Sonnet</option>
         <option value="claude-opus-4-6">Opus</option>
+        <option value="cascade">Cascade (Haiku &rarr; Sonnet &rarr; Opus)</option>
       </select>
     </div>
     <div class="buttons">
@@ -628,6 +630,20 @@ _MULTI_HTML_TEMPLATE = """\
     document.getElementById('statusMsg').textContent = msg;
   }}
 
+  function usageText(data) {{
+    const parts = [];
+    const d = data.duplicate;
+    if (d) parts.push(d.entry ? 'Probable duplicate of ' + d.of + (d.match === 'exact'
+                                ? ' (already in the ledger; Confirm files it without a new entry, Re-process to scan it anyway)'
+                                : ' (already in the ledger; Confirm asks whether it is the same receipt, Re-process to scan it anyway)')
+                              : 'Probable duplicate of ' + d.of + ' (showing its extraction)');
+    const u = data.usage;
+    if (u) parts.push(u.input_tokens + ' in (' + u.cache_read_input_tokens + ' cached) / ' + u.output_tokens + ' out tokens');
+    if (data.latency_ms != null) parts.push((data.latency_ms / 1000).toFixed(1) + 's');
+    if (data.cascade) parts.push('answered by ' + data.cascade.model);
+    return parts.join(' \u00b7 ');
+  }}
+
   function setFormEnabled(enabled) {{
     ['date', 'total_amount', 'vat_amount', 'description', 'category'].forEach(id => {{
       document.getElementById(id).disabled = !enabled;
@@ -651,7 +667,10 @@ _MULTI_HTML_TEMPLATE = """\
   }}
 
   function loadFiles() {{
-    fetch('/files').then(r => r.json()).then(files => {{
+    Promise.all([
+      fetch('/files').then(r => r.json()),
+      fetch('/duplicates').then(r => r.json()),
+    ]).then(([files, duplicates]) => {{
       const list = document.getElementById('fileList');
       list.innerHTML = '';
       if (files.length === 0) {{
@@ -672,6 +691,10 @@ _MULTI_HTML_TEMPLATE = """\
         const li = document.createElement('li');
         li.textContent = name;
         li.title = name;
+        if (duplicates[name]) {{
+          li.classList.add('duplicate');
+          li.title = name + ' \u2014 probable duplicate of ' + duplicates[name].of;
+        }}
         li.onclick = () => selectFile(name);
         list.appendChild(li);
       }});
@@ -683,9 +706,28 @@ _MULTI_HTML_TEMPLATE = """\
     }});
   }}
 
+  let activeStream = null;
+
+  function showPreview(name) {{
+    const preview = document.getElementById('preview');
+    const ext = name.split('.').pop().toLowerCase();
+    if (ext === 'pdf') {{
+      const iframe = document.createElement('iframe');
+      iframe.src = '/image/' + encodeURIComponent(name);
+      iframe.title = name;
+      preview.appendChild(iframe);
+    }} else {{
+      const img = document.createElement('img');
+      img.src = '/image/' + encodeURIComponent(name);
+      img.alt = name;
+      preview.appendChild(img);
+    }}
+  }}
+
   function selectFile(name) {{
     if (currentFile === name) return;
     currentFile = name;
+    if (activeStream) {{ activeStream.close(); activeStream = null; }}
     document.querySelectorAll('.file-list li').forEach(li => {{
       li.classList.toggle('active', li.textContent === name);
     }});
@@ -694,45 +736,48 @@ _MULTI_HTML_TEMPLATE = """\
     if (existing) existing.remove();
     document.getElementById('placeholder').style.display = 'none';
     document.getElementById('spinner').style.display = 'block';
+    ['date', 'total_amount', 'vat_amount', 'description'].forEach(id => {{
+      document.getElementById(id).value = '';
+    }});
+    document.getElementById('category').value = '';
     setFormEnabled(false);
     setStatus('Scanning with Claude\u2026');
+    showPreview(name);
     const model = document.getElementById('modelSelect').value;
-    fetch('/select/' + encodeURIComponent(name), {{
-      method: 'POST',
-      headers: {{'Content-Type': 'application/json'}},
-      body: JSON.stringify({{model: model}}),
-    }})
-      .then(r => r.json())
-      .then(data => {{
-        document.getElementById('spinner').style.display = 'none';
-        const ext = name.split('.').pop().toLowerCase();
-        if (ext === 'pdf') {{
-          const iframe = document.createElement('iframe');
-          iframe.src = '/image/' + encodeURIComponent(name);
-          iframe.title = name;
-          preview.appendChild(iframe);
-        }} else {{
-          const img = document.createElement('img');
-          img.src = '/image/' + encodeURIComponent(name);
-          img.alt = name;
-          preview.appendChild(img);
-        }}
-        document.getElementById('date').value = data.date || '';
-        document.getElementById('total_amount').value = data.total_amount || '';
-        document.getElementById('vat_amount').value = data.vat_amount || '';
-        document.getElementById('description').value = data.description || '';
-        document.getElementById('category').value = data.category || '';
-        setFormEnabled(true);
-        setStatus('');
-      }})
-      .catch(() => {{
-        document.getElementById('spinner').style.display = 'none';
-        document.getElementById('placeholder').style.display = '';
-        setStatus('Error scanning file.');
-      }});
+    const es = new EventSource('/stream/' + encodeURIComponent(name) + '?model=' + encodeURIComponent(model));
+    activeStream = es;
+    es.addEventListener('field', e => {{
+      if (currentFile !== name) return;
+      const msg = JSON.parse(e.data);
+      document.getElementById('spinner').style.display = 'none';
+      document.getElementById(msg.field).value = msg.value || '';
+    }});
+    es.addEventListener('done', e => {{
+      es.close();
+      if (activeStream === es) activeStream = null;
+      if (currentFile !== name) return;
+      const data = JSON.parse(e.data);
+      document.getElementById('spinner').style.display = 'none';
+      document.getElementById('date').value = data.date || '';
+      document.getElementById('total_amount').value = data.total_amount || '';
+      document.getElementById('vat_amount').value = data.vat_amount || '';
+      document.getElementById('description').value = data.description || '';
+      document.getElementById('category').value = data.category || '';
+      setFormEnabled(true);
+      setStatus(usageText(data));
+    }});
+    const fail = () => {{
+      es.close();
+      if (activeStream === es) activeStream = null;
+      if (currentFile !== name) return;
+      document.getElementById('spinner').style.display = 'none';
+      setStatus('Error scanning file.');
+    }};
+    es.addEventListener('failed', fail);
+    es.onerror = fail;
   }}
 
-  function doConfirm() {{
+  function doConfirm(sameReceipt) {{
     if (!currentFile) return;
     const data = {{
       filename: currentFile,
@@ -742,13 +787,19 @@ _MULTI_HTML_TEMPLATE = """\
       description: document.getElementById('description').value,
       category: document.getElementById('category').value,
     }};
+    if (sameReceipt !== undefined) data.same_receipt = sameReceipt;
     setFormEnabled(false);
     setStatus('Saving\u2026');
     fetch('/submit', {{
       method: 'POST',
       headers: {{'Content-Type': 'application/json'}},
       body: JSON.stringify(data),
-    }}).then(r => r.json()).then(() => {{
+    }}).then(r => r.json()).then(body => {{
+      if (body.needs_confirmation) {{
+        // A look-alike of a saved receipt: only the reviewer can tell if it is the same one
+        doConfirm(window.confirm(body.question));
+        return;
+      }}
       const saved = currentFile;
       currentFile = null;
       resetForm();
@@ -783,7 +834,7 @@ _MULTI_HTML_TEMPLATE = """\
         document.getElementById('description').value = data.description || '';
         document.getElementById('category').value = data.category || '';
         setFormEnabled(true);
-        setStatus('');
+        setStatus(usageText(data));
       }})
       .catch(() => {{
         document.getElementById('spinner').style.display = 'none';
@@ -816,6 +867,52 @@ _MULTI_HTML_TEMPLATE = """\
     }});
   }}
 
+  function doEvaluate() {{
+    const content = document.getElementById('promptEditor').value;
+    const model = document.getElementById('modelSelect').value;
+    const btn = document.getElementById('btnEvaluate');
+    const el = document.getElementById('promptStatus');
+    btn.disabled = true;
+    el.style.color = '#555';
+    el.textContent = 'Evaluating against confirmed receipts\u2026';
+    fetch('/evaluate', {{
+      method: 'POST',
+      headers: {{'Content-Type': 'application/json'}},
+      body: JSON.stringify({{prompt_template: content, model: model}}),
+    }}).then(r => r.json()).then(data => {{
+      btn.disabled = false;
+      if (data.error) {{
+        el.style.color = 'red';
+        el.textContent = 'Error: ' + data.error;
+        return;
+      }}
+      el.textContent = '';
+      renderEvaluation(data);
+    }}).catch(() => {{
+      btn.disabled = false;
+      el.style.color = 'red';
+      el.textContent = 'Error running the evaluation.';
+    }});
+  }}
+
+  function renderEvaluation(data) {{
+    const fields = ['date', 'total_amount', 'vat_amount', 'category', 'description'];
+    const pct = v => Math.round(v * 100) + '%';
+    const secs = v => v == null ? '-' : (v / 1000).toFixed(1) + 's';
+    let html = '<table style="border-collapse:collapse;margin-top:0.5rem;"><tr><th style="text-align:left;padding-right:1rem;">Prompt</th>'
+      + fields.map(f => '<th style="padding:0 0.5rem;">' + f.replace('_amount', '') + '</th>').join('')
+      + '<th style="padding:0 0.5rem;">all</th><th style="padding:0 0.5rem;">tokens in/out</th><th style="padding:0 0.5rem;">p50</th></tr>';
+    data.rows.forEach(r => {{
+      const tokens = r.input_tokens == null ? '-' : Math.round(r.input_tokens) + ' / ' + Math.round(r.output_tokens);
+      html += '<tr><td style="padding-right:1rem;">' + r.prompt + '</td>'
+        + fields.map(f => '<td style="text-align:center;">' + pct(r.accuracy[f]) + '</td>').join('')
+        + '<td style="text-align:center;font-weight:600;">' + pct(r.all_correct) + '</td>'
+        + '<td style="text-align:center;">' + tokens + '</td><td style="text-align:center;">' + secs(r.p50_ms) + '</td></tr>';
+    }});
+    html += '</table><div style="color:#777;margin-top:0.25rem;">' + data.receipts + ' confirmed receipt(s), ' + data.model + '</div>';
+    document.getElementById('evalResults').innerHTML = html;
+  }}
+
   function doQuit() {{
     fetch('/quit', {{method: 'POST'}}).then(() => {{
       document.body.innerHTML = '<div style="display:flex;align-items:center;justify-content:center;height:100vh;font-family:sans-serif;color:#555;font-size:1.1rem;">Session ended. You can close this tab.</div>';
@@ -909,20 +1006,41 @@ def _build_train_section(prompt_text: str) -> str:
         'style="padding:0.4rem 1rem;background:#4a90d9;color:#fff;border:none;border-radius:4px;'
         'cursor:pointer;font-size:0.85rem;">'
         "Save Prompt</button>"
+        '<button id="btnEvaluate" onclick="doEvaluate()" '
+        'style="padding:0.4rem 1rem;background:#eee;color:#555;border:none;border-radius:4px;'
+        'cursor:pointer;font-size:0.85rem;" title="Score the edited prompt against confirmed receipts">'
+        "Evaluate</button>"
         '<span id="promptStatus" style="font-size:0.82rem;"></span>'
-        "</div></div>"
+        "</div>"
+        '<div id="evalResults" style="flex-shrink:0;max-height:40%;overflow:auto;font-size:0.8rem;"></div>'
+        "</div>"
     )
 
 
-def review_receipts_batch(folder: Path, categories: list[dict], train: bool = False) -> list[dict]:
-    """Serve a persistent web UI for batch-processing receipts from a folder.
+def create_batch_app(
+    folder: Path,
+    categories: list[dict],
+    train: bool = False,
+    use_cache: bool = True,
+    prefetch_workers: int = 2,
+    fingerprints: dict[str, dict] | None = None,
+    duplicates: dict[str, dict] | None = None,
+) -> Flask:
+    """Build the multi-scan Flask app for ``folder`` without serving it.
 
-    Blocks until the user clicks Quit or all files are processed.
-    Returns list of all confirmed expense entry dicts (with nominal codes).
+    Takes the same arguments as ``review_receipts_batch``. The app's config
+    carries ``CONFIRMED_ENTRIES`` (appended to on every confirm),
+    ``SHUTDOWN_EVENT`` (set on Quit or once the folder is empty) and
+    ``PREFETCHER`` (None when prefetching is off; not started yet), so the
+    app can also be driven from Flask's test client.
     """
-    from expense_pal.scanner import scan_receipt
+    from expense_pal.extraction import EXTRACTION_FIELDS
+    from expense_pal.scanner import get_scanner, scan_receipt
     from expense_pal.categories import get_nominal_code
-    from expense_pal.config import EXPENSES_LOG
+    from expense_pal.config import EVAL_LIMIT, MULTI_SCAN_MODEL
+    from expense_pal.duplicates import fingerprint_file, get_fingerprint_index
+    from expense_pal.ledger import created_at, get_ledger
+    from expense_pal.prefetch import Prefetcher
 
     SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".pdf"}
 
@@ -932,10 +1050,38 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
             if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS
         )
 
-    port = _free_port()
     confirmed_entries: list[dict] = []
     shutdown_event = threading.Event()
     scan_cache: dict[str, dict] = {}
+    fingerprints = dict(fingerprints or {})
+    duplicates = dict(duplicates or {})
+
+    def scan_file(name: str, model: str | None) -> dict:
+        if prefetcher is not None:
+            return prefetcher.result(name, model or MULTI_SCAN_MODEL)
+        return scan_receipt(folder / name, model=model, use_cache=use_cache)
+
+    def duplicate_result(filename: str, model: str | None) -> dict | None:
+        """The extraction to show for a flagged duplicate, without calling Claude for it."""
+        duplicate = duplicates.get(filename)
+        if duplicate is None:
+            return None
+        if duplicate.get("entry"):
+            extracted = {name: duplicate["entry"].get(name, "") for name in EXTRACTION_FIELDS}
+        else:
+            original = duplicate["of"]
+            extracted = scan_cache.get(original) or scan_file(original, model)
+            extracted = {name: extracted.get(name, "") for name in EXTRACTION_FIELDS}
+        return {**extracted, "duplicate": duplicate}
+
+    prefetcher = None
+    if prefetch_workers > 0:
+        prefetcher = Prefetcher(
+            scan=lambda name, model: scan_receipt(folder / name, model=model, use_cache=use_cache),
+            list_pending=lambda: [name for name in get_pending_files() if name not in duplicates],
+            model=MULTI_SCAN_MODEL,
+            workers=prefetch_workers,
+        )
 
     app = Flask(__name__)
     app.logger.disabled = True
@@ -948,7 +1094,7 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
         desc = cat["description"]
         options_html += f'<option value="{desc}">{desc}</option>\n'
 
-    description_json = json.dumps(load_descriptions())
+    description_json = json.dumps(get_description_store().descriptions())
 
     from expense_pal.scanner import PROMPTS_FILE
     train_section = _build_train_section(PROMPTS_FILE.read_text()) if train else ""
@@ -969,6 +1115,10 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
     def files():
         return jsonify(get_pending_files())
 
+    @app.route("/duplicates")
+    def duplicate_files():
+        return jsonify({name: {"of": d["of"], "match": d["match"]} for name, d in duplicates.items()})
+
     @app.route("/select/<filename>", methods=["POST"])
     def select_file(filename):
         file_path = folder / filename
@@ -978,20 +1128,85 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
             return jsonify(scan_cache[filename])
         body = request.get_json(force=True, silent=True) or {}
         model = body.get("model")
-        extracted = scan_receipt(file_path, model=model)
+        extracted = duplicate_result(filename, model) or scan_file(filename, model)
         scan_cache[filename] = extracted
         return jsonify(extracted)
 
+    @app.route("/stream/<filename>")
+    def stream_file(filename):
+        file_path = folder / filename
+        if not file_path.exists():
+            return jsonify({"error": "File not found"}), 404
+        model = request.args.get("model") or MULTI_SCAN_MODEL
+
+        def sse(event: str, data) -> str:
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+        def whole(result: dict):
+            for name in EXTRACTION_FIELDS:
+                yield sse("field", {"field": name, "value": result.get(name, "")})
+            yield sse("done", result)
+
+        def generate():
+            if filename in scan_cache:
+                yield from whole(scan_cache[filename])
+                return
+            if filename in duplicates:
+                try:
+                    result = duplicate_result(filename, model)
+                except Exception as exc:
+                    yield sse("failed", {"error": str(exc)})
+                    return
+                scan_cache[filename] = result
+                yield from whole(result)
+                return
+            future, owned = prefetcher.claim(filename, model) if prefetcher is not None else (None, True)
+            if not owned:
+                # A prefetch worker already has this file; wait for its result
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    yield sse("failed", {"error": str(exc)})
+                    return
+                scan_cache[filename] = result
+                yield from whole(result)
+                return
+            try:
+                for event, payload in get_scanner().stream_scan(file_path, model=model, use_cache=use_cache):
+                    if event == "field":
+                        name, value = payload
+                        yield sse("field", {"field": name, "value": value})
+                    else:
+                        scan_cache[filename] = payload
+                        if future is not None:
+                            future.set_result(payload)
+                        yield sse("done", payload)
+            except Exception as exc:
+                if future is not None and not future.done():
+                    future.set_exception(exc)
+                    prefetcher.discard(filename)
+                yield sse("failed", {"error": str(exc)})
+            finally:
+                # The browser closed the stream first: let a worker finish the scan for anyone waiting on it
+                if future is not None and not future.done():
+                    prefetcher.release(filename, model, future)
+
+        return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
     @app.route("/reprocess/<filename>", methods=["POST"])
     def reprocess_file(filename):
         file_path = folder / filename
         if not file_path.exists():
             return jsonify({"error": "File not found"}), 404
         scan_cache.pop(filename, None)
+        # The reviewer doubts the duplicate match; treat it as a receipt of its own
+        duplicates.pop(filename, None)
         body = request.get_json(force=True, silent=True) or {}
         model = body.get("model")
         prompt_template = body.get("prompt_template") if train else None
-        extracted = scan_receipt(file_path, model=model, prompt_template_override=prompt_template)
+        extracted = scan_receipt(
+            file_path, model=model, prompt_template_override=prompt_template, use_cache=False
+        )
         scan_cache[filename] = extracted
         return jsonify(extracted)
 
@@ -1005,6 +1220,24 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
         PROMPTS_FILE.write_text(content)
         return jsonify({"ok": True})
 
+    @app.route("/evaluate", methods=["POST"])
+    def evaluate_prompt():
+        if not train:
+            return jsonify({"error": "Train mode is not enabled"}), 403
+        from expense_pal.evaluate import load_corpus, run_evaluation
+        from expense_pal.scanner import PROMPTS_FILE
+        body = request.get_json(force=True, silent=True) or {}
+        model = body.get("model") or MULTI_SCAN_MODEL
+        corpus = load_corpus(limit=EVAL_LIMIT)
+        if not corpus:
+            return jsonify({"error": "No confirmed receipts to evaluate against yet"}), 400
+        variants = {"saved": None}
+        edited = body.get("prompt_template")
+        if edited and edited != PROMPTS_FILE.read_text():
+            variants["edited"] = edited
+        rows = run_evaluation(corpus, variants, [model], use_cache=use_cache)
+        return jsonify({"receipts": len(corpus), "model": model, "rows": rows})
+
     @app.route("/image/<filename>")
     def image(filename):
         file_path = folder / filename
@@ -1014,7 +1247,6 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
     @app.route("/submit", methods=["POST"])
     def submit():
         data = request.get_json(force=True)
-        save_description(data.get("description", ""))
         filename = data.get("filename", "")
         file_path = folder / filename
         nominal_code = get_nominal_code(data.get("category", "")) or ""
@@ -1026,12 +1258,42 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
             "category_nominal_code": nominal_code,
             "description": data.get("description", ""),
             "source_file": str(file_path),
-            "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "created_at": created_at(),
         }
-        confirmed_entries.append(entry)
-        with EXPENSES_LOG.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(entry) + "\n")
+        fingerprint = None
+        if file_path.exists():
+            fingerprint = fingerprints.get(filename) or fingerprint_file(file_path)
+        duplicate = duplicates.get(filename)
+        if duplicate and duplicate.get("entry") and duplicate["match"] != "exact" and "same_receipt" not in data:
+            # Only a byte-for-byte copy is filed under the existing entry unasked
+            saved = duplicate["entry"]
+            question = (
+                f"{filename} looks like {duplicate['of']} ({duplicate['match']} match), already saved as "
+                f"{saved.get('date', '')} {saved.get('total_amount', '')} {saved.get('description', '')}. "
+                "Is it the same receipt? OK files it under that entry; Cancel saves it as a new expense."
+            )
+            return jsonify({"needs_confirmation": True, "question": question}), 409
+        get_description_store().add(data.get("description", ""))
+        duplicates.pop(filename, None)
+        reused = bool(duplicate and duplicate.get("entry") and data.get("same_receipt", True))
+        if reused:
+            # Already in the ledger; file the copy under the existing entry
+            entry = duplicate["entry"]
+        else:
+            confirmed_entries.append(entry)
+            get_ledger().add(entry, fingerprint["sha256"] if fingerprint else None)
+            if duplicate and (folder / duplicate["of"]).exists():
+                # The pending original is now the copy of this confirmed receipt
+                duplicates[duplicate["of"]] = {**duplicate, "of": filename, "entry": entry}
+                scan_cache.pop(duplicate["of"], None)
+        for other in duplicates.values():
+            if other["of"] == filename:
+                other["entry"] = entry
+        if fingerprint is not None:
+            get_fingerprint_index().add(fingerprint, entry)
         scan_cache.pop(filename, None)
+        if prefetcher is not None:
+            prefetcher.discard(filename)
         done_dir = folder / "done"
         done_dir.mkdir(exist_ok=True)
         if file_path.exists():
@@ -1041,13 +1303,56 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
             t = threading.Timer(1.5, shutdown_event.set)
             t.daemon = True
             t.start()
-        return jsonify({"ok": True})
+        return jsonify({"ok": True, "reused": reused})
 
     @app.route("/quit", methods=["POST"])
     def quit_():
         shutdown_event.set()
         return "", 204
 
+    app.config.update(
+        CONFIRMED_ENTRIES=confirmed_entries,
+        SHUTDOWN_EVENT=shutdown_event,
+        PREFETCHER=prefetcher,
+    )
+    return app
+
+
+def review_receipts_batch(
+    folder: Path,
+    categories: list[dict],
+    train: bool = False,
+    use_cache: bool = True,
+    prefetch_workers: int = 2,
+    fingerprints: dict[str, dict] | None = None,
+    duplicates: dict[str, dict] | None = None,
+) -> list[dict]:
+    """Serve a persistent web UI for batch-processing receipts from a folder.
+
+    Scan results are kept per session by filename and persisted in the on-disk
+    scan cache; pass ``use_cache=False`` to ignore results from earlier sessions.
+    Unless ``prefetch_workers`` is 0, pending files are scanned in the background
+    ahead of the reviewer.
+
+    ``fingerprints`` and ``duplicates`` come from ``detect_duplicates``.
+    Duplicates are flagged in the sidebar and never sent to Claude: one of a
+    processed receipt shows (and on confirm reuses) its ledger entry, one of
+    another pending file shows that file's extraction. Re-process scans a
+    duplicate anyway. Confirmed receipts are added to the fingerprint index.
+
+    Blocks until the user clicks Quit or all files are processed.
+    Returns list of all confirmed expense entry dicts (with nominal codes).
+    """
+    app = create_batch_app(
+        folder,
+        categories,
+        train=train,
+        use_cache=use_cache,
+        prefetch_workers=prefetch_workers,
+        fingerprints=fingerprints,
+        duplicates=duplicates,
+    )
+    port = _free_port()
     server_thread = threading.Thread(
         target=lambda: app.run(host="127.0.0.1", port=port, use_reloader=False),
         daemon=True,
@@ -1055,8 +1360,14 @@ def review_receipts_batch(folder: Path, categories: list[dict], train: bool = Fa
     server_thread.start()
     _wait_for_server(port)
 
+    prefetcher = app.config["PREFETCHER"]
+    if prefetcher is not None:
+        prefetcher.start()
+
     url = f"http://127.0.0.1:{port}/"
     webbrowser.open(url)
 
-    shutdown_event.wait()
-    return confirmed_entries
+    app.config["SHUTDOWN_EVENT"].wait()
+    if prefetcher is not None:
+        prefetcher.stop()
+    return app.config["CONFIRMED_ENTRIES"]
@@ -0,0 +1,11 @@
+"""Shared test setup: every test runs against a scratch HOME, so nothing touches the real config."""
+import os
+import tempfile
+from pathlib import Path
+
+# Must happen before expense_pal is imported: its paths are resolved from HOME at import
+_HOME = Path(tempfile.mkdtemp(prefix="expense-pal-tests-"))
+os.environ["HOME"] = str(_HOME)
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+os.environ["EXPENSE_PAL_PROMPT_LOG"] = "0"
+os.environ["EXPENSE_PAL_METRICS"] = "0"
@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+import requests
+
+from expense_pal import api, auth
+from expense_pal.api import ApiClient, RateLimiter
+
+
+def _response(status, body=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(body or {}).encode()
+    resp.url = "https://api.example/v2/token_endpoint"
+    return resp
+
+
+class ScriptedSession:
+    """Stands in for the client's session, answering each request with the next scripted outcome."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_PATH", tmp_path / "tokens.json")
+    monkeypatch.setattr(api.time, "sleep", lambda seconds: None)
+    auth.TOKEN_PATH.write_text(json.dumps({"access_token": "old", "refresh_token": "r1", "expires_at": 0}))
+    return ApiClient("old", limiter=RateLimiter(1_000_000), base_url="https://api.example/v2")
+
+
+def test_refresh_goes_through_the_client_session_and_retries_transient_failures(client):
+    fresh = {"access_token": "new", "refresh_token": "r2", "expires_in": 3600}
+    client._session = session = ScriptedSession([requests.ConnectionError(), _response(502), _response(200, fresh)])
+
+    assert auth.refresh_access_token(client) == "new"
+    assert len(session.calls) == 3
+    method, url, kwargs = session.calls[-1]
+    assert (method, url) == ("POST", "https://api.example/v2/token_endpoint")
+    assert kwargs["data"] == {"grant_type": "refresh_token", "refresh_token": "r1"}
+    assert kwargs["auth"] == (auth.CLIENT_ID, auth.CLIENT_SECRET)
+    assert "Authorization" not in kwargs["headers"]
+    saved = json.loads(auth.TOKEN_PATH.read_text())
+    assert saved["refresh_token"] == "r2" and saved["expires_at"] > time.time()
+
+
+@pytest.mark.parametrize("status", [400, 401, 429])
+def test_refused_refresh_is_not_retried(client, status):
+    client._session = session = ScriptedSession([_response(status)])
+
+    assert auth.refresh_access_token(client) is None
+    assert len(session.calls) == 1
+
+
+def test_401_from_the_api_refreshes_through_the_same_session(client):
+    fresh = {"access_token": "new", "refresh_token": "r2", "expires_in": 3600}
+    client._refresh = lambda: auth.refresh_access_token(client)
+    client._session = session = ScriptedSession([_response(401), _response(200, fresh), _response(200, {"ok": 1})])
+
+    assert client.get("users/me").json() == {"ok": 1}
+    assert [url.rsplit("/", 1)[1] for _, url, _ in session.calls] == ["me", "token_endpoint", "me"]
+    assert session.calls[-1][2]["headers"]["Authorization"] == "Bearer new"
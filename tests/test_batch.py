@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+import anthropic
+import pytest
+from PIL import Image
+
+from benchmarks.fakes import FakeBatches, serve_batches
+from expense_pal import batch
+from expense_pal.cache import ScanCache
+from expense_pal.scanner import Scanner
+
+MODEL = "claude-sonnet-4-6"
+# Receipt file name -> the result type the fake gives its request
+OUTCOMES = {"lunch.jpg": "succeeded", "taxi.jpg": "errored", "hotel.png": "expired", "train.jpg": "succeeded"}
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "receipts"
+    folder.mkdir()
+    for i, name in enumerate(OUTCOMES):
+        Image.new("RGB", (40 + i, 60), "white").save(folder / name)
+    return folder
+
+
+@pytest.fixture
+def scanner(folder, tmp_path, monkeypatch):
+    scanner = Scanner(api_key="test")
+    scanner.cache = ScanCache(tmp_path / "scan_cache")
+    by_key = {scanner.prepare(path, model=MODEL)["cache_key"]: path.name for path in folder.iterdir()}
+    fake = FakeBatches(outcome=lambda request: OUTCOMES[by_key[request["custom_id"]]], retrieves_to_end=2)
+    server = serve_batches(fake)
+    scanner._client = anthropic.Anthropic(api_key="test", base_url=f"http://localhost:{server.server_port}")
+    monkeypatch.setattr(batch, "get_scanner", lambda: scanner)
+    monkeypatch.setattr(batch, "BATCHES_FILE", tmp_path / "batches.json")
+    yield scanner
+    server.shutdown()
+
+
+def test_submit_then_collect_fills_the_cache_and_records_failures(scanner, folder, tmp_path):
+    submitted = batch.submit_batches(folder, model=MODEL)
+    assert len(submitted) == 1
+    requests = submitted[0]["requests"]
+    assert sorted(Path(entry["file"]).name for entry in requests.values()) == sorted(OUTCOMES)
+
+    # Still processing: nothing is collected yet
+    assert batch.collect_batches(wait=False) == {"succeeded": 0, "failed": 0, "pending": 4}
+
+    assert batch.collect_batches(wait=True, poll_interval=0) == {"succeeded": 2, "failed": 2, "pending": 0}
+    state = json.loads((tmp_path / "batches.json").read_text())
+    record = state["batches"][0]
+    assert record["status"] == "collected"
+    errors = {Path(entry["file"]).name: entry.get("error") for entry in record["requests"].values()}
+    assert errors == {"lunch.jpg": None, "taxi.jpg": "errored", "hotel.png": "expired", "train.jpg": None}
+    for key, entry in record["requests"].items():
+        cached = scanner.cache.get(key)
+        assert (cached is not None) == (entry.get("error") is None)
+        if cached is not None:
+            assert cached["preprocess"] == entry["preprocess"]
+
+    # Collected batches are not fetched again, and cached receipts are not resubmitted
+    assert batch.collect_batches(wait=False) == {"succeeded": 0, "failed": 0, "pending": 0}
+    resubmitted = batch.submit_batches(folder, model=MODEL)
+    assert sorted(Path(e["file"]).name for e in resubmitted[0]["requests"].values()) == ["hotel.png", "taxi.jpg"]
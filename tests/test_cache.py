@@ -0,0 +1,37 @@
+from expense_pal import cache
+from expense_pal.cache import ScanCache
+
+
+def _size(directory) -> int:
+    return sum(p.stat().st_size for p in directory.glob("*/*.json"))
+
+
+def test_puts_do_not_sweep_the_directory_each_time(tmp_path, monkeypatch):
+    sweeps = []
+    real = cache.evict_directory
+    monkeypatch.setattr(cache, "evict_directory", lambda *args: sweeps.append(args) or real(*args))
+    store = ScanCache(tmp_path, max_mb=10)
+    for i in range(200):
+        store.put(f"{i:064x}", {"description": f"receipt {i}"})
+    # Once to learn the store's size; never again while it stays under the limit
+    assert len(sweeps) == 1
+    assert store.get(f"{7:064x}") == {"description": "receipt 7"}
+
+
+def test_store_stays_within_its_size_limit(tmp_path):
+    store = ScanCache(tmp_path, max_mb=4096 / 1024 / 1024)
+    sizes = []
+    for i in range(300):
+        store.put(f"{i:064x}", {"description": "x" * 40})
+        sizes.append(_size(tmp_path))
+    assert max(sizes) <= 4096
+    # The newest entries survive eviction
+    assert store.get(f"{299:064x}") is not None
+    assert store.get(f"{0:064x}") is None
+
+
+def test_rewriting_an_entry_does_not_inflate_the_running_size(tmp_path):
+    store = ScanCache(tmp_path, max_mb=10)
+    for _ in range(50):
+        store.put("a" * 64, {"description": "same receipt"})
+    assert store._budget.size == _size(tmp_path)
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+_SCRIPT = (
+    "import sys; sys.argv = ['expense-pal', *sys.argv[1:]]\n"
+    "from expense_pal.cli import main\n"
+    "try:\n    main()\nfinally:\n    print('dotenv loaded' if 'dotenv' in sys.modules else 'dotenv not loaded')\n"
+)
+
+
+@pytest.mark.parametrize("argv", [["--version"], ["--help"], ["push", "--help"], ["prescan", "--help"]])
+def test_version_and_help_ignore_malformed_settings(argv, tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path), EXPENSE_PAL_PUSH_WORKERS="four", EXPENSE_PAL_SCAN_CONCURRENCY="")
+    proc = subprocess.run(
+        [sys.executable, "-c", _SCRIPT, *argv], cwd=tmp_path, env=env, capture_output=True, text=True
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.rstrip().endswith("dotenv not loaded")
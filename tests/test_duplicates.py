@@ -0,0 +1,150 @@
+import random
+
+import pytest
+
+from expense_pal.config import DUPLICATE_MAX_DISTANCE
+from expense_pal.duplicates import FingerprintIndex, _Lookup, find_pending_duplicates
+from expense_pal.web_review import create_batch_app
+
+
+def _fingerprint(sha, dhash=None, text=None):
+    fingerprint = {"sha256": sha}
+    if dhash is not None:
+        fingerprint["dhash"] = f"{dhash:016x}"
+    if text is not None:
+        fingerprint["text"] = text
+    return fingerprint
+
+
+def _pairwise(a, b, max_distance=DUPLICATE_MAX_DISTANCE):
+    """How two fingerprints match, checked directly: the reference for the indexed lookups."""
+    if a["sha256"] == b["sha256"]:
+        return {"match": "exact", "distance": 0}
+    if a.get("text") and a["text"] == b.get("text"):
+        return {"match": "text", "distance": 0}
+    distance = bin(int(a["dhash"], 16) ^ int(b["dhash"], 16)).count("1")
+    return {"match": "perceptual", "distance": distance} if distance <= max_distance else None
+
+
+def _flip(bits, count, rng):
+    for bit in rng.sample(range(64), count):
+        bits ^= 1 << bit
+    return bits
+
+
+def test_lookup_finds_the_closest_perceptual_match_in_any_band():
+    rng = random.Random(7)
+    lookup = _Lookup(max_distance=6)
+    base = rng.getrandbits(64)
+    lookup.add(_fingerprint("far", _flip(base, 6, rng)), "far")
+    lookup.add(_fingerprint("near", _flip(base, 2, rng)), "near")
+    lookup.add(_fingerprint("other", _flip(base, 20, rng)), "other")
+
+    value, how = lookup.match(_fingerprint("new", base))
+    assert value == "near"
+    assert how == {"match": "perceptual", "distance": 2}
+    assert lookup.match(_fingerprint("new", _flip(base, 30, rng))) is None
+
+
+def test_lookup_prefers_exact_then_text_matches():
+    lookup = _Lookup()
+    lookup.add(_fingerprint("a", 0x0F0F0F0F0F0F0F0F, "lunch 12.50"), "first")
+    lookup.add(_fingerprint("b", 0x0F0F0F0F0F0F0F0E), "second")
+
+    assert lookup.match(_fingerprint("b", 0x0F0F0F0F0F0F0F0F)) == ("second", {"match": "exact", "distance": 0})
+    assert lookup.match(_fingerprint("c", 0x0F0F0F0F0F0F0F0E, "lunch 12.50")) == (
+        "first", {"match": "text", "distance": 0}
+    )
+
+
+def test_pending_duplicates_agree_with_pairwise_comparison():
+    rng = random.Random(3)
+    bases = [rng.getrandbits(64) for _ in range(20)]
+    fingerprints = {}
+    for i in range(200):
+        # Copies of a few receipts, some re-encoded (a few bits off), among unrelated ones
+        bits = _flip(rng.choice(bases), rng.randint(0, 12), rng) if i % 2 else rng.getrandbits(64)
+        fingerprints[f"r{i:03}.jpg"] = _fingerprint(f"sha{i}", bits)
+
+    expected, originals = {}, []
+    for name in sorted(fingerprints):
+        matches = [(found["distance"], original, found) for original in originals
+                   if (found := _pairwise(fingerprints[name], fingerprints[original]))]
+        if matches:
+            distance, original, found = min(matches, key=lambda m: (m[0], originals.index(m[1])))
+            expected[name] = {"of": original, **found}
+        else:
+            originals.append(name)
+    assert find_pending_duplicates(fingerprints) == expected
+
+
+def test_index_matches_processed_receipts_by_hash_text_and_image(tmp_path):
+    index = FingerprintIndex(tmp_path / "fingerprints.jsonl", ledger=object())
+    for i in range(1000):
+        index.add(_fingerprint(f"sha{i}", i << 20, f"text {i}"), {"id": i})
+
+    assert index.match(_fingerprint("sha500")) == {"entry": {"id": 500}, "match": "exact", "distance": 0}
+    assert index.match(_fingerprint("new", None, "text 42"))["entry"] == {"id": 42}
+    assert index.match(_fingerprint("new", (7 << 20) ^ 1))["entry"] == {"id": 7}
+
+    reloaded = FingerprintIndex(tmp_path / "fingerprints.jsonl", ledger=object())
+    assert reloaded.match(_fingerprint("sha999"))["entry"] == {"id": 999}
+
+
+SAVED = {
+    "date": "2026-01-05",
+    "total_amount": "12.50",
+    "vat_amount": "",
+    "category": "Travel",
+    "description": "Train ticket",
+    "source_file": "/receipts/done/original.jpg",
+}
+
+
+class FakeLedger:
+    def __init__(self):
+        self.entries = []
+
+    def add(self, entry, sha256=None):
+        self.entries.append(entry)
+
+
+@pytest.fixture
+def submit(tmp_path, monkeypatch):
+    ledger = FakeLedger()
+    monkeypatch.setattr("expense_pal.ledger.get_ledger", lambda: ledger)
+    (tmp_path / "copy.jpg").write_bytes(b"a re-encoded photo")
+    fingerprint = _fingerprint("copy", 0x1234)
+    duplicate = {"of": "original.jpg", "match": "perceptual", "distance": 3, "entry": dict(SAVED)}
+    app = create_batch_app(
+        tmp_path, [{"description": "Travel", "nominal_code": "365"}], prefetch_workers=0,
+        fingerprints={"copy.jpg": fingerprint}, duplicates={"copy.jpg": duplicate},
+    )
+    client = app.test_client()
+
+    def post(**extra):
+        return client.post("/submit", json={"filename": "copy.jpg", **SAVED, "description": "Taxi", **extra})
+
+    return post, ledger.entries, tmp_path
+
+
+def test_perceptual_duplicate_needs_confirmation_before_reusing_the_entry(submit):
+    post, saved, folder = submit
+    resp = post()
+    assert resp.status_code == 409
+    assert resp.get_json()["needs_confirmation"]
+    assert (folder / "copy.jpg").exists()
+
+    resp = post(same_receipt=True)
+    assert resp.get_json() == {"ok": True, "reused": True}
+    assert saved == []
+    assert (folder / "done" / "copy.jpg").exists()
+
+
+def test_perceptual_duplicate_denied_is_saved_as_a_new_entry(submit):
+    post, saved, _ = submit
+    assert post().status_code == 409
+
+    resp = post(same_receipt=False)
+    assert resp.get_json() == {"ok": True, "reused": False}
+    assert [entry["description"] for entry in saved] == ["Taxi"]
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+from anthropic.types import Message
+from PIL import Image
+
+from expense_pal import engine
+from expense_pal.cache import ScanCache
+from expense_pal.categories import get_llm_category_names
+from expense_pal.config import CASCADE, CASCADE_MODELS
+from expense_pal.scanner import Scanner
+
+ANSWER = {
+    "date": (date.today() - timedelta(days=10)).isoformat(),
+    "total_amount": "12.00",
+    "vat_amount": "2.00",
+    "category": get_llm_category_names()[0],
+    "description": "Team lunch",
+}
+
+
+def _message(model: str) -> Message:
+    # The cheapest tier gets the VAT wrong, so the cascade escalates once
+    answer = {**ANSWER, "vat_amount": "20.00"} if model == CASCADE_MODELS[0] else ANSWER
+    return Message.model_validate({
+        "id": "msg_test",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "tool_use", "id": "toolu_test", "name": "record_receipt", "input": answer}],
+        "stop_reason": "tool_use",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 100, "output_tokens": 20},
+    })
+
+
+class ByModel:
+    """Answers each request according to its model, synchronously or asynchronously."""
+
+    def __init__(self, asynchronous: bool = False):
+        self.messages = self
+        if asynchronous:
+            self.with_raw_response = SimpleNamespace(create=self._create_raw)
+
+    def __call__(self, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def create(self, **params) -> Message:
+        return _message(params["model"])
+
+    async def _create_raw(self, **params):
+        message = _message(params["model"])
+
+        async def parse():
+            return message
+
+        return SimpleNamespace(headers={}, parse=parse)
+
+
+@pytest.fixture
+def scanner(tmp_path, monkeypatch):
+    scanner = Scanner(api_key="test")
+    scanner.cache = ScanCache(tmp_path / "scan_cache")
+    scanner._client = ByModel()
+    monkeypatch.setattr(engine, "get_scanner", lambda: scanner)
+    monkeypatch.setattr(engine.anthropic, "AsyncAnthropic", ByModel(asynchronous=True))
+    return scanner
+
+
+def _scan_async(path):
+    async def run():
+        return [result async for _, result in engine.scan_receipts([path], model=CASCADE, use_cache=False)]
+
+    [result] = asyncio.run(run())
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def test_sync_and_async_cascades_agree_and_sum_usage_over_tiers(scanner, tmp_path):
+    path = tmp_path / "lunch.jpg"
+    Image.new("RGB", (40, 60), "white").save(path)
+
+    synchronous = scanner.scan_cascade(path, use_cache=False)
+    asynchronous = _scan_async(path)
+
+    for result in (synchronous, asynchronous):
+        assert result["cascade"]["model"] == CASCADE_MODELS[1]
+        assert [a["problems"] for a in result["cascade"]["attempts"]] == [["VAT exceeds total"], []]
+        assert result["usage"]["input_tokens"] == 200
+        assert result["usage"]["output_tokens"] == 40
+        assert "latency_ms" in result
+        assert result["vat_amount"] == "2.00"
+
+
+def test_an_unsupported_file_fails_only_its_own_job(scanner, tmp_path):
+    good = tmp_path / "lunch.jpg"
+    Image.new("RGB", (40, 60), "white").save(good)
+    stray = tmp_path / "notes.txt"
+    stray.write_text("not a receipt")
+
+    async def run():
+        return {p.name: r async for p, r in engine.scan_receipts([stray, good], model=CASCADE, use_cache=False)}
+
+    results = asyncio.run(run())
+    assert isinstance(results["notes.txt"], ValueError)
+    assert results["lunch.jpg"]["description"] == "Team lunch"
@@ -0,0 +1,162 @@
+import json
+
+import pytest
+from anthropic.types import Message
+from PIL import Image
+
+from expense_pal.cache import ScanCache
+from expense_pal.extraction import (
+    TOOL_NAME,
+    IncrementalFieldParser,
+    failed_fields,
+    parse_loose_json,
+    retry_params,
+)
+from expense_pal.scanner import Scanner
+
+FIELDS = {
+    "date": "2026-01-05",
+    "total_amount": "12.50",
+    "vat_amount": "2.08",
+    "category": "Travel",
+    "description": "Train ticket",
+}
+
+
+def _message(content, usage=None) -> Message:
+    return Message.model_validate({
+        "id": "msg_test",
+        "type": "message",
+        "role": "assistant",
+        "model": "claude-sonnet-4-6",
+        "content": content,
+        "stop_reason": "tool_use",
+        "stop_sequence": None,
+        "usage": usage or {"input_tokens": 100, "output_tokens": 20},
+    })
+
+
+def _tool_use(fields, block_id="toolu_1"):
+    return {"type": "tool_use", "id": block_id, "name": TOOL_NAME, "input": fields}
+
+
+@pytest.mark.parametrize("text", [
+    f"Here you go:\n```json\n{json.dumps(FIELDS)}\n```\nLet me know!",
+    "Extraction: {“date”: “2026-01-05”, “total_amount”: “12.50”, “vat_amount”: “2.08”, "
+    "“category”: “Travel”, “description”: “Train ticket”,}",
+    '{"date": "2026-01-05", "total_amount": 12.50, "vat_amount": "2.08",\n'
+    ' "category": "Travel", "description": "Train ticket"',
+])
+def test_loose_json_recovers_fenced_trailing_comma_and_truncated_answers(text):
+    fields = parse_loose_json(text)
+    assert {k: str(v) if k != "total_amount" else f"{float(v):.2f}" for k, v in fields.items()} == FIELDS
+
+
+def test_truncated_answer_keeps_only_the_fields_that_made_it():
+    fields = parse_loose_json('{"date": "2026-01-05", "total_amount": "12.50", "vat_amount": "2.')
+    assert fields == {"date": "2026-01-05", "total_amount": "12.50"}
+    assert failed_fields(fields) == ["vat_amount", "category", "description"]
+
+
+def test_failed_fields_flags_missing_blank_and_non_numeric_values():
+    fields = {**FIELDS, "total_amount": "£12.50", "vat_amount": 2.08, "description": "  "}
+    del fields["category"]
+    assert failed_fields(fields) == ["total_amount", "category", "description"]
+    assert failed_fields(FIELDS) == []
+
+
+def test_retry_params_replays_the_request_and_flags_the_tool_call_as_an_error():
+    params = {"model": "m", "tools": ["t"], "messages": [{"role": "user", "content": "receipt"}]}
+    message = _message([_tool_use({**FIELDS, "vat_amount": "n/a"}, "toolu_42")])
+
+    retry = retry_params(params, message, ["vat_amount"])
+    assert {k: v for k, v in retry.items() if k != "messages"} == {"model": "m", "tools": ["t"]}
+    assert retry["messages"][0] == params["messages"][0]
+    assert retry["messages"][1]["role"] == "assistant"
+    assert retry["messages"][1]["content"][0]["id"] == "toolu_42"
+    [result] = retry["messages"][2]["content"]
+    assert result["type"] == "tool_result" and result["is_error"]
+    assert result["tool_use_id"] == "toolu_42"
+    assert "vat_amount" in result["content"]
+
+
+def test_retry_params_answers_a_text_reply_with_text():
+    message = _message([{"type": "text", "text": "I could not read the total."}])
+    retry = retry_params({"messages": [{"role": "user", "content": "receipt"}]}, message, ["total_amount"])
+    [follow_up] = retry["messages"][2]["content"]
+    assert follow_up["type"] == "text" and "total_amount" in follow_up["text"]
+
+
+class ScriptedClient:
+    def __init__(self, *messages):
+        self.messages = self
+        self.requests = []
+        self._answers = list(messages)
+
+    def create(self, **params):
+        self.requests.append(params)
+        return self._answers.pop(0)
+
+
+def test_a_field_retry_merges_only_the_failed_fields(tmp_path):
+    receipt = tmp_path / "train.jpg"
+    Image.new("RGB", (40, 60), "white").save(receipt)
+    scanner = Scanner(api_key="test")
+    scanner.cache = ScanCache(tmp_path / "scan_cache")
+    first = _message([_tool_use({**FIELDS, "vat_amount": "unknown", "description": ""})])
+    # The retry changes everything, but only the two failed fields may be taken from it
+    second = _message([_tool_use({k: "9.99" for k in FIELDS}, "toolu_2")], {"input_tokens": 150, "output_tokens": 10})
+    scanner._client = ScriptedClient(first, second)
+
+    result = scanner.scan(receipt, model="claude-sonnet-4-6", use_cache=False)
+    assert result["vat_amount"] == "9.99" and result["description"] == "9.99"
+    assert {k: result[k] for k in ("date", "total_amount", "category")} == {
+        k: FIELDS[k] for k in ("date", "total_amount", "category")
+    }
+    assert result["parse"]["retried_fields"] == ["vat_amount", "description"]
+    assert result["usage"]["input_tokens"] == 250
+    assert scanner._client.requests[1]["messages"][2]["content"][0]["type"] == "tool_result"
+
+
+def _feed_in_pieces(text, cuts):
+    parser = IncrementalFieldParser()
+    completed, start = [], 0
+    for cut in [*cuts, len(text)]:
+        completed += parser.feed(text[start:cut])
+        start = cut
+    return parser, completed
+
+
+def test_partial_json_split_anywhere_yields_the_same_fields():
+    answer = {
+        "date": "2026-01-05",
+        "total_amount": 12.5,
+        "vat_amount": "2.08",
+        "category": "Travel",
+        "description": 'Café "Le Train" \\ return',
+        "extra": {"nested": "ignored", "date": "not a field"},
+    }
+    text = json.dumps(answer)
+    expected = [(k, v) for k, v in answer.items() if k != "extra"]
+    for cut in range(1, len(text)):
+        parser, completed = _feed_in_pieces(text, [cut])
+        assert completed == expected, f"split at {cut}: {text[:cut]!r}"
+    parser, completed = _feed_in_pieces(text, range(1, len(text)))
+    assert completed == expected
+
+
+def test_partial_json_split_mid_escape():
+    text = r'{"description": "Caf\u00e9 \"Le Train\"", "total_amount": "3.20"}'
+    escape = text.index("\\u")
+    quote = text.index('\\"')
+    parser, completed = _feed_in_pieces(text, [escape + 1, escape + 4, quote + 1])
+    assert completed == [("description", 'Café "Le Train"'), ("total_amount", "3.20")]
+
+
+def test_values_complete_when_their_chunk_arrives():
+    parser = IncrementalFieldParser()
+    assert parser.feed('Sure: {"date": "2026-01') == []
+    assert parser.feed('-05", "total_amount": 12') == [("date", "2026-01-05")]
+    # A number is only known to be complete at the next comma or brace
+    assert parser.feed(".50") == []
+    assert parser.feed("}") == [("total_amount", 12.5)]
@@ -0,0 +1,57 @@
+import sqlite3
+import threading
+
+from expense_pal import ledger
+from expense_pal.ledger import Ledger, created_at
+
+
+def test_concurrent_opens_of_a_new_ledger_migrate_it_once(tmp_path):
+    path = tmp_path / "ledger.db"
+    start = threading.Barrier(8)
+    errors, ledgers = [], []
+
+    def open_ledger():
+        start.wait()
+        try:
+            ledgers.append(Ledger(path))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=open_ledger) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA user_version").fetchone()[0] == len(ledger._MIGRATIONS)
+    assert ledgers[0].add({"date": "2026-01-05", "total_amount": "1.00", "source_file": "r.jpg"}) == 1
+    for opened in ledgers:
+        opened.close()
+
+
+def test_an_interrupted_migration_is_rolled_back_and_redone(tmp_path, monkeypatch):
+    path = tmp_path / "ledger.db"
+    monkeypatch.setattr(ledger, "_MIGRATIONS", [*ledger._MIGRATIONS, "CREATE TABLE broken (;"])
+    try:
+        Ledger(path)
+    except sqlite3.OperationalError:
+        pass
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA user_version").fetchone()[0] == 0
+    assert db.execute("SELECT name FROM sqlite_master WHERE name = 'expenses'").fetchone() is None
+    db.close()
+
+    monkeypatch.setattr(ledger, "_MIGRATIONS", ledger._MIGRATIONS[:-1])
+    Ledger(path).close()
+
+
+def test_two_confirmations_of_a_file_in_one_second_are_both_kept(tmp_path):
+    book = Ledger(tmp_path / "ledger.db")
+    first, second = created_at(), created_at()
+    assert first != second and first[:19] == second[:19]
+    for when in (first, second):
+        book.add({"date": "2026-01-05", "source_file": "/receipts/r.jpg", "created_at": when})
+    assert len(book) == 2
+    book.close()
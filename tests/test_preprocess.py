@@ -0,0 +1,92 @@
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from expense_pal import cache, preprocess
+from expense_pal.config import IMAGE_MAX_EDGE
+
+
+def _png(size, exif_orientation=None) -> bytes:
+    img = Image.new("RGB", size, "white")
+    buf = io.BytesIO()
+    if exif_orientation is None:
+        img.save(buf, "PNG")
+    else:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        img.save(buf, "PNG", exif=exif)
+    return buf.getvalue()
+
+
+def _noisy_jpeg(size) -> bytes:
+    buf = io.BytesIO()
+    Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)).save(buf, "JPEG", quality=95)
+    return buf.getvalue()
+
+
+def _size(data: bytes) -> tuple[int, int]:
+    with Image.open(io.BytesIO(data)) as img:
+        return img.size
+
+
+def test_small_upright_image_is_sent_as_is():
+    data = _png((40, 60))
+    out, media_type, stats = preprocess.preprocess_image(data, "image/png")
+    assert (out, media_type) == (data, "image/png")
+    assert stats["image_tokens"] == preprocess.estimate_image_tokens(40, 60)
+
+
+def test_rotated_image_is_sent_upright_even_if_the_jpeg_is_larger():
+    data = _png((40, 60), exif_orientation=6)
+    out, media_type, _ = preprocess.preprocess_image(data, "image/png")
+    assert media_type == "image/jpeg"
+    assert _size(out) == (60, 40)
+
+
+def test_oversized_image_is_capped_even_if_the_jpeg_is_larger():
+    data = _png((IMAGE_MAX_EDGE * 2, 20))
+    out, media_type, _ = preprocess.preprocess_image(data, "image/png")
+    assert media_type == "image/jpeg"
+    assert max(_size(out)) == IMAGE_MAX_EDGE
+
+
+def test_damaged_cache_entry_is_regenerated():
+    data = _noisy_jpeg((400, 300))
+    first, _, _ = preprocess.preprocess_image(data, "image/jpeg")
+    cache_path = preprocess._cache_path(hashlib.sha256(data).hexdigest())
+    assert cache_path.read_bytes() == first
+    cache_path.write_bytes(b"not an image")
+
+    again, media_type, stats = preprocess.preprocess_image(data, "image/jpeg")
+    assert media_type == "image/jpeg"
+    assert _size(again) == (400, 300)
+    assert cache_path.read_bytes() == again
+    assert stats["image_tokens"] == preprocess.estimate_image_tokens(400, 300)
+
+
+def test_keeping_the_original_is_remembered(monkeypatch):
+    data = _png((30, 50))
+    preprocess.preprocess_image(data, "image/png")
+    monkeypatch.setattr(preprocess, "_encode", lambda data: pytest.fail("decoded again"))
+
+    out, media_type, stats = preprocess.preprocess_image(data, "image/png")
+    assert (out, media_type) == (data, "image/png")
+    assert stats["image_tokens"] == preprocess.estimate_image_tokens(30, 50)
+
+
+def test_cache_writes_do_not_sweep_the_directory_each_time(tmp_path, monkeypatch):
+    sweeps = []
+    real = cache.evict_directory
+    monkeypatch.setattr(cache, "evict_directory", lambda *args: sweeps.append(args) or real(*args))
+    monkeypatch.setattr(preprocess, "IMAGE_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(preprocess, "_budget", cache.CacheBudget(tmp_path, ("*/*.jpg", "*/*.keep"), 10 * 1024 * 1024))
+    for i in range(30):
+        preprocess.preprocess_image(_noisy_jpeg((64 + i, 48)), "image/jpeg")
+        preprocess.preprocess_image(_png((20 + i, 20)), "image/png")
+    # Once to learn the cache's size; never again while it stays under the limit
+    assert len(sweeps) == 1
+    assert len(list(tmp_path.glob("*/*.jpg"))) == 30
+    assert len(list(tmp_path.glob("*/*.keep"))) == 30
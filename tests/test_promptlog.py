@@ -0,0 +1,87 @@
+import gzip
+import json
+import os
+import time
+
+from expense_pal import scanner as scanner_module
+from expense_pal.promptlog import TEXTS_FILE, PromptLog, load_texts, read_records
+from expense_pal.scanner import Scanner
+
+
+def _write_jsonl(path, rows):
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        f.writelines(json.dumps(row) + "\n" for row in rows)
+
+
+def test_expiring_a_rotated_log_drops_the_texts_only_it_referenced(tmp_path):
+    old = time.time() - 10 * 86400
+    rotated = tmp_path / "prompts-20260101T000000000000.jsonl.gz"
+    _write_jsonl(rotated, [{"ts": "2026-01-01T00:00:00Z", "template": "t-old", "descriptions": "d-old"}])
+    os.utime(rotated, (old, old))
+    _write_jsonl(tmp_path / "prompts.jsonl", [{"ts": "2026-01-09T00:00:00Z", "template": "t-now", "descriptions": None}])
+    _write_jsonl(tmp_path / TEXTS_FILE, [
+        {"hash": "t-old", "text": "old template", "ts": old},
+        {"hash": "d-old", "text": "old descriptions", "ts": old},
+        {"hash": "t-now", "text": "current template", "ts": old},
+        {"hash": "d-new", "text": "written just now", "ts": time.time()},
+    ])
+
+    PromptLog(tmp_path, retention_days=1)._expire()
+
+    assert not rotated.exists()
+    assert load_texts(tmp_path) == {"t-now": "current template", "d-new": "written just now"}
+
+
+def test_ranked_descriptions_stay_in_the_record_not_in_texts(tmp_path, monkeypatch):
+    log = PromptLog(tmp_path)
+    monkeypatch.setattr(scanner_module, "get_prompt_log", lambda: log)
+    scanner = Scanner(api_key="test")
+    for ranked in ("- Lunch", "- Taxi"):
+        prepared = {
+            "system_prompt": "system",
+            "user_prompt_template": "{category_list} {description_list}",
+            "description_list": f"- Popular\n{ranked}",
+            "pinned_descriptions": ["Popular"],
+            "file_path": tmp_path / "receipt.jpg",
+            "digest": "abc",
+            "model": "claude-sonnet-4-6",
+        }
+        scanner.log_call(prepared, {"description": ranked[2:]}, {})
+    log.flush()
+
+    records = list(read_records(tmp_path))
+    assert [r["ranked_descriptions"] for r in records] == ["\n- Lunch", "\n- Taxi"]
+    texts = load_texts(tmp_path)
+    assert len(texts) == 2
+    assert texts[records[0]["descriptions"]] + records[1]["ranked_descriptions"] == "- Popular\n- Taxi"
+
+
+def test_texts_collected_by_another_log_are_written_again(tmp_path):
+    old = time.time() - 10 * 86400
+    prompts = PromptLog(tmp_path, retention_days=1)
+    prompts.record({"ts": "2026-01-01T00:00:00Z", "template": "t1", "descriptions": None}, {"t1": "template"})
+    prompts.flush()
+    # The only record referring to it has expired, and the texts are collected through the metrics log
+    (tmp_path / "prompts.jsonl").unlink()
+    _write_jsonl(tmp_path / TEXTS_FILE, [{"hash": "t1", "text": "template", "ts": old}])
+    PromptLog(tmp_path, retention_days=1, name="metrics")._collect_texts()
+    assert load_texts(tmp_path) == {}
+
+    prompts.record({"ts": "2026-01-09T00:00:00Z", "template": "t1", "descriptions": None}, {"t1": "template"})
+    prompts.flush()
+    assert load_texts(tmp_path) == {"t1": "template"}
+
+
+def test_referencing_an_old_text_refreshes_its_grace_period(tmp_path):
+    old = time.time() - 10 * 86400
+    _write_jsonl(tmp_path / TEXTS_FILE, [{"hash": "t1", "text": "template", "ts": old}])
+    log = PromptLog(tmp_path)
+    log.record({"ts": "2026-01-09T00:00:00Z", "template": "t1", "descriptions": None}, {"t1": "template"})
+    log.flush()
+    # A record still on its way elsewhere: nothing on disk refers to t1
+    (tmp_path / "prompts.jsonl").unlink()
+
+    log._collect_texts()
+    assert load_texts(tmp_path) == {"t1": "template"}
+    assert len((tmp_path / TEXTS_FILE).read_text().splitlines()) == 1
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+from PIL import Image
+
+from benchmarks.fakes import FakeFreeAgent, serve
+from expense_pal.api import ApiClient, RateLimiter
+from expense_pal.ledger import Ledger
+from expense_pal.push import MAX_ATTACHMENT_BYTES, push_expenses
+
+
+class RecordingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__(1_000_000)
+        self.pauses = []
+
+    def pause(self, seconds):
+        self.pauses.append(seconds)
+        super().pause(seconds)
+
+
+def _entry(name, **extra):
+    return {
+        "date": "2026-01-05",
+        "total_amount": "12.50",
+        "vat_amount": "2.08",
+        "category": "Travel",
+        "category_nominal_code": "365",
+        "description": name,
+        "source_file": f"/nowhere/{name}.jpg",
+        **extra,
+    }
+
+
+@pytest.fixture
+def freeagent():
+    fake = FakeFreeAgent([])
+    server = serve(fake)
+    yield fake, f"http://localhost:{server.server_address[1]}/v2"
+    server.shutdown()
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    book = Ledger(tmp_path / "ledger.db")
+    yield book
+    book.close()
+
+
+def _push(ledger, client, workers=4):
+    return list(push_expenses(ledger, client, "https://api.example/v2/users/1", ledger.unpushed(), workers))
+
+
+def test_pushing_again_sends_only_what_is_not_pushed_yet(freeagent, ledger):
+    fake, base_url = freeagent
+    for name in ("lunch", "train", "taxi"):
+        ledger.add(_entry(name))
+    ledger.add(_entry("hotel", category_nominal_code=""))
+    client = ApiClient("token", base_url=base_url, limiter=RateLimiter(1_000_000))
+
+    results = _push(ledger, client)
+    assert sorted(r.entry["description"] for r in results if r.url) == ["lunch", "taxi", "train"]
+    assert [r.entry["description"] for r in results if r.error] == ["hotel"]
+    pushed = {e["description"]: e["freeagent_url"] for e in ledger.recent(10) if "freeagent_url" in e}
+    assert sorted(pushed.values()) == sorted(c["url"] for c in fake.created)
+
+    again = _push(ledger, client)
+    assert [r.entry["description"] for r in again] == ["hotel"]
+    assert len(fake.created) == 3
+
+
+def test_429_is_retried_after_retry_after_without_a_duplicate(freeagent, ledger):
+    fake, base_url = freeagent
+    fake.throttle, fake.retry_after = 2, "0.2"
+    ledger.add(_entry("lunch"))
+    limiter = RecordingLimiter()
+    client = ApiClient("token", base_url=base_url, limiter=limiter)
+
+    [result] = _push(ledger, client, workers=1)
+    assert result.error is None
+    assert fake.throttled == 2
+    assert limiter.pauses == [0.2, 0.2]
+    assert [c["description"] for c in fake.created] == ["lunch"]
+
+
+def test_oversized_receipt_is_downsized_to_fit(freeagent, ledger, tmp_path):
+    fake, base_url = freeagent
+    receipt = tmp_path / "scan.png"
+    # Noise does not compress: well over the limit as a PNG
+    side = 1500
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(receipt, "PNG")
+    assert receipt.stat().st_size > MAX_ATTACHMENT_BYTES
+    ledger.add(_entry("scan", source_file=str(receipt)))
+    client = ApiClient("token", base_url=base_url, limiter=RateLimiter(1_000_000))
+
+    [result] = _push(ledger, client)
+    assert result.attached
+    attachment = fake.created[0]["attachment"]
+    assert attachment["file_name"] == "scan.png"
+    assert attachment["content_type"] == "image/jpeg"
+    assert attachment["bytes"] <= MAX_ATTACHMENT_BYTES
@@ -0,0 +1,99 @@
+import pytest
+from PIL import Image
+
+from benchmarks.fakes import FakeAnthropic
+from expense_pal.cache import ScanCache
+from expense_pal.descriptions import DescriptionIndex, DescriptionStore
+from expense_pal.scanner import Scanner, cache_min_tokens
+
+MODEL = "claude-sonnet-4-6"
+
+
+def _receipt(path, colour):
+    Image.new("RGB", (64, 96), colour).save(path, "JPEG")
+    return path
+
+
+@pytest.fixture
+def scanner(tmp_path):
+    store = DescriptionStore(tmp_path / "descriptions.txt")
+    for i in range(300):
+        store.add(f"Supplies from vendor {i}")
+    scanner = Scanner(api_key="test")
+    scanner.descriptions = DescriptionIndex(store)
+    scanner.cache = ScanCache(tmp_path / "scan_cache")
+    scanner._client = FakeAnthropic()
+    return scanner
+
+
+def test_prefix_is_long_enough_to_cache_and_shared_across_receipts(scanner, tmp_path):
+    first = scanner.prepare(_receipt(tmp_path / "tesco_lunch.jpg", "white"), model=MODEL)
+    second = scanner.prepare(_receipt(tmp_path / "uber_ride.jpg", "grey"), model=MODEL)
+    assert first["pinned_descriptions"]
+    assert first["prompt_prefix"] == second["prompt_prefix"]
+    assert first["prompt"].startswith(first["prompt_prefix"])
+    params, _ = scanner.build_params(first)
+    assert params["messages"][0]["content"][0]["text"] == first["prompt_prefix"]
+
+
+def test_second_receipt_reads_the_prefix_from_the_prompt_cache(scanner, tmp_path):
+    first = scanner.scan(_receipt(tmp_path / "tesco_lunch.jpg", "white"), model=MODEL, use_cache=False)
+    assert first["usage"]["cache_creation_input_tokens"] >= cache_min_tokens(MODEL)
+    # A confirm in between adds a description; the cached prefix must not change
+    scanner.descriptions.store.add("Taxi to the station")
+    second = scanner.scan(_receipt(tmp_path / "uber_ride.jpg", "grey"), model=MODEL, use_cache=False)
+    assert second["usage"]["cache_read_input_tokens"] == first["usage"]["cache_creation_input_tokens"]
+    assert second["usage"]["cache_creation_input_tokens"] == 0
+
+
+class RecordingClient:
+    """Stands in for ``anthropic.Anthropic``, keeping each request and answering from a recording."""
+
+    def __init__(self):
+        self.messages = self
+        self.requests = []
+        self._fake = FakeAnthropic()
+
+    def create(self, **params):
+        self.requests.append(params)
+        return self._fake.create(**params)
+
+
+def _breakpoints(params) -> list[tuple[str, int]]:
+    marked = [("tools", i) for i, tool in enumerate(params["tools"]) if "cache_control" in tool]
+    marked += [("system", i) for i, block in enumerate(params["system"]) if "cache_control" in block]
+    for m, message in enumerate(params["messages"]):
+        marked += [(f"messages[{m}]", i) for i, block in enumerate(message["content"]) if "cache_control" in block]
+    return marked
+
+
+def test_request_forces_the_tool_and_breaks_the_cache_after_the_stable_prefix(scanner, tmp_path):
+    client = scanner._client = RecordingClient()
+    path = _receipt(tmp_path / "tesco_lunch.jpg", "white")
+    prepared = scanner.prepare(path, model=MODEL)
+    scanner.scan(path, model=MODEL, use_cache=False)
+
+    [params] = client.requests
+    assert params["tool_choice"] == {"type": "tool", "name": "record_receipt"}
+    assert params["tools"] == [scanner.tool]
+    # One breakpoint, on the block ending with the pinned descriptions
+    assert _breakpoints(params) == [("messages[0]", 0)]
+    content = params["messages"][0]["content"]
+    assert content[0]["text"] == prepared["prompt_prefix"]
+    assert content[0]["text"].endswith(f"- {prepared['pinned_descriptions'][-1]}\n")
+    # Then the ranked descriptions and the rest of the instructions, then the receipt
+    assert content[0]["text"] + content[1]["text"] == prepared["prompt"]
+    assert [block["type"] for block in content] == ["text", "text", "image"]
+
+
+def test_template_without_a_description_list_is_cached_whole(scanner, tmp_path):
+    client = scanner._client = RecordingClient()
+    path = _receipt(tmp_path / "receipt.jpg", "white")
+    template = "## System Prompt\n\nExtract receipts.\n\n## User Prompt\n\nCategories: {category_list}\n"
+    scanner.scan(path, model=MODEL, prompt_template_override=template, use_cache=False)
+
+    [params] = client.requests
+    assert params["tool_choice"] == {"type": "tool", "name": "record_receipt"}
+    assert _breakpoints(params) == [("messages[0]", 0)]
+    assert params["messages"][0]["content"][0]["text"].startswith("Categories: ")
+    assert params["messages"][0]["content"][-1]["type"] == "image"
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from expense_pal import scanner
+from expense_pal.web_review import create_batch_app
+
+RESULT = {
+    "date": "2026-01-05",
+    "total_amount": "12.50",
+    "vat_amount": "2.08",
+    "category": "Travel",
+    "description": "Train ticket",
+}
+
+
+class SlowScanner:
+    """Streams one field per event, blocking between them until allowed to carry on."""
+
+    def __init__(self):
+        self.proceed = threading.Event()
+
+    def stream_scan(self, file_path, model=None, use_cache=True):
+        for name, value in RESULT.items():
+            yield "field", (name, value)
+            self.proceed.wait(5)
+        yield "done", dict(RESULT)
+
+
+def _in_thread(fn, timeout=5):
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.setdefault("value", fn()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "request hung"
+    return outcome["value"]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    (tmp_path / "receipt.jpg").write_bytes(b"not really a jpeg")
+    monkeypatch.setattr(scanner, "get_scanner", SlowScanner)
+    monkeypatch.setattr(scanner, "scan_receipt", lambda path, model=None, use_cache=True: dict(RESULT))
+    app = create_batch_app(tmp_path, [{"description": "Travel", "nominal_code": "365"}], prefetch_workers=1)
+    yield app
+    app.config["PREFETCHER"].stop()
+
+
+def test_stream_closed_early_does_not_strand_the_claimed_scan(app):
+    client = app.test_client()
+    resp = client.get("/stream/receipt.jpg", buffered=False)
+    chunks = resp.response
+    assert b"event: field" in next(iter(chunks))
+    # The browser navigates away mid-stream
+    resp.close()
+
+    app.config["PREFETCHER"].start()
+    selected = _in_thread(lambda: client.post("/select/receipt.jpg", json={}).get_json())
+    assert selected["total_amount"] == "12.50"
+
+    streamed = _in_thread(lambda: client.get("/stream/receipt.jpg").get_data(as_text=True))
+    assert "event: done" in streamed
+
+
+def test_stream_reopened_after_close_is_served_by_the_pool(app):
+    client = app.test_client()
+    resp = client.get("/stream/receipt.jpg", buffered=False)
+    next(iter(resp.response))
+    resp.close()
+
+    app.config["PREFETCHER"].start()
+    streamed = _in_thread(lambda: client.get("/stream/receipt.jpg").get_data(as_text=True))
+    assert "event: done" in streamed
+    assert '"Train ticket"' in streamed